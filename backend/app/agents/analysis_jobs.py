@@ -0,0 +1,145 @@
+"""
+后台分析任务
+
+- records_summary：汇总用户的全部健康记录（可指定日期范围），由 LLM 生成整体总结
+- report_review：解析长篇检查报告，找出异常项，由 LLM 给出解读
+
+统计和解析在进程池中执行，LLM 调用在后台任务专用的并发限制内进行；
+LLM 不可用时任务仍然成功，只返回本地分析结果（llm 为 false，llm_error 为原因）。
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.agents.loader import load_health_assistant
+from app.services.health_store import get_health_store
+from app.services.job_queue import JobContext, JobQueue
+from app.services.report_analysis import analyze_report, digest_records
+
+# 单份报告的最大长度（字符）
+REPORT_MAX_CHARS = int(os.getenv("JOB_REPORT_MAX_CHARS", 200000))
+# 放进提示词的记录摘录、报告原文的最大长度（字符）
+SUMMARY_TIMELINE_CHARS = 6000
+REPORT_PROMPT_CHARS = 6000
+
+RECORDS_SUMMARY_PROMPT = """你是一位负责整理健康档案的医疗助手。下面是一位用户的健康记录统计和按时间倒序的记录摘录。
+请用通俗的语言写一份整体总结，包括：
+1. 整体健康状况和主要关注点
+2. 随时间变化的趋势（如血压、体检结果的变化）
+3. 需要持续关注或复查的事项
+不超过 500 字，不做诊断，不推荐具体药物，不使用任何特殊符号或 Markdown 格式。"""
+
+REPORT_REVIEW_PROMPT = """你是一位帮助用户理解检查报告的医疗助手。下面是程序从报告中找出的异常项和报告原文（可能被截断）。
+请用通俗的语言说明：
+1. 各异常项的一般含义和常见原因
+2. 日常生活中需要注意什么
+3. 建议咨询哪个科室、是否需要复查
+不超过 600 字，不做诊断，不推荐具体药物，不使用任何特殊符号或 Markdown 格式。"""
+
+FLAG_LABELS = {"high": "偏高", "low": "偏低", "abnormal": "异常"}
+
+
+def _validate_date(value: Any, name: str) -> None:
+    if value is None:
+        return
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 应为 YYYY-MM-DD")
+
+
+def validate_records_summary(params: Dict[str, Any]) -> None:
+    _validate_date(params.get("start_date"), "start_date")
+    _validate_date(params.get("end_date"), "end_date")
+
+
+def validate_report_review(params: Dict[str, Any]) -> None:
+    text = params.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text 不能为空")
+    if len(text) > REPORT_MAX_CHARS:
+        raise ValueError(f"报告过长，最多 {REPORT_MAX_CHARS} 个字符")
+
+
+async def _llm_text(system_prompt: str, content: str) -> Tuple[Optional[str], Optional[str]]:
+    """调用 LLM，返回 (文本, None)；失败时返回 (None, 错误说明)"""
+    try:
+        assistant = await load_health_assistant()
+        return await assistant.complete(system_prompt, content), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+async def summarize_records(ctx: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """汇总用户的全部健康记录"""
+    ctx.progress(0.05, "读取健康记录")
+    records: List[Dict[str, Any]] = []
+    async for record in get_health_store().iter_records(
+        ctx.job.user_id, start_date=params.get("start_date"), end_date=params.get("end_date")
+    ):
+        records.append({k: record.get(k) for k in ("id", "date", "type", "doctor", "summary")})
+        if len(records) % 500 == 0:
+            ctx.progress(0.05, f"已读取 {len(records)} 条记录")
+
+    ctx.progress(0.4, f"统计 {len(records)} 条记录")
+    digest = await ctx.run_in_process(digest_records, records, SUMMARY_TIMELINE_CHARS)
+    timeline = digest.pop("timeline")
+    result: Dict[str, Any] = {"digest": digest, "summary": None, "llm": False, "llm_error": None}
+    if not digest["total"] or not params.get("use_llm", True):
+        return result
+
+    ctx.progress(0.6, "生成总结")
+    by_type = "、".join(f"{name} {count} 条" for name, count in digest["by_type"].items())
+    content = (
+        f"记录总数：{digest['total']}，时间范围：{digest['first_date']} 至 {digest['last_date']}\n"
+        f"各类型：{by_type}\n\n"
+        f"记录摘录（按时间倒序，列出最近 {digest['included']} 条）：\n{timeline}"
+    )
+    summary, error = await _llm_text(RECORDS_SUMMARY_PROMPT, content)
+    result.update(summary=summary, llm=summary is not None, llm_error=error)
+    return result
+
+
+async def review_report(ctx: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """解析检查报告并生成解读"""
+    text = params["text"]
+    ctx.progress(0.1, "解析报告")
+    analysis = await ctx.run_in_process(analyze_report, text)
+    result: Dict[str, Any] = {"analysis": analysis, "review": None, "llm": False, "llm_error": None}
+    if not params.get("use_llm", True):
+        return result
+
+    ctx.progress(0.5, "生成解读")
+    findings = "\n".join(
+        f"第 {f['line']} 行（{FLAG_LABELS[f['flag']]}）：{f['text']}" for f in analysis["findings"][:50]
+    ) or "未发现标注或超出参考范围的项目"
+    excerpt = text[:REPORT_PROMPT_CHARS]
+    truncated = "（已截断）" if len(text) > REPORT_PROMPT_CHARS else ""
+    content = f"异常项：\n{findings}\n\n报告原文{truncated}：\n{excerpt}"
+    review, error = await _llm_text(REPORT_REVIEW_PROMPT, content)
+    result.update(review=review, llm=review is not None, llm_error=error)
+    return result
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """获取全局后台任务队列（已注册分析任务）"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                queue = JobQueue()
+                queue.register("records_summary", summarize_records, validate_records_summary)
+                queue.register("report_review", review_report, validate_report_review)
+                _job_queue = queue
+    return _job_queue
+
+
+async def close_job_queue() -> None:
+    """关闭后台任务队列（应用退出时调用）；未使用过时什么也不做"""
+    if _job_queue is not None:
+        await _job_queue.close()
@@ -1,10 +1,26 @@
 """AI 健康助手主 Agent"""
-from typing import Dict, Any, Optional, List
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, Optional, List, AsyncIterator, Sequence
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from app.agents.tools import SymptomAnalyzer, EmergencyDetector, AppointmentManager, HealthRecordRetriever
+from app.services.llm_limiter import LLMConcurrencyLimiter, LLMQueueFullError
+from app.services.llm_client import LLMClientConfig, create_chat_model, is_retryable, retry_delay
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.session_store import create_session_store
+from app.services.response_cache import ResponseCache
+from app.services.summarizer import ConversationSummarizer
+from app.services.token_counter import estimate_messages_tokens, estimate_tokens
+from app.services.metrics import (
+    CACHE_HITS, CHAT_REQUEST_SECONDS, CHAT_STAGE_SECONDS, COMPLETION_TOKENS, EMERGENCY_HITS,
+    FALLBACK_REPLIES, LLM_CIRCUIT_STATE, LLM_COALESCED, LLM_ERRORS, LLM_IN_FLIGHT, LLM_RETRIES, LLM_SHORT_CIRCUITED,
+    LLM_WAITING, PROMPT_TOKENS,
+)
+from app.services.health_store import DEFAULT_USER_ID
+from app.services.rate_limiter import RateLimiter
+from app.services.single_flight import SingleFlight
+import asyncio
 import uuid
 import os
+import time
 
 # 医疗 AI 助手系统提示词
 MEDICAL_ASSISTANT_SYSTEM_PROMPT = """你是一位专业、可靠、负责任的医疗健康 AI 助手。你的核心职责是：
@@ -96,42 +112,292 @@ MEDICAL_ASSISTANT_SYSTEM_PROMPT = """你是一位专业、可靠、负责任的
 
 请严格按照以上格式要求回复，确保不使用任何特殊符号。"""
 
+# 免责声明（回复中缺少时追加），使用自然语言，不使用特殊符号
+DISCLAIMER_SUFFIX = "\n\n重要提示：以上建议仅供参考，不能替代专业医疗诊断。如有疑问或症状持续，请及时咨询专业医生。"
+
 class HealthAssistant:
     """健康助手 Agent"""
     
     def __init__(self):
-        # 从环境变量获取配置
-        api_key = os.getenv("OPENAI_API_KEY", "")
-        api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+        # 从环境变量获取配置（API 端点、超时、连接池和重试）
+        self.llm_config = LLMClientConfig()
         
-        # 初始化 LLM（支持自定义 API 端点）
-        # 注意：LangChain 使用 base_url 参数来设置自定义端点
-        self.llm = ChatOpenAI(
+        # 初始化 LLM（支持自定义 API 端点，使用共享连接池，SDK 内部不重试）
+        self.llm = create_chat_model(
+            self.llm_config,
             model="gpt-4o-mini",  # 使用更先进的模型
             temperature=0.3,  # 降低温度，使回答更准确、一致
-            openai_api_key=api_key,
-            base_url=api_base,  # 使用 base_url 设置自定义 API 端点
         )
         
+        # 上游连续失败时熔断，熔断期间直接使用备用回复
+        self.llm_breaker = CircuitBreaker("AI")
+        LLM_CIRCUIT_STATE.set_function(lambda: CircuitBreaker.STATE_CODES[self.llm_breaker.state])
+        
         # 初始化工具
         self.symptom_analyzer = SymptomAnalyzer()
         self.emergency_detector = EmergencyDetector()
         self.appointment_manager = AppointmentManager()
         self.health_record_retriever = HealthRecordRetriever()
         
-        # 会话记忆（使用简单的消息列表存储）
-        self.memories: Dict[str, List[BaseMessage]] = {}
+        # LLM 并发限制（超出并发上限的请求进入固定大小的等待队列）
+        self.llm_limiter = LLMConcurrencyLimiter()
+        LLM_IN_FLIGHT.set_function(lambda: self.llm_limiter.stats()["in_flight"])
+        LLM_WAITING.set_function(lambda: self.llm_limiter.stats()["waiting"])
+        
+        # 会话记忆（限制会话数、空闲过期，并按 token 预算裁剪历史）
+        # 多 worker 部署时设置 SESSION_BACKEND=sqlite，各进程共享会话
+        self.sessions = create_session_store()
+        
+        # 常见问题回复缓存（只缓存 LLM 正常生成的非紧急回复）
+        self.response_cache = ResponseCache()
+        
+        # 相同提示词的并发 LLM 调用只发起一次，其余请求共享结果
+        self.single_flight = SingleFlight()
+        
+        # 后台分析任务最多同时占用的 LLM 槽位数，其余槽位留给对话请求
+        self.job_llm_limiter = LLMConcurrencyLimiter(
+            max_concurrency=int(os.getenv("JOB_LLM_CONCURRENCY", 2)),
+            max_queue=int(os.getenv("JOB_MAX_QUEUE", 100)),
+            queue_timeout=float(os.getenv("JOB_TIMEOUT", 600)),
+        )
+        
+        # 批量接口发往 LLM 的总速率（所有批量任务共享）
+        self.batch_rate_limiter = RateLimiter(float(os.getenv("BATCH_RATE_PER_SECOND", 5)))
+        
+        # 较早的对话在后台折叠成摘要，提示词长度保持稳定
+        self.summarizer = ConversationSummarizer(self.llm, self.sessions, self.llm_limiter, self.llm_breaker)
+        
+        # 提示词 token 统计
+        self._prompt_requests = 0
+        self._prompt_tokens_total = 0
+    
+    async def stats(self) -> Dict[str, Any]:
+        """会话存储、回复缓存、摘要和 LLM 并发状态"""
+        return {
+            "sessions": await self.sessions.stats(),
+            "response_cache": self.response_cache.stats(),
+            "summarizer": self.summarizer.stats(),
+            "prompt": {
+                "requests": self._prompt_requests,
+                "tokens_total": self._prompt_tokens_total,
+                "tokens_avg": round(self._prompt_tokens_total / self._prompt_requests, 1) if self._prompt_requests else 0,
+            },
+            "llm": self.llm_limiter.stats(),
+            "llm_breaker": self.llm_breaker.stats(),
+            "single_flight": self.single_flight.stats(),
+            "retrieval": self.health_record_retriever.engine.stats(),
+            "symptom_rules": self.symptom_analyzer.engine.stats(),
+        }
+    
+    async def _get_context(self, session_id: str) -> List[BaseMessage]:
+        """会话上下文：历史摘要 + 最近的原始消息"""
+        snapshot = await self.sessions.snapshot(session_id)
+        return self.summarizer.context_messages(snapshot.summary) + snapshot.messages
+    
+    async def _retrieve_references(self, message: str, user_id: str) -> List[BaseMessage]:
+        """检索与问题相关的健康记录和知识片段，作为参考资料放进提示词"""
+        try:
+            snippets = await self.health_record_retriever.retrieve(message, user_id)
+        except Exception as e:
+            # 检索失败不影响对话，只是没有参考资料
+            print(f"检索错误: {e}")
+            return []
+        if not snippets:
+            return []
+        return [SystemMessage(content=self.health_record_retriever.format_context(snippets))]
+    
+    def _build_messages(self, context: List[BaseMessage], user_msg: HumanMessage) -> List[BaseMessage]:
+        """构建发送给 LLM 的消息列表，并记录提示词 token 数"""
+        # 统一使用系统提示词
+        messages: List[BaseMessage] = [SystemMessage(content=MEDICAL_ASSISTANT_SYSTEM_PROMPT)]
+        
+        # 添加摘要和最近的历史对话
+        messages.extend(context)
+        
+        # 添加当前用户消息
+        messages.append(user_msg)
+        return messages
+    
+    def _record_prompt_tokens(self, prompt_tokens: int) -> None:
+        """累计实际发送给 LLM 的提示词 token 数（合并的请求不重复计算）"""
+        self._prompt_requests += 1
+        self._prompt_tokens_total += prompt_tokens
+        PROMPT_TOKENS.inc(prompt_tokens)
+    
+    async def _remember(self, session_id: str, user_msg: HumanMessage, reply: str) -> None:
+        """保存本轮对话，必要时在后台更新摘要"""
+        await self.sessions.append(session_id, user_msg, AIMessage(content=reply))
+        await self.summarizer.maybe_schedule(session_id)
+    
+    @staticmethod
+    def _disclaimer_suffix(reply: str) -> str:
+        """回复缺少免责声明时需要追加的内容"""
+        if "仅供参考" not in reply and "不能替代" not in reply:
+            return DISCLAIMER_SUFFIX
+        return ""
+    
+    def _fallback_reply(self, message: str) -> str:
+        """LLM 不可用时，使用症状分析工具生成备用回复"""
+        symptom_analysis = self.symptom_analyzer.analyze(message)
+        # 命中症状规则时列出可能的原因和对应建议
+        analysis = ""
+        if symptom_analysis["matched_rules"]:
+            analysis = "\n".join(symptom_analysis["possible_conditions"]) + "\n\n"
+        advice = "\n".join(symptom_analysis["advice"])
+        if advice:
+            advice += "\n"
+        return f"""根据你的描述，我理解你的健康关切。
+
+{analysis}{symptom_analysis['recommendation']}
+
+建议：
+{advice}详细记录症状出现的时间、频率、严重程度，注意观察症状变化。如果症状持续、加重或出现其他不适，请及时就医。
+
+重要提示：本助手仅供参考，不能替代专业医疗诊断。如有紧急情况（如胸痛、呼吸困难、意识异常等），请立即拨打 120 或前往医院急诊科。
+
+抱歉，当前 AI 服务暂时不可用。建议你咨询专业医生获取更准确的医疗建议。"""
+    
+    def llm_status(self) -> Dict[str, Any]:
+        """LLM 熔断器、并发和客户端配置"""
+        return {
+            "circuit_breaker": self.llm_breaker.stats(),
+            "concurrency": self.llm_limiter.stats(),
+            "job_concurrency": self.job_llm_limiter.stats(),
+            "client": self.llm_config.to_dict(),
+        }
+    
+    def _record_llm_error(self, error: Exception) -> bool:
+        """
+        记录一次失败的 LLM 调用，返回是否值得重试
+        
+        超时、连接失败、限流和服务端错误计入熔断；请求本身有误的错误不影响熔断状态。
+        """
+        retryable = is_retryable(error)
+        if retryable:
+            self.llm_breaker.record_failure(error)
+        else:
+            self.llm_breaker.release_probe()
+        return retryable
+    
+    def _should_retry(self, attempt: int) -> bool:
+        """熔断器已打开时不再重试"""
+        return attempt < self.llm_config.max_retries and self.llm_breaker.state == CircuitBreaker.CLOSED
+    
+    async def _invoke_llm(self, messages: List[BaseMessage], prompt_tokens: int) -> Any:
+        """
+        在并发槽位内调用 LLM，分别记录排队和调用耗时
+        
+        熔断器打开时立即抛出 CircuitOpenError，不占用槽位；可重试的错误按指数退避
+        加抖动重试，最多 LLM_MAX_RETRIES 次。提示词 token 数在获得槽位、真正发出调用时才计入。
+        """
+        self.llm_breaker.before_call()
+        queued_at = time.perf_counter()
+        try:
+            async with self.llm_limiter.slot():
+                called_at = time.perf_counter()
+                CHAT_STAGE_SECONDS.observe(called_at - queued_at, stage="queue")
+                self._record_prompt_tokens(prompt_tokens)
+                try:
+                    attempt = 0
+                    while True:
+                        try:
+                            response = await self.llm.ainvoke(messages)
+                        except asyncio.CancelledError:
+                            self.llm_breaker.release_probe()
+                            raise
+                        except Exception as e:
+                            if not (self._record_llm_error(e) and self._should_retry(attempt)):
+                                raise
+                            LLM_RETRIES.inc()
+                            await asyncio.sleep(retry_delay(attempt, self.llm_config))
+                            attempt += 1
+                            continue
+                        self.llm_breaker.record_success()
+                        return response
+                finally:
+                    CHAT_STAGE_SECONDS.observe(time.perf_counter() - called_at, stage="llm")
+        except LLMQueueFullError:
+            self.llm_breaker.release_probe()
+            raise
+    
+    async def _stream_llm(self, messages: List[BaseMessage], prompt_tokens: int) -> AsyncIterator[str]:
+        """
+        在并发槽位内流式调用 LLM，逐段产出回复文本（合并调用时由多个请求共享）
+        
+        获得槽位后先产出一个空字符串表示调用已开始，熔断器打开或排队已满时在此之前抛出；
+        还没有产出内容时可重试的错误按退避重试，最终失败时抛出，由各请求自行生成备用回复。
+        提示词 token 数在获得槽位之后才计入。
+        """
+        self.llm_breaker.before_call()
+        queued_at = time.perf_counter()
+        try:
+            async with self.llm_limiter.slot():
+                called_at = time.perf_counter()
+                CHAT_STAGE_SECONDS.observe(called_at - queued_at, stage="queue")
+                self._record_prompt_tokens(prompt_tokens)
+                yield ""
+                produced = False
+                attempt = 0
+                try:
+                    while True:
+                        try:
+                            async for chunk in self.llm.astream(messages):
+                                if chunk.content:
+                                    if not produced:
+                                        produced = True
+                                        CHAT_STAGE_SECONDS.observe(time.perf_counter() - called_at, stage="llm_first_token")
+                                    yield chunk.content
+                        except Exception as e:
+                            if self._record_llm_error(e) and not produced and self._should_retry(attempt):
+                                LLM_RETRIES.inc()
+                                await asyncio.sleep(retry_delay(attempt, self.llm_config))
+                                attempt += 1
+                                continue
+                            print(f"LLM 流式调用错误: {e}")
+                            LLM_ERRORS.inc(error=type(e).__name__)
+                            raise
+                        self.llm_breaker.record_success()
+                        return
+                finally:
+                    CHAT_STAGE_SECONDS.observe(time.perf_counter() - called_at, stage="llm")
+        except (asyncio.CancelledError, GeneratorExit):
+            # 客户端断开或请求被取消时没有得出结果，交还探测名额
+            self.llm_breaker.release_probe()
+            raise
+        except LLMQueueFullError:
+            self.llm_breaker.release_probe()
+            raise
     
-    def _get_memory(self, session_id: str) -> List[BaseMessage]:
-        """获取或创建会话记忆"""
-        if session_id not in self.memories:
-            self.memories[session_id] = []
-        return self.memories[session_id]
+    async def complete(self, system_prompt: str, content: str) -> str:
+        """
+        单轮调用 LLM（后台分析任务用），不读写会话记忆、不使用回复缓存
+        
+        先在后台任务专用的限制器中排队，再占用对话共享的并发槽位，后台任务不会挤占全部槽位。
+        失败时抛出异常，由调用方决定如何降级。
+        """
+        messages: List[BaseMessage] = [SystemMessage(content=system_prompt), HumanMessage(content=content)]
+        async with self.job_llm_limiter.slot():
+            try:
+                response = await self._invoke_llm(messages, estimate_messages_tokens(messages))
+            except CircuitOpenError:
+                LLM_SHORT_CIRCUITED.inc()
+                raise
+            except LLMQueueFullError:
+                raise
+            except Exception as e:
+                print(f"LLM 调用错误: {e}")
+                LLM_ERRORS.inc(error=type(e).__name__)
+                raise
+        COMPLETION_TOKENS.inc(estimate_tokens(response.content))
+        return response.content
     
     async def process_message(
         self,
         message: str,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        user_id: str = DEFAULT_USER_ID,
+        skip_emergency_check: bool = False,
+        remember: bool = True
     ) -> Dict[str, Any]:
         """
         处理用户消息
@@ -139,70 +405,328 @@ class HealthAssistant:
         Args:
             message: 用户消息
             session_id: 会话 ID，如果为 None 则创建新会话
+            user_id: 用户 ID，用于检索该用户的健康记录
+            skip_emergency_check: 调用方已做过紧急情况检测时跳过（批量处理）
+            remember: 是否把本轮对话写入会话记忆
         
         Returns:
             包含回复消息、会话 ID 和紧急标志的字典
         """
+        started = time.perf_counter()
+        
         # 生成或使用会话 ID
         if not session_id:
             session_id = str(uuid.uuid4())
         
-        # 获取会话记忆
-        memory = self._get_memory(session_id)
+        # 获取会话上下文（摘要 + 最近消息）
+        with CHAT_STAGE_SECONDS.time(stage="context"):
+            context = await self._get_context(session_id)
         
         # 检测紧急情况
-        emergency_check = self.emergency_detector.detect(message)
+        if skip_emergency_check:
+            emergency_check = {"is_emergency": False}
+        else:
+            with CHAT_STAGE_SECONDS.time(stage="emergency"):
+                emergency_check = self.emergency_detector.detect(message)
         if emergency_check["is_emergency"]:
+            EMERGENCY_HITS.inc()
+            CHAT_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="chat", outcome="emergency")
             return {
                 "message": emergency_check["message"],
                 "session_id": session_id,
                 "emergency": True
             }
         
-        # 构建消息列表（统一使用系统提示词）
-        messages = [SystemMessage(content=MEDICAL_ASSISTANT_SYSTEM_PROMPT)]
+        user_msg = HumanMessage(content=message)
         
-        # 添加历史对话（保留最近 6 轮对话，即 12 条消息）
-        history = memory
-        for msg in history[-12:]:  # 保留更多上下文
-            messages.append(msg)
+        # 检索参考资料，放在历史对话之前；参考资料不同时缓存键也不同
+        with CHAT_STAGE_SECONDS.time(stage="retrieval"):
+            context = await self._retrieve_references(message, user_id) + context
         
-        # 添加当前用户消息
-        user_msg = HumanMessage(content=message)
-        messages.append(user_msg)
+        # 查询回复缓存（紧急情况已在上面返回，不会进入缓存）
+        with CHAT_STAGE_SECONDS.time(stage="cache"):
+            cache_key = ResponseCache.make_key(message, context)
+            reply = self.response_cache.get(cache_key)
+        cached = reply is not None
+        outcome = "cached" if cached else "llm"
+        prompt_tokens = 0
         
-        try:
-            # 调用 LLM
-            response = self.llm.invoke(messages)
-            reply = response.content
+        if cached:
+            CACHE_HITS.inc()
+        else:
+            with CHAT_STAGE_SECONDS.time(stage="prompt"):
+                messages = self._build_messages(context, user_msg)
+                prompt_tokens = estimate_messages_tokens(messages)
             
-            # 确保回复包含免责声明（如果没有），使用自然语言，不使用特殊符号
-            if "仅供参考" not in reply and "不能替代" not in reply:
-                reply += "\n\n重要提示：以上建议仅供参考，不能替代专业医疗诊断。如有疑问或症状持续，请及时咨询专业医生。"
-                
-        except Exception as e:
-            # 如果 LLM 调用失败，使用备用回复
-            print(f"LLM 调用错误: {e}")
+            async def call_llm() -> Any:
+                try:
+                    return await self._invoke_llm(messages, prompt_tokens)
+                except (LLMQueueFullError, CircuitOpenError):
+                    raise
+                except Exception as e:
+                    # 上游错误只记录一次，合并的请求各自使用备用回复
+                    print(f"LLM 调用错误: {e}")
+                    LLM_ERRORS.inc(error=type(e).__name__)
+                    raise
             
-            # 尝试使用症状分析工具作为备用
-            symptom_analysis = self.symptom_analyzer.analyze(message)
-            reply = f"""根据你的描述，我理解你的健康关切。
-
-{symptom_analysis['recommendation']}
-
-建议：
-详细记录症状出现的时间、频率、严重程度，注意观察症状变化。如果症状持续、加重或出现其他不适，请及时就医。
-
-重要提示：本助手仅供参考，不能替代专业医疗诊断。如有紧急情况（如胸痛、呼吸困难、意识异常等），请立即拨打 120 或前往医院急诊科。
-
-抱歉，当前 AI 服务暂时不可用。建议你咨询专业医生获取更准确的医疗建议。"""
+            try:
+                # 异步调用 LLM，不阻塞事件循环；相同提示词的调用正在进行时共享其结果
+                response, shared = await self.single_flight.do(cache_key, call_llm)
+                reply = response.content
+                if shared:
+                    LLM_COALESCED.inc()
+                    outcome = "coalesced"
+                    prompt_tokens = 0
+                else:
+                    COMPLETION_TOKENS.inc(estimate_tokens(reply))
+                
+                # 确保回复包含免责声明
+                reply += self._disclaimer_suffix(reply)
+                
+                # 只缓存 LLM 正常生成的回复，备用回复不缓存
+                self.response_cache.put(cache_key, reply)
+                    
+            except LLMQueueFullError:
+                # 排队已满时直接拒绝，由路由层返回 503
+                CHAT_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="chat", outcome="rejected")
+                raise
+            except CircuitOpenError:
+                # 熔断中，不等待上游超时，直接使用备用回复；提示词没有发出
+                LLM_SHORT_CIRCUITED.inc()
+                FALLBACK_REPLIES.inc()
+                outcome = "fallback"
+                prompt_tokens = 0
+                with CHAT_STAGE_SECONDS.time(stage="fallback"):
+                    reply = self._fallback_reply(message)
+            except Exception:
+                # 如果 LLM 调用失败，使用备用回复
+                FALLBACK_REPLIES.inc()
+                outcome = "fallback"
+                with CHAT_STAGE_SECONDS.time(stage="fallback"):
+                    reply = self._fallback_reply(message)
         
         # 保存到记忆
-        memory.append(user_msg)
-        memory.append(AIMessage(content=reply))
+        if remember:
+            with CHAT_STAGE_SECONDS.time(stage="remember"):
+                await self._remember(session_id, user_msg, reply)
         
+        CHAT_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="chat", outcome=outcome)
         return {
             "message": reply,
             "session_id": session_id,
-            "emergency": False
+            "emergency": False,
+            "cached": cached,
+            "fallback": outcome == "fallback",
+            "prompt_tokens": prompt_tokens
         }
+    
+    async def stream_message(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        user_id: str = DEFAULT_USER_ID
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式处理用户消息，逐个产出事件
+        
+        事件类型：
+            meta: 开始生成，携带会话 ID（获得 LLM 调用槽位之后产出）
+            token: 一段回复文本
+            done: 回复结束，携带会话 ID 和紧急标志
+        
+        免责声明的追加和记忆写入都在整段回复生成完成后进行。
+        等待队列已满时，在产出第一个事件之前抛出 LLMQueueFullError。
+        """
+        started = time.perf_counter()
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        
+        with CHAT_STAGE_SECONDS.time(stage="context"):
+            context = await self._get_context(session_id)
+        
+        # 紧急情况直接返回固定提示，不调用 LLM
+        with CHAT_STAGE_SECONDS.time(stage="emergency"):
+            emergency_check = self.emergency_detector.detect(message)
+        if emergency_check["is_emergency"]:
+            EMERGENCY_HITS.inc()
+            CHAT_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="stream", outcome="emergency")
+            yield {"type": "meta", "session_id": session_id}
+            yield {"type": "token", "content": emergency_check["message"]}
+            yield {"type": "done", "session_id": session_id, "emergency": True}
+            return
+        
+        user_msg = HumanMessage(content=message)
+        with CHAT_STAGE_SECONDS.time(stage="retrieval"):
+            context = await self._retrieve_references(message, user_id) + context
+        
+        # 命中回复缓存时一次性返回
+        with CHAT_STAGE_SECONDS.time(stage="cache"):
+            cache_key = ResponseCache.make_key(message, context)
+            cached_reply = self.response_cache.get(cache_key)
+        if cached_reply is not None:
+            CACHE_HITS.inc()
+            await self._remember(session_id, user_msg, cached_reply)
+            CHAT_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="stream", outcome="cached")
+            yield {"type": "meta", "session_id": session_id}
+            yield {"type": "token", "content": cached_reply}
+            yield {"type": "done", "session_id": session_id, "emergency": False, "prompt_tokens": 0}
+            return
+        
+        with CHAT_STAGE_SECONDS.time(stage="prompt"):
+            messages = self._build_messages(context, user_msg)
+            prompt_tokens = estimate_messages_tokens(messages)
+        parts: List[str] = []
+        failed = False
+        began = False
+        
+        # 相同提示词的流式调用正在进行时加入它，从头接收已生成的内容
+        subscription = self.single_flight.stream(cache_key, lambda: self._stream_llm(messages, prompt_tokens))
+        try:
+            async for piece in subscription:
+                if not began:
+                    began = True
+                    yield {"type": "meta", "session_id": session_id}
+                if piece:
+                    parts.append(piece)
+                    yield {"type": "token", "content": piece}
+        except CircuitOpenError:
+            # 熔断中，直接输出备用回复；提示词没有发出
+            LLM_SHORT_CIRCUITED.inc()
+            FALLBACK_REPLIES.inc()
+            failed = True
+            prompt_tokens = 0
+            parts.append(self._fallback_reply(message))
+            yield {"type": "meta", "session_id": session_id}
+            yield {"type": "token", "content": parts[0]}
+        except LLMQueueFullError:
+            CHAT_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="stream", outcome="rejected")
+            raise
+        except Exception:
+            failed = True
+            if not began:
+                yield {"type": "meta", "session_id": session_id}
+            if parts:
+                # 已输出部分内容，只提示中断
+                tail = "\n\n抱歉，回复生成中断，以上内容可能不完整。"
+            else:
+                FALLBACK_REPLIES.inc()
+                tail = self._fallback_reply(message)
+            parts.append(tail)
+            yield {"type": "token", "content": tail}
+        finally:
+            subscription.close()
+        
+        outcome = "fallback" if failed else "llm"
+        if subscription.shared:
+            LLM_COALESCED.inc()
+            prompt_tokens = 0
+            if not failed:
+                outcome = "coalesced"
+        
+        # 在完整回复上补充免责声明
+        reply = "".join(parts)
+        if outcome == "llm":
+            COMPLETION_TOKENS.inc(estimate_tokens(reply))
+        suffix = self._disclaimer_suffix(reply)
+        if suffix:
+            reply += suffix
+            yield {"type": "token", "content": suffix}
+        
+        if not failed:
+            self.response_cache.put(cache_key, reply)
+        
+        # 保存到记忆
+        await self._remember(session_id, user_msg, reply)
+        
+        CHAT_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, endpoint="stream", outcome=outcome
+        )
+        yield {"type": "done", "session_id": session_id, "emergency": False, "prompt_tokens": prompt_tokens}
+    
+    async def process_batch(
+        self,
+        items: Sequence[Dict[str, Any]],
+        concurrency: int = 4,
+        max_retries: int = 3
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量处理消息，按完成顺序逐条产出结果
+        
+        整批消息先一次性做紧急情况检测，紧急消息立即返回；其余消息由 concurrency 个
+        工作协程按共享速率限制依次调用 LLM。结果队列有界，消费方读取变慢时工作协程
+        随之暂停，内存占用与批量大小无关。
+        
+        Args:
+            items: [{"message", "id"?, "session_id"?, "user_id"?}, ...]
+                   没有 session_id 的消息不写入会话记忆
+            concurrency: 同时处理的消息数
+            max_retries: LLM 排队已满时的重试次数
+        
+        Returns:
+            每条结果包含 index、id、status（ok / error），成功时另有 message、emergency、
+            fallback、session_id，失败时另有 error
+        """
+        checks = self.emergency_detector.detect_batch([item["message"] for item in items])
+        
+        pending: List[int] = []
+        for index, (item, check) in enumerate(zip(items, checks)):
+            if check["is_emergency"]:
+                EMERGENCY_HITS.inc()
+                yield {
+                    "index": index,
+                    "id": item.get("id"),
+                    "status": "ok",
+                    "emergency": True,
+                    "fallback": False,
+                    "message": check["message"],
+                    "session_id": item.get("session_id"),
+                }
+            else:
+                pending.append(index)
+        
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=concurrency * 2)
+        next_index = iter(pending)
+        
+        async def handle(index: int) -> Dict[str, Any]:
+            item = items[index]
+            result = {"index": index, "id": item.get("id")}
+            for attempt in range(max_retries + 1):
+                await self.batch_rate_limiter.acquire()
+                try:
+                    response = await self.process_message(
+                        item["message"],
+                        item.get("session_id"),
+                        item.get("user_id") or DEFAULT_USER_ID,
+                        skip_emergency_check=True,
+                        remember=bool(item.get("session_id")),
+                    )
+                except LLMQueueFullError as e:
+                    if attempt < max_retries:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    return {**result, "status": "error", "error": str(e)}
+                except Exception as e:
+                    return {**result, "status": "error", "error": f"{type(e).__name__}: {e}"}
+                return {
+                    **result,
+                    "status": "ok",
+                    "emergency": False,
+                    "fallback": response["fallback"],
+                    "message": response["message"],
+                    "session_id": item.get("session_id"),
+                }
+            return {**result, "status": "error", "error": "重试次数已用完"}
+        
+        async def worker() -> None:
+            for index in next_index:
+                await queue.put(await handle(index))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(pending)))]
+        try:
+            for _ in range(len(pending)):
+                yield await queue.get()
+        finally:
+            # 客户端断开时取消尚未完成的工作
+            for task in workers:
+                task.cancel()
+
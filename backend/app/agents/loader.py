@@ -0,0 +1,70 @@
+"""
+健康助手的延迟加载
+
+HealthAssistant 依赖 langchain / openai / numpy，导入和初始化需要一秒以上。
+路由模块不直接导入它，而是在第一次对话时（或启动后的后台预热中）加载，
+使 /health 和不依赖 LLM 的数据接口在进程启动后立即可用。
+"""
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from app.agents.health_assistant import HealthAssistant
+
+_assistant: Optional["HealthAssistant"] = None
+_lock = threading.Lock()
+_status: Dict[str, Any] = {"state": "idle", "load_seconds": None, "error": None}
+
+
+def get_health_assistant() -> "HealthAssistant":
+    """获取全局健康助手，第一次调用时导入并初始化（阻塞）"""
+    global _assistant
+    if _assistant is None:
+        with _lock:
+            if _assistant is None:
+                _status.update(state="loading", error=None)
+                start = time.perf_counter()
+                try:
+                    from app.agents.health_assistant import HealthAssistant
+
+                    _assistant = HealthAssistant()
+                except Exception as e:
+                    # 下一次调用会重新尝试加载
+                    _status.update(state="failed", error=f"{type(e).__name__}: {e}")
+                    raise
+                _status.update(state="ready", load_seconds=round(time.perf_counter() - start, 3))
+    return _assistant
+
+
+async def load_health_assistant() -> "HealthAssistant":
+    """异步获取健康助手，加载在线程中进行，不阻塞事件循环"""
+    if _assistant is not None:
+        return _assistant
+    return await asyncio.to_thread(get_health_assistant)
+
+
+def start_warmup() -> asyncio.Task:
+    """在后台加载健康助手（应用启动时调用）"""
+    async def warmup() -> None:
+        try:
+            await load_health_assistant()
+        except Exception as e:
+            print(f"健康助手加载失败: {e}")
+
+    return asyncio.create_task(warmup())
+
+
+async def close_health_assistant() -> None:
+    """关闭健康助手持有的连接池（应用退出时调用）；未加载过时什么也不做"""
+    if _assistant is None:
+        return
+    from app.services.llm_client import close_http_clients
+
+    await close_http_clients()
+
+
+def assistant_status() -> Dict[str, Any]:
+    """加载状态：idle / loading / ready / failed"""
+    return dict(_status)
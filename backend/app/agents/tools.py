@@ -1,36 +1,50 @@
 """健康助手工具定义"""
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import re
+from app.services.keyword_matcher import KeywordMatcher, load_keyword_file, resolve_data_path
+from app.services.symptom_rules import SymptomRuleEngine, get_symptom_rule_engine
+from app.services.appointment_booking import AppointmentBooking, SlotUnavailableError, get_appointment_booking
+from app.services.health_store import DEFAULT_USER_ID, get_health_store
+from app.services.retrieval import RetrievalEngine, get_retrieval_engine
 
 class SymptomAnalyzer:
-    """症状分析工具"""
+    """症状分析工具（基于 app/data/symptom_rules.json 中的症状规则）"""
+    
+    RECOMMENDATION = "建议：如果症状持续或加重，请及时就医。本分析仅供参考，不能替代专业医疗诊断。"
+    
+    def __init__(self, engine: Optional[SymptomRuleEngine] = None, max_rules: int = 3):
+        """
+        Args:
+            engine: 症状规则引擎，默认使用全局引擎（规则文件修改后自动重新加载）
+            max_rules: 最多返回的命中规则数
+        """
+        self.engine = engine or get_symptom_rule_engine()
+        self.max_rules = max_rules
     
     def analyze(self, symptoms: str) -> Dict[str, Any]:
         """
         分析用户描述的症状
-        注意：这是简化版本，实际应该连接医疗知识库
+        
+        消息只扫描一次，命中的规则按具体程度排序（同时出现的症状越多越靠前）。
+        注意：规则匹配只能给出常见原因的参考，不能替代医生诊断
         """
-        symptoms_lower = symptoms.lower()
+        found, rules = self.engine.match(symptoms, limit=self.max_rules)
         
-        # 简单的关键词匹配（实际应该使用更复杂的 NLP 模型）
         possible_conditions = []
-        
-        if any(word in symptoms_lower for word in ['头痛', '头疼', 'headache']):
-            possible_conditions.append("可能的原因包括：紧张性头痛、偏头痛、感冒等")
-        
-        if any(word in symptoms_lower for word in ['咳嗽', 'cough']):
-            possible_conditions.append("可能的原因包括：感冒、支气管炎、过敏等")
-        
-        if any(word in symptoms_lower for word in ['发烧', 'fever', '发热']):
-            possible_conditions.append("可能的原因包括：感染、炎症等")
+        for rule in rules:
+            if rule.conditions:
+                possible_conditions.append(f"{'、'.join(rule.symptoms)}：可能的原因包括{'、'.join(rule.conditions)}等")
         
         if not possible_conditions:
             possible_conditions.append("建议详细描述症状，或咨询专业医生")
         
         return {
             "symptoms": symptoms,
+            "matched_symptoms": found,
+            "matched_rules": [rule.id for rule in rules],
             "possible_conditions": possible_conditions,
-            "recommendation": "建议：如果症状持续或加重，请及时就医。本分析仅供参考，不能替代专业医疗诊断。"
+            "advice": [rule.advice for rule in rules if rule.advice],
+            "recommendation": self.RECOMMENDATION
         }
 
 class EmergencyDetector:
@@ -64,16 +78,56 @@ class EmergencyDetector:
         '急性肾衰竭', '急性肝衰竭',
     ]
     
+    # 编译后的匹配器缓存（按词表文件路径），所有实例共享，只构建一次
+    _compiled: Dict[Optional[str], Tuple[KeywordMatcher, Dict[str, int]]] = {}
+    
+    def __init__(self, keywords_file: Optional[str] = None):
+        """
+        Args:
+            keywords_file: 扩展词表文件，默认读取 EMERGENCY_KEYWORDS_FILE 或 app/data/emergency_keywords.txt
+        """
+        path = keywords_file or resolve_data_path("EMERGENCY_KEYWORDS_FILE", "emergency_keywords.txt")
+        if path not in self._compiled:
+            self._compiled[path] = self._compile(path)
+        self._matcher, self._keyword_order = self._compiled[path]
+    
+    @classmethod
+    def _compile(cls, path: Optional[str]) -> Tuple[KeywordMatcher, Dict[str, int]]:
+        """把内置关键词和词表文件编译成一个 Aho-Corasick 自动机"""
+        matcher = KeywordMatcher()
+        # 标准词 -> 顺序，用于让命中结果保持词表中的先后顺序
+        order: Dict[str, int] = {}
+        
+        entries: List[Tuple[str, List[str]]] = [(keyword, []) for keyword in cls.EMERGENCY_KEYWORDS]
+        if path:
+            entries.extend(load_keyword_file(path))
+        
+        for term, synonyms in entries:
+            order.setdefault(term, len(order))
+            matcher.add(term, term)
+            for synonym in synonyms:
+                matcher.add(synonym, term)
+        return matcher.build(), order
+    
+    def match_keywords(self, message: str) -> List[str]:
+        """单次扫描找出消息中命中的全部紧急关键词（按词表顺序）"""
+        return sorted(self._matcher.find_all(message), key=self._keyword_order.__getitem__)
+    
     def detect(self, message: str) -> Dict[str, Any]:
         """检测紧急情况"""
-        message_lower = message.lower()
-        
         # 检查是否包含紧急关键词
-        matched_keywords = []
-        for keyword in self.EMERGENCY_KEYWORDS:
-            if keyword.lower() in message_lower:
-                matched_keywords.append(keyword)
-        
+        return self._result(self.match_keywords(message))
+    
+    def detect_batch(self, messages: List[str]) -> List[Dict[str, Any]]:
+        """批量检测紧急情况，整批消息只扫描一遍"""
+        order = self._keyword_order.__getitem__
+        return [
+            self._result(sorted(found, key=order))
+            for found in self._matcher.find_all_batch(messages)
+        ]
+    
+    def _result(self, matched_keywords: List[str]) -> Dict[str, Any]:
+        """根据命中的关键词生成检测结果"""
         if matched_keywords:
             # 构建更详细的紧急提示信息（使用自然语言，不使用特殊符号）
             emergency_message = f"""根据你的描述，检测到可能涉及紧急医疗情况的关键词：{', '.join(matched_keywords[:3])}
@@ -105,28 +159,66 @@ class EmergencyDetector:
         }
 
 class AppointmentManager:
-    """预约管理工具"""
+    """预约管理工具（号源由 AppointmentBooking 分配，同一号源不会被重复预约）"""
+    
+    def __init__(self, booking: Optional[AppointmentBooking] = None):
+        self._booking = booking
     
-    def create_appointment(self, doctor: str, date: str, time: str) -> Dict[str, Any]:
-        """创建预约"""
+    @property
+    def booking(self) -> AppointmentBooking:
+        # 首次预约时才加载排班文件
+        if self._booking is None:
+            self._booking = get_appointment_booking()
+        return self._booking
+    
+    async def create_appointment(self, doctor_id: str, date: str, time: str, user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
+        """预约号源，号源无效或已被预约时 success 为 False"""
+        try:
+            appointment = await self.booking.book(user_id, doctor_id, date, time)
+        except (ValueError, SlotUnavailableError) as e:
+            return {"success": False, "message": str(e)}
         return {
             "success": True,
-            "appointment_id": f"apt_{date}_{time}",
-            "doctor": doctor,
-            "date": date,
-            "time": time,
-            "status": "待确认"
+            "appointment_id": appointment["id"],
+            "doctor": appointment["doctor"],
+            "department": appointment["department"],
+            "date": appointment["date"],
+            "time": appointment["time"],
+            "status": appointment["status"]
         }
     
-    def get_appointments(self) -> list:
-        """获取预约列表"""
-        # 模拟数据
-        return []
+    async def get_appointments(self, user_id: str = DEFAULT_USER_ID) -> list:
+        """获取最近的预约列表"""
+        appointments, _ = await get_health_store().list_appointments(user_id)
+        return appointments
 
 class HealthRecordRetriever:
-    """健康记录检索工具"""
+    """健康记录检索工具（用户健康记录 + 健康知识，本地向量检索）"""
+    
+    def __init__(self, engine: Optional[RetrievalEngine] = None):
+        self._engine = engine
+    
+    @property
+    def engine(self) -> RetrievalEngine:
+        # 首次检索时才创建，数据库和知识库也在那时加载
+        if self._engine is None:
+            self._engine = get_retrieval_engine()
+        return self._engine
+    
+    async def retrieve(self, query: str, user_id: str = DEFAULT_USER_ID, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        检索与问题相关的健康记录和知识片段
+        
+        Returns:
+            [{"source": "record" | "knowledge", "id", "title", "text", "score"}, ...]
+        """
+        return await self.engine.retrieve(query, user_id, k)
     
-    def retrieve(self, query: str) -> list:
-        """检索健康记录"""
-        # 模拟数据，实际应该从数据库检索
-        return []
+    @staticmethod
+    def format_context(snippets: List[Dict[str, Any]]) -> str:
+        """把检索结果整理成提示词中的参考资料"""
+        lines = ["以下是与用户问题可能相关的参考资料，回答时可以结合使用，不相关的请忽略："]
+        for i, snippet in enumerate(snippets, 1):
+            label = "健康记录" if snippet["source"] == "record" else "健康知识"
+            lines.append(f"{i}. [{label}：{snippet['title']}] {snippet['text']}")
+        return "\n".join(lines)
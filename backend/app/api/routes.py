@@ -1,29 +1,80 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-from app.agents.health_assistant import HealthAssistant
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import os
+import time
+from app.agents.analysis_jobs import get_job_queue
+from app.agents.loader import load_health_assistant
+from app.models.health_record import HealthData
+from app.services.appointment_booking import SlotUnavailableError, get_appointment_booking
+from app.services.exporter import EXPORT_FORMATS, get_exporter, gzip_stream
+from app.services.health_store import DEFAULT_USER_ID, get_health_store
+from app.services.http_cache import choose_encoding, etag_matches, get_http_cache, make_etag
+from app.services.job_queue import JobQueueFullError
+from app.services.knowledge_index import get_knowledge_base
+from app.services.llm_limiter import LLMQueueFullError
+from app.services.metrics import HTTP_CACHE_RESPONSES, HTTP_RESPONSE_BYTES
+from app.services.notification_store import get_notification_store
+from app.services.reminder_scheduler import get_reminder_scheduler
+from app.services.reminder_store import get_reminder_store
+from app.services.vitals_store import MAX_TIMESTAMP, RESOLUTIONS, get_vitals_store
+
+if TYPE_CHECKING:
+    from app.agents.health_assistant import HealthAssistant
 
 router = APIRouter()
 
-# 初始化健康助手
-health_assistant = HealthAssistant()
+# 健康助手在第一次使用时（或启动后的后台预热中）加载，见 app/agents/loader.py
+async def _health_assistant() -> "HealthAssistant":
+    """获取健康助手；加载失败（如未配置 OPENAI_API_KEY）时返回 503"""
+    try:
+        return await load_health_assistant()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"AI 服务未就绪: {e}", headers={"Retry-After": "5"})
 
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    user_id: str = DEFAULT_USER_ID
 
 class ChatResponse(BaseModel):
     message: str
     session_id: str
     emergency: bool = False
+    prompt_tokens: int = 0  # 本次请求发送给 LLM 的提示词 token 数（估算）
+
+class BatchChatItem(BaseModel):
+    id: Optional[str] = None  # 调用方自定义的标识，原样返回
+    message: str
+    session_id: Optional[str] = None  # 不传时不写入会话记忆
+    user_id: str = DEFAULT_USER_ID
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    concurrency: Optional[int] = None
+
+# 批量对话：默认并发数和单次请求的条数上限
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 5000))
 
 class HealthRecord(BaseModel):
     id: str
     date: str
     type: str
-    doctor: str
+    doctor: Optional[str] = None
     summary: str
 
+class HealthRecordCreate(BaseModel):
+    user_id: str = DEFAULT_USER_ID
+    date: str
+    type: str
+    doctor: Optional[str] = None
+    summary: str
+    details: Optional[dict] = None
+
 class Appointment(BaseModel):
     id: str
     doctor: str
@@ -32,65 +83,787 @@ class Appointment(BaseModel):
     time: str
     status: str
 
+class AppointmentCreate(BaseModel):
+    user_id: str = DEFAULT_USER_ID
+    doctor_id: str
+    date: str  # YYYY-MM-DD
+    time: str  # HH:MM，号源开始时间（见 /appointments/slots）
+
+class VitalsSeries(BaseModel):
+    """一个指标的一批读数（列式：时间戳与数值一一对应）"""
+    metric: str  # 如 heart_rate、bp_systolic、bp_diastolic、temperature、spo2
+    timestamps: List[float]  # Unix 时间戳（秒）
+    values: List[float]
+
+class VitalsBatch(BaseModel):
+    user_id: str = DEFAULT_USER_ID
+    series: List[VitalsSeries]
+
+class KnowledgeArticle(BaseModel):
+    id: str
+    title: str
+    category: str = "general"
+    summary: str = ""
+    content: str = ""
+    tags: List[str] = []
+    updatedAt: Optional[str] = None
+
+class ReminderCreate(BaseModel):
+    user_id: str = DEFAULT_USER_ID
+    kind: str = "medication"  # medication / checkup / custom
+    title: str
+    body: Optional[str] = None
+    frequency: str = "daily"  # once / daily / weekly / days / months
+    every: int = 1  # frequency 为 days / months 时的间隔
+    start_date: str  # YYYY-MM-DD，第一次提醒的日期
+    time_of_day: str = "08:00"  # HH:MM
+    enabled: bool = True
+
+class ReminderUpdate(BaseModel):
+    kind: Optional[str] = None
+    title: Optional[str] = None
+    body: Optional[str] = None
+    frequency: Optional[str] = None
+    every: Optional[int] = None
+    start_date: Optional[str] = None
+    time_of_day: Optional[str] = None
+    enabled: Optional[bool] = None
+
+class Reminder(ReminderCreate):
+    id: str
+    next_fire_at: Optional[float] = None  # 下次提醒时间（Unix 秒），不再提醒时为 null
+    last_fired_at: Optional[float] = None
+    created_at: str
+    updated_at: str
+
+class NotificationCreate(BaseModel):
+    user_id: str = DEFAULT_USER_ID
+    type: str = "system"  # message / lab / medication / system
+    title: str
+    body: Optional[str] = None
+    read: bool = False
+
+class Notification(NotificationCreate):
+    id: str
+    seq: int  # 写入顺序
+    rev: int  # 最后一次修改时的版本号
+    created_at: str
+
+class NotificationRead(BaseModel):
+    user_id: str = DEFAULT_USER_ID
+    ids: Optional[List[str]] = None  # 不传时全部标为已读
+
+class JobCreate(BaseModel):
+    type: str  # records_summary / report_review
+    user_id: str = DEFAULT_USER_ID
+    params: Dict[str, Any] = {}
+
+_RECORDS_ADAPTER = TypeAdapter(List[HealthRecord])
+_APPOINTMENTS_ADAPTER = TypeAdapter(List[Appointment])
+_ARTICLE_ADAPTER = TypeAdapter(KnowledgeArticle)
+
+# 提醒、通知推送流的心跳间隔（秒），防止代理因空闲断开连接
+REMINDER_STREAM_HEARTBEAT = 15
+
+# 一次最多修改的通知 ID 数
+NOTIFICATION_MAX_IDS = 500
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """处理用户对话请求"""
+    health_assistant = await _health_assistant()
     try:
         response = await health_assistant.process_message(
             request.message,
-            request.session_id
+            request.session_id,
+            request.user_id
         )
         return ChatResponse(
             message=response["message"],
             session_id=response["session_id"],
-            emergency=response.get("emergency", False)
+            emergency=response.get("emergency", False),
+            prompt_tokens=response.get("prompt_tokens", 0)
         )
+    except LLMQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _json_bytes(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+async def _cached_json(
+    request: Request,
+    endpoint: str,
+    scope: str,
+    version: Any,
+    build: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]],
+    private: bool = True,
+) -> Response:
+    """
+    带 ETag 的 JSON 响应
+
+    ETag 由请求路径、查询参数和数据版本生成：If-None-Match 匹配时直接返回 304，不查询也不序列化；
+    否则优先使用缓存的序列化结果（和压缩结果），都没有时才调用 build() 查询并序列化。
+    build 返回 (响应体, 额外的响应头)。
+    """
+    key = f"{request.url.path}?{request.url.query}"
+    etag = make_etag(key, version)
+    headers = {
+        "ETag": etag,
+        # 浏览器可以缓存，但每次使用前都要用 If-None-Match 确认
+        "Cache-Control": "private, no-cache" if private else "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        HTTP_CACHE_RESPONSES.inc(endpoint=endpoint, outcome="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    cache = get_http_cache()
+    entry = cache.get(key, etag)
+    if entry is None:
+        body, extra_headers = await build()
+        entry = cache.put(scope, key, etag, body, extra_headers)
+        HTTP_CACHE_RESPONSES.inc(endpoint=endpoint, outcome="miss")
+    else:
+        HTTP_CACHE_RESPONSES.inc(endpoint=endpoint, outcome="hit")
+    content, encoding = cache.encode(entry, choose_encoding(request.headers.get("accept-encoding")))
+    headers.update(entry.headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    HTTP_RESPONSE_BYTES.inc(len(content), encoding=encoding or "identity")
+    return Response(content, media_type="application/json", headers=headers)
+
+def _invalidate(resource: str, user_id: Optional[str] = None) -> None:
+    """写接口修改数据后丢弃对应的响应缓存"""
+    get_http_cache().invalidate(f"{resource}:{user_id}" if user_id else resource)
+
+def _sse_event(event: Dict[str, Any]) -> str:
+    """序列化为一条 server-sent event"""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """流式对话（SSE），模型每产出一段文本就推送给前端"""
+    health_assistant = await _health_assistant()
+    events = health_assistant.stream_message(request.message, request.session_id, request.user_id)
+    
+    # 先取第一个事件：排队已满时此处抛出，仍可返回 503
+    try:
+        first = await events.__anext__()
+    except LLMQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    async def event_source() -> AsyncIterator[str]:
+        yield _sse_event(first)
+        try:
+            async for event in events:
+                yield _sse_event(event)
+        except Exception as e:
+            yield _sse_event({"type": "error", "message": str(e)})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    批量对话（NDJSON），每处理完一条就输出一行结果，输出顺序为完成顺序
+
+    每行包含 index（在请求中的位置）、id、status（ok / error）；最后一行为
+    {"summary": {...}} 汇总。单条失败不影响其他条目。
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items 不能为空")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多 {BATCH_MAX_ITEMS} 条")
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, 32))
+    items = [item.model_dump() for item in request.items]
+    health_assistant = await _health_assistant()
+    
+    async def lines() -> AsyncIterator[str]:
+        summary = {"total": len(items), "ok": 0, "error": 0, "emergency": 0, "fallback": 0}
+        start = time.perf_counter()
+        async for result in health_assistant.process_batch(items, concurrency):
+            summary[result["status"]] += 1
+            summary["emergency"] += int(result.get("emergency", False))
+            summary["fallback"] += int(result.get("fallback", False))
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        summary["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        yield json.dumps({"summary": summary}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/stats")
+async def get_stats():
+    """会话存储、LLM 并发等运行状态"""
+    return await (await _health_assistant()).stats()
+
+@router.get("/llm/status")
+async def llm_status():
+    """LLM 熔断器状态（closed / open / half_open）、并发排队情况和客户端超时配置"""
+    return (await _health_assistant()).llm_status()
+
 @router.get("/records", response_model=List[HealthRecord])
-async def get_records():
-    """获取健康记录列表"""
-    # 模拟数据，实际应该从数据库获取
-    return [
-        HealthRecord(
-            id="1",
-            date="2024-01-15",
-            type="体检报告",
-            doctor="张医生",
-            summary="常规体检，各项指标正常"
-        ),
-        HealthRecord(
-            id="2",
-            date="2024-01-10",
-            type="血压测量",
-            doctor="系统记录",
-            summary="血压：120/80 mmHg"
-        ),
-    ]
+async def get_records(
+    request: Request,
+    user_id: str = DEFAULT_USER_ID,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    type: Optional[str] = None,
+):
+    """
+    获取健康记录列表
+
+    按日期倒序返回，支持日期范围和类型过滤；还有下一页时，游标在 X-Next-Cursor 响应头中。
+    响应带 ETag，记录没有变化时对 If-None-Match 返回 304。
+    """
+    store = get_health_store()
+    
+    async def build():
+        try:
+            records, next_cursor = await store.list_records(
+                user_id, limit=limit, cursor=cursor, start_date=start_date, end_date=end_date, record_type=type
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        body = _RECORDS_ADAPTER.dump_json(_RECORDS_ADAPTER.validate_python(records))
+        return body, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    
+    version = await store.get_version(user_id, "records")
+    return await _cached_json(request, "records", f"records:{user_id}", version, build)
+
+@router.post("/records", response_model=HealthRecord)
+async def create_record(request: HealthRecordCreate):
+    """新增健康记录"""
+    record = await get_health_store().add_record(request.model_dump())
+    _invalidate("records", record["user_id"])
+    # 对话检索索引按 records 版本号判断是否过期，下次检索时重新加载，这里不需要通知
+    return record
 
 @router.get("/appointments", response_model=List[Appointment])
-async def get_appointments():
-    """获取预约列表"""
-    # 模拟数据，实际应该从数据库获取
-    return [
-        Appointment(
-            id="1",
-            doctor="张医生",
-            department="内科",
-            date="2024-01-20",
-            time="10:00",
-            status="已预约"
-        ),
-    ]
+async def get_appointments(
+    request: Request,
+    user_id: str = DEFAULT_USER_ID,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    """获取预约列表（按日期倒序，分页方式和 ETag 同 /records）"""
+    store = get_health_store()
+    
+    async def build():
+        try:
+            appointments, next_cursor = await store.list_appointments(
+                user_id, limit=limit, cursor=cursor, start_date=start_date, end_date=end_date
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        body = _APPOINTMENTS_ADAPTER.dump_json(_APPOINTMENTS_ADAPTER.validate_python(appointments))
+        return body, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    
+    version = await store.get_version(user_id, "appointments")
+    return await _cached_json(request, "appointments", f"appointments:{user_id}", version, build)
 
-@router.get("/health-data")
-async def get_health_data():
-    """获取健康数据"""
-    # 模拟数据，实际应该从数据库获取
+@router.get("/appointments/slots")
+async def get_free_slots(
+    start_date: Optional[str] = None,
+    days: int = Query(7, ge=1, le=31),
+    department: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+):
+    """查询空闲号源（默认从今天起 7 天），按日期、医生列出可预约的时间"""
+    try:
+        return await get_appointment_booking().free_slots(
+            start_date=start_date, days=days, department=department, doctor_id=doctor_id, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/appointments", response_model=Appointment)
+async def book_appointment(request: AppointmentCreate):
+    """预约号源；号源已被预约时返回 409"""
+    try:
+        appointment = await get_appointment_booking().book(request.user_id, request.doctor_id, request.date, request.time)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SlotUnavailableError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    _invalidate("appointments", request.user_id)
+    return appointment
+
+@router.delete("/appointments/{appointment_id}", response_model=Appointment)
+async def cancel_appointment(appointment_id: str, user_id: str = DEFAULT_USER_ID):
+    """取消预约，号源重新可约"""
+    appointment = await get_appointment_booking().cancel(appointment_id, user_id)
+    if appointment is None:
+        raise HTTPException(status_code=404, detail="预约不存在")
+    _invalidate("appointments", user_id)
+    return appointment
+
+@router.get("/doctors")
+async def list_doctors(department: Optional[str] = None):
+    """出诊医生列表（排班来自 app/data/doctors.json）"""
+    return get_appointment_booking().list_doctors(department)
+
+@router.get("/hospitals/nearby")
+async def search_nearby_hospitals(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=200),
+    limit: int = Query(20, ge=1, le=200),
+    department: Optional[str] = None,
+    emergency: Optional[bool] = None,
+    type: Optional[str] = Query(None, pattern="^(hospital|clinic|doctors)$"),
+):
+    """
+    查询附近的医疗机构（本地数据 + 网格索引，不调用外部地图服务），按距离由近到远
+
+    给出 radius_km 时返回半径内最近的 limit 个，否则返回最近的 limit 个；
+    可按科室（department）、是否有急诊（emergency）、机构类型（type）过滤。
+    """
+    # 网格索引依赖 numpy，在首次查询时再导入；索引在线程中建立，数据文件修改后在后台重建
+    from app.services.hospital_index import get_hospital_directory
+    directory = get_hospital_directory()
+    await directory.refresh()
+    started = time.perf_counter()
+    try:
+        results = directory.nearby(
+            lat, lng, radius_km=radius_km, limit=limit,
+            department=department, emergency=emergency, facility_type=type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
-        "bloodPressure": "120/80",
-        "heartRate": 72,
-        "temperature": 36.5,
-        "lastUpdate": "2024-01-19"
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        "count": len(results),
+        "results": results,
     }
+
+@router.get("/health-data")
+async def get_health_data(request: Request, user_id: str = DEFAULT_USER_ID):
+    """获取最新的健康数据（带 ETag）"""
+    store = get_health_store()
+    
+    async def build():
+        data = await store.get_latest_health_data(user_id) or {}
+        return _json_bytes({
+            "bloodPressure": data.get("blood_pressure"),
+            "heartRate": data.get("heart_rate"),
+            "temperature": data.get("temperature"),
+            "lastUpdate": data.get("last_update")
+        }), {}
+    
+    version = await store.get_version(user_id, "health_data")
+    return await _cached_json(request, "health_data", f"health_data:{user_id}", version, build)
+
+@router.post("/health-data")
+async def create_health_data(request: HealthData):
+    """记录一次健康数据"""
+    data = await get_health_store().add_health_data(request.model_dump())
+    _invalidate("health_data", data["user_id"])
+    return {"success": True, "id": data["id"]}
+
+@router.post("/vitals/batch")
+async def ingest_vitals(request: VitalsBatch):
+    """批量写入可穿戴设备上传的生命体征读数"""
+    try:
+        accepted = await get_vitals_store().ingest(
+            request.user_id,
+            [(item.metric, item.timestamps, item.values) for item in request.series]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"accepted": accepted, "series": len(request.series)}
+
+@router.get("/vitals/series")
+async def get_vitals_series(
+    metric: str,
+    user_id: str = DEFAULT_USER_ID,
+    resolution: str = Query("hour", pattern="^(minute|hour|day)$"),
+    start: Optional[float] = Query(None, ge=0, le=MAX_TIMESTAMP),
+    end: Optional[float] = Query(None, ge=0, le=MAX_TIMESTAMP),
+    limit: int = Query(1000, ge=1, le=5000),
+):
+    """
+    查询预聚合的生命体征序列（每个时间桶的最小、最大、平均值和读数个数）
+
+    默认时间范围：最近 limit 个时间桶。
+    """
+    end = end if end is not None else time.time()
+    start = start if start is not None else max(end - RESOLUTIONS[resolution] * limit, 0)
+    try:
+        return await get_vitals_store().query_series(user_id, metric, resolution, start, end, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/export")
+async def export_health_data(
+    request: Request,
+    user_id: str = DEFAULT_USER_ID,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    include: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metric: Optional[str] = None,
+    compress: bool = True,
+):
+    """
+    导出用户的健康记录、预约和生命体征原始读数（流式输出，内存占用固定）
+
+    include 为逗号分隔的 records / appointments / vitals，默认全部；CSV 每次只能导出一类。
+    客户端支持 gzip 时压缩输出（compress=false 关闭）。
+    """
+    sections = [s.strip() for s in include.split(",") if s.strip()] if include else None
+    try:
+        body = get_exporter().export(user_id, format, sections, start_date, end_date, metric)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    headers = {
+        "Content-Disposition": f'attachment; filename="health-export-{time.strftime("%Y%m%d")}.{extension}"',
+        "Cache-Control": "no-store",
+    }
+    # 导出流只有 gzip 一种压缩方式，按 q 值判断客户端是否接受（gzip;q=0 表示拒绝）
+    if compress and choose_encoding(request.headers.get("accept-encoding"), ("gzip",)) == "gzip":
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+@router.get("/knowledge/search")
+async def search_knowledge(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    category: Optional[str] = None,
+):
+    """全文检索健康知识文章（BM25 排序，结果不含正文；带 ETag，知识库没有变化时返回 304）"""
+    knowledge_base = get_knowledge_base()
+    await knowledge_base.refresh()
+    
+    async def build():
+        started = time.perf_counter()
+        results = knowledge_base.search(q, limit=limit, category=category)
+        return _json_bytes({
+            "query": q,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+            "results": [
+                {**{k: v for k, v in article.items() if k != "content"}, "score": score}
+                for score, article in results
+            ]
+        }), {}
+    
+    return await _cached_json(request, "knowledge_search", "knowledge", knowledge_base.version, build, private=False)
+
+@router.get("/knowledge/{article_id}", response_model=KnowledgeArticle)
+async def get_knowledge_article(request: Request, article_id: str):
+    """获取知识文章详情（带 ETag）"""
+    knowledge_base = get_knowledge_base()
+    await knowledge_base.refresh()
+    
+    async def build():
+        article = knowledge_base.get(article_id)
+        if article is None:
+            raise HTTPException(status_code=404, detail="文章不存在")
+        return _ARTICLE_ADAPTER.dump_json(_ARTICLE_ADAPTER.validate_python(article)), {}
+    
+    return await _cached_json(request, "knowledge_article", "knowledge", knowledge_base.version, build, private=False)
+
+@router.post("/knowledge", response_model=KnowledgeArticle)
+async def upsert_knowledge_article(article: KnowledgeArticle):
+    """新增或更新知识文章（保存到数据库并增量更新索引）"""
+    if await get_knowledge_base().upsert(article.model_dump()):
+        _invalidate("knowledge")
+    return article
+
+@router.delete("/knowledge/{article_id}")
+async def delete_knowledge_article(article_id: str):
+    """删除知识文章"""
+    if not await get_knowledge_base().remove(article_id):
+        raise HTTPException(status_code=404, detail="文章不存在")
+    _invalidate("knowledge")
+    return {"success": True}
+
+@router.post("/reminders", response_model=Reminder)
+async def create_reminder(request: ReminderCreate):
+    """新增用药、复查等提醒，返回计算好的下次提醒时间"""
+    try:
+        reminder = await get_reminder_store().create(request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    get_reminder_scheduler().schedule(reminder["id"], reminder["next_fire_at"])
+    return reminder
+
+@router.get("/reminders", response_model=List[Reminder])
+async def list_reminders(
+    response: Response,
+    user_id: str = DEFAULT_USER_ID,
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """获取提醒列表（按创建时间倒序，分页方式同 /records）"""
+    try:
+        reminders, next_cursor = await get_reminder_store().list_reminders(user_id, limit=limit, cursor=cursor, kind=kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return reminders
+
+@router.get("/reminders/status")
+async def reminder_scheduler_status():
+    """提醒调度器状态：内存中待触发的条目数、下次触发时间、已触发数"""
+    return get_reminder_scheduler().stats()
+
+@router.get("/reminders/stream")
+async def reminder_stream(request: Request, user_id: str = DEFAULT_USER_ID):
+    """订阅到期提醒（SSE），每触发一条提醒推送一个事件"""
+    scheduler = get_reminder_scheduler()
+    queue = scheduler.subscribe(user_id)
+    
+    async def event_source() -> AsyncIterator[str]:
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=REMINDER_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _sse_event(event)
+        finally:
+            scheduler.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/reminders/{reminder_id}", response_model=Reminder)
+async def get_reminder(reminder_id: str):
+    """获取提醒详情"""
+    reminder = await get_reminder_store().get(reminder_id)
+    if reminder is None:
+        raise HTTPException(status_code=404, detail="提醒不存在")
+    return reminder
+
+@router.patch("/reminders/{reminder_id}", response_model=Reminder)
+async def update_reminder(reminder_id: str, request: ReminderUpdate):
+    """修改提醒（只更新传入的字段），时间规则或启用状态变化时重新计算下次提醒时间"""
+    try:
+        reminder = await get_reminder_store().update(reminder_id, request.model_dump(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if reminder is None:
+        raise HTTPException(status_code=404, detail="提醒不存在")
+    get_reminder_scheduler().schedule(reminder_id, reminder["next_fire_at"])
+    return reminder
+
+@router.delete("/reminders/{reminder_id}")
+async def delete_reminder(reminder_id: str):
+    """删除提醒"""
+    if not await get_reminder_store().delete(reminder_id):
+        raise HTTPException(status_code=404, detail="提醒不存在")
+    get_reminder_scheduler().schedule(reminder_id, None)
+    return {"success": True}
+
+@router.post("/notifications", response_model=Notification)
+async def create_notification(request: NotificationCreate):
+    """新增一条通知，推送给该用户的订阅者"""
+    try:
+        return await get_notification_store().create(
+            request.user_id, request.type, request.title, request.body, request.read
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/notifications", response_model=List[Notification])
+async def list_notifications(
+    response: Response,
+    user_id: str = DEFAULT_USER_ID,
+    type: Optional[str] = None,
+    unread: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """
+    获取通知列表（按时间倒序，分页方式同 /records）
+
+    响应头 X-Notification-Rev 为读取前的版本号，之后的修改用 /notifications/changes 或 /notifications/stream 获取。
+    """
+    store = get_notification_store()
+    counters = await store.counters(user_id)
+    try:
+        notifications, next_cursor = await store.list_notifications(
+            user_id, limit=limit, cursor=cursor, type=type, unread_only=unread
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["X-Notification-Rev"] = str(counters["rev"])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return notifications
+
+@router.get("/notifications/unread")
+async def get_unread_count(user_id: str = DEFAULT_USER_ID):
+    """未读通知数和当前版本号 {"unread", "rev"}（计数随写入维护，不扫描通知）"""
+    return await get_notification_store().counters(user_id)
+
+@router.get("/notifications/changes")
+async def get_notification_changes(since: int = Query(..., ge=0), user_id: str = DEFAULT_USER_ID):
+    """
+    版本号 since 之后的修改 {"rev", "unread", "notifications"}，删除的通知带 deleted=true
+
+    落后太多时返回 {"rev", "unread", "reset": true}，应重新读取列表。
+    """
+    return await get_notification_store().changes(user_id, since)
+
+@router.post("/notifications/read")
+async def mark_notifications_read(request: NotificationRead):
+    """把指定的（不传 ids 时为全部）通知标为已读，返回这次的修改"""
+    if request.ids is not None and len(request.ids) > NOTIFICATION_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"一次最多 {NOTIFICATION_MAX_IDS} 条")
+    store = get_notification_store()
+    change = await store.mark_read(request.user_id, request.ids)
+    return change or {**await store.counters(request.user_id), "notifications": []}
+
+@router.delete("/notifications")
+async def delete_notifications_by_date(date: str, user_id: str = DEFAULT_USER_ID):
+    """删除某一天（YYYY-MM-DD）的全部通知，返回这次的修改"""
+    store = get_notification_store()
+    try:
+        change = await store.delete(user_id, created_on=date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return change or {**await store.counters(user_id), "notifications": []}
+
+@router.delete("/notifications/{notification_id}")
+async def delete_notification(notification_id: str, user_id: str = DEFAULT_USER_ID):
+    """删除一条通知"""
+    change = await get_notification_store().delete(user_id, ids=[notification_id])
+    if change is None:
+        raise HTTPException(status_code=404, detail="通知不存在")
+    return change
+
+def _notification_event(change: Dict[str, Any]) -> str:
+    """通知变更的 SSE 事件，事件 ID 为版本号，断线重连时浏览器以 Last-Event-ID 带回"""
+    return f"id: {change['rev']}\n" + _sse_event({"type": "reset" if change.get("reset") else "changes", **change})
+
+@router.get("/notifications/stream")
+async def notification_stream(request: Request, user_id: str = DEFAULT_USER_ID, since: Optional[int] = None):
+    """
+    订阅通知变更（SSE）
+
+    连接后先推送请求头 Last-Event-ID（浏览器自动重连时带回，优先）或 since 之后的修改，都没有时推送当前未读数；
+    之后每次修改推送一个 {"type": "changes", "rev", "unread", "notifications"} 事件。
+    收到的版本号不连续（推送积压被丢弃，或修改发生在其他 worker）时从数据库补齐。
+    """
+    store = get_notification_store()
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    queue = store.subscribe(user_id)
+    
+    async def event_source() -> AsyncIterator[str]:
+        try:
+            if since is None:
+                change = {**await store.counters(user_id), "notifications": []}
+            else:
+                change = await store.changes(user_id, since)
+            last_rev = change["rev"]
+            yield _notification_event(change)
+            while not await request.is_disconnected():
+                try:
+                    change = await asyncio.wait_for(queue.get(), timeout=REMINDER_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    # 其他 worker 上的修改不会进入本进程的队列，心跳时检查一次版本号
+                    if (await store.counters(user_id))["rev"] <= last_rev:
+                        yield ": ping\n\n"
+                        continue
+                    change = await store.changes(user_id, last_rev)
+                else:
+                    if change["rev"] <= last_rev:
+                        continue
+                    if change["rev"] != last_rev + 1:
+                        change = await store.changes(user_id, last_rev)
+                last_rev = change["rev"]
+                yield _notification_event(change)
+        finally:
+            store.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/jobs", status_code=202)
+async def create_job(request: JobCreate):
+    """提交后台分析任务，立即返回任务 ID 和状态，之后轮询 /jobs/{id} 或订阅 /jobs/{id}/events"""
+    try:
+        job = await get_job_queue().submit(request.type, request.params, user_id=request.user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    return job.to_dict()
+
+@router.get("/jobs")
+async def list_jobs(user_id: str = DEFAULT_USER_ID, limit: int = Query(50, ge=1, le=500)):
+    """获取用户最近提交的后台任务（新的在前，不含结果）"""
+    return [job.to_dict(include_result=False) for job in await get_job_queue().list_jobs(user_id, limit=limit)]
+
+@router.get("/jobs/stats")
+async def job_queue_stats():
+    """后台任务队列状态：worker 数、排队和运行中的任务数、各状态的任务数"""
+    return await get_job_queue().stats()
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """获取任务状态、进度和结果"""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job.to_dict()
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """取消排队中或运行中的任务"""
+    job = await get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job.to_dict(include_result=False)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """订阅任务的状态和进度变化（SSE），任务结束后（最后一个事件带结果）关闭"""
+    queue = get_job_queue()
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    async def event_source() -> AsyncIterator[str]:
+        async for event in queue.events(job):
+            if await request.is_disconnected():
+                return
+            yield _sse_event(event)
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import os
+from app.agents.analysis_jobs import close_job_queue
+from app.agents.loader import assistant_status, close_health_assistant, start_warmup
 from app.api.routes import router
+from app.services.notification_store import notify_reminder
+from app.services.reminder_scheduler import get_reminder_scheduler
+from app.services.metrics import CONTENT_TYPE, REGISTRY
 
 app = FastAPI(
     title="AI Health Assistant API",
@@ -15,15 +23,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Notification-Rev"],  # 分页游标、条件请求、通知版本号
 )
 
 # 注册路由
 app.include_router(router, prefix="/api")
 
+@app.on_event("startup")
+async def startup():
+    # 在后台加载健康助手，不阻塞服务启动；ASSISTANT_WARMUP=0 时改为第一次对话时加载
+    if os.getenv("ASSISTANT_WARMUP", "1") != "0":
+        app.state.warmup_task = start_warmup()
+    # 在后台（子进程中）建立附近医院索引，第一次查询不必等待；HOSPITALS_WARMUP=0 时改为第一次查询时建立
+    if os.getenv("HOSPITALS_WARMUP", "1") != "0":
+        from app.services.hospital_index import get_hospital_directory
+        app.state.hospitals_task = asyncio.create_task(get_hospital_directory().refresh())
+    # 提醒调度器；多 worker 部署时可只在一个进程中开启（其余设置 REMINDER_SCHEDULER=0），同一提醒不会重复触发
+    if os.getenv("REMINDER_SCHEDULER", "1") != "0":
+        scheduler = get_reminder_scheduler()
+        # 触发的提醒同时写入通知中心
+        scheduler.add_listener(notify_reminder)
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # 关闭 LLM 客户端共享的连接池
+    await close_health_assistant()
+    await get_reminder_scheduler().stop()
+    await close_job_queue()
+
 @app.get("/")
 async def root():
     return {"message": "AI Health Assistant API", "status": "running"}
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    # 服务启动后立即可用；assistant 表示 AI 对话是否已加载完成
+    return {"status": "healthy", "assistant": assistant_status()}
+
+@app.get("/ready")
+async def ready():
+    """就绪检查：健康助手加载完成前返回 503"""
+    status = assistant_status()
+    if status["state"] != "ready":
+        return JSONResponse(status_code=503, content={"status": "not_ready", "assistant": status})
+    return {"status": "ready", "assistant": status}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 格式的运行指标（各阶段耗时直方图、错误和 token 计数）"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,415 @@
+"""医生排班和预约号源分配（每位医生每天一个位图，分段锁保证同一号源不会被重复预约）"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.health_store import HealthStore, _now, bump_version, get_health_store
+from app.services.keyword_matcher import resolve_data_path
+from app.services.metrics import APPOINTMENT_BOOKING_SECONDS, APPOINTMENT_BOOKINGS
+from app.services.reminder_store import TIME_OF_DAY_RE
+
+STATUS_BOOKED = "已预约"
+STATUS_CANCELLED = "已取消"
+
+# 每个号源一行，主键保证同一医生同一天的同一号源只能被一个预约占用（多个进程同时预约也一样）；
+# 取消预约时删除这一行，号源重新可约
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointment_slots (
+    doctor_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    appointment_id TEXT NOT NULL,
+    PRIMARY KEY (doctor_id, date, slot)
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_slots_appointment ON appointment_slots (appointment_id);
+"""
+
+
+class SlotUnavailableError(Exception):
+    """号源已被预约"""
+
+
+class Doctor:
+    """一位医生的排班：出诊的星期、每个号源的时长，以及出诊时段对应的号源位图"""
+
+    __slots__ = ("id", "name", "department", "weekdays", "slot_minutes", "mask", "times")
+
+    def __init__(self, id: str, name: str, department: str, weekdays: FrozenSet[int], slot_minutes: int, mask: int):
+        self.id = id
+        self.name = name
+        self.department = department
+        self.weekdays = weekdays
+        self.slot_minutes = slot_minutes
+        # 第 i 位表示从 0 点起第 i 个号源（i * slot_minutes 分钟开始）是否出诊
+        self.mask = mask
+        # 各号源的开始时间 HH:MM
+        self.times = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(0, 1440, slot_minutes))
+
+    def day_mask(self, day: date) -> int:
+        return self.mask if day.isoweekday() in self.weekdays else 0
+
+    def slot_time(self, slot: int) -> str:
+        return self.times[slot]
+
+    def slot_index(self, time_of_day: str) -> int:
+        """把 HH:MM 换算成号源序号，不是号源开始时间时抛出 ValueError"""
+        match = TIME_OF_DAY_RE.match(time_of_day or "")
+        if not match:
+            raise ValueError("time 应为 HH:MM")
+        minutes = int(match.group(1)) * 60 + int(match.group(2))
+        if minutes % self.slot_minutes or not self.mask >> (minutes // self.slot_minutes) & 1:
+            raise ValueError(f"{self.name} 没有 {time_of_day} 的号源")
+        return minutes // self.slot_minutes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "department": self.department,
+            "weekdays": sorted(self.weekdays),
+            "slot_minutes": self.slot_minutes,
+            "slots_per_day": bin(self.mask).count("1"),
+        }
+
+
+def _minutes(value: str) -> int:
+    match = TIME_OF_DAY_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"无效的时间：{value}")
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def parse_doctors(data: Dict[str, Any]) -> Dict[str, Doctor]:
+    """解析排班文件内容，格式有误时抛出 ValueError"""
+    default_minutes = int(data.get("slot_minutes", 30))
+    doctors: Dict[str, Doctor] = {}
+    for item in data.get("doctors", []):
+        try:
+            doctor_id, name, department = item["id"], item["name"], item["department"]
+        except KeyError as e:
+            raise ValueError(f"医生缺少字段 {e}")
+        slot_minutes = int(item.get("slot_minutes", default_minutes))
+        if slot_minutes <= 0 or 1440 % slot_minutes:
+            raise ValueError(f"{doctor_id}: slot_minutes 必须能整除一天的分钟数")
+        weekdays = frozenset(int(d) for d in item.get("weekdays", range(1, 6)))
+        if not weekdays <= set(range(1, 8)):
+            raise ValueError(f"{doctor_id}: weekdays 取值为 1（周一）到 7（周日）")
+        mask = 0
+        for hours in item.get("hours", []):
+            start, _, end = hours.partition("-")
+            start_minutes, end_minutes = _minutes(start), _minutes(end)
+            if start_minutes % slot_minutes or end_minutes % slot_minutes or start_minutes >= end_minutes:
+                raise ValueError(f"{doctor_id}: 出诊时段 {hours} 与号源时长 {slot_minutes} 分钟不对齐")
+            for slot in range(start_minutes // slot_minutes, end_minutes // slot_minutes):
+                mask |= 1 << slot
+        if doctor_id in doctors:
+            raise ValueError(f"重复的医生 ID：{doctor_id}")
+        doctors[doctor_id] = Doctor(doctor_id, name, department, weekdays, slot_minutes, mask)
+    return doctors
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    """从低到高依次产出为 1 的位的序号"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("date 应为 YYYY-MM-DD")
+
+
+class AppointmentBooking:
+    """
+    预约号源分配
+
+    每位医生每天的已约号源是一个整数位图（第 i 位为 1 表示第 i 个号源已被预约），空闲号源为
+    排班位图与已约位图按位求差，查询多位医生、多天的空闲号源只需几次位运算。
+
+    预约时在 (医生, 日期) 对应的锁内完成"检查位图 → 写入号源行和预约 → 置位"，同一进程内的并发预约
+    在内存中就能判断冲突，不会打到数据库；号源表的主键兜底保证多个进程之间也不会重复预约。
+    锁按 (医生, 日期) 的哈希分段，数量固定，不随医生和日期增多。
+
+    内存中的位图最多使用 cache_seconds 秒后从数据库重新读取，其他进程的预约在此之后可见。
+    """
+
+    def __init__(
+        self,
+        store: Optional[HealthStore] = None,
+        path: Optional[str] = None,
+        booking_days: Optional[int] = None,
+        cache_seconds: Optional[float] = None,
+        lock_stripes: int = 64,
+    ):
+        self.store = store or get_health_store()
+        self.db = self.store.db
+        self.db.executescript(SCHEMA)
+        self.path = path or resolve_data_path("DOCTORS_FILE", "doctors.json")
+        # 可以预约今天起多少天内的号源
+        self.booking_days = booking_days or int(os.getenv("APPOINTMENT_BOOKING_DAYS", 30))
+        self.cache_seconds = cache_seconds if cache_seconds is not None else float(os.getenv("APPOINTMENT_SLOT_CACHE_SECONDS", 30))
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.doctors = parse_doctors(json.load(f))
+        # (医生 ID, 日期) -> (已约位图, 读取时间)
+        self._booked: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        self._locks = [asyncio.Lock() for _ in range(lock_stripes)]
+        self._booked_count = 0
+        self._conflicts = 0
+        self._cancelled = 0
+
+    # ---------- 医生和日期 ----------
+
+    def get_doctor(self, doctor_id: str) -> Doctor:
+        doctor = self.doctors.get(doctor_id)
+        if doctor is None:
+            raise ValueError(f"未知的医生：{doctor_id}")
+        return doctor
+
+    def list_doctors(self, department: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [d.to_dict() for d in self.doctors.values() if department is None or d.department == department]
+
+    def _open_mask(self, doctor: Doctor, day: date, now: datetime) -> int:
+        """某天可以预约的号源：出诊的号源，去掉预约窗口之外的日期和今天已经开始的号源"""
+        today = now.date()
+        if day < today or (day - today).days >= self.booking_days:
+            return 0
+        mask = doctor.day_mask(day)
+        if day == today:
+            # 只保留开始时间晚于当前时间的号源
+            first = (now.hour * 60 + now.minute) // doctor.slot_minutes + 1
+            mask = mask >> first << first
+        return mask
+
+    def _lock(self, doctor_id: str, day: str) -> asyncio.Lock:
+        return self._locks[hash((doctor_id, day)) % len(self._locks)]
+
+    # ---------- 已约位图 ----------
+
+    async def _load(self, keys: Sequence[Tuple[str, str]], force: bool = False) -> Dict[Tuple[str, str], int]:
+        """取得各 (医生, 日期) 的已约位图，过期或没有的一次查询从数据库读取"""
+        now = time.monotonic()
+        result: Dict[Tuple[str, str], int] = {}
+        missing: List[Tuple[str, str]] = []
+        for key in keys:
+            cached = self._booked.get(key)
+            if cached is not None and not force and now - cached[1] < self.cache_seconds:
+                result[key] = cached[0]
+            else:
+                missing.append(key)
+        if not missing:
+            return result
+
+        doctor_ids = sorted({doctor_id for doctor_id, _ in missing})
+        days = [day for _, day in missing]
+        placeholders = ",".join("?" * len(doctor_ids))
+
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                f"SELECT doctor_id, date, slot FROM appointment_slots "
+                f"WHERE doctor_id IN ({placeholders}) AND date BETWEEN ? AND ?",
+                (*doctor_ids, min(days), max(days)),
+            ).fetchall()
+
+        loaded = {key: 0 for key in missing}
+        for row in await self.db.run(query):
+            key = (row["doctor_id"], row["date"])
+            if key in loaded:
+                loaded[key] |= 1 << row["slot"]
+        for key, bitmap in loaded.items():
+            self._booked[key] = (bitmap, now)
+        result.update(loaded)
+        self._prune()
+        return result
+
+    def _set(self, key: Tuple[str, str], bitmap: int) -> None:
+        self._booked[key] = (bitmap, self._booked.get(key, (0, time.monotonic()))[1])
+
+    def _prune(self) -> None:
+        """丢弃已经过去的日期的位图"""
+        if len(self._booked) < 4 * len(self.doctors) * self.booking_days:
+            return
+        today = date.today().isoformat()
+        for key in [key for key in self._booked if key[1] < today]:
+            del self._booked[key]
+
+    # ---------- 查询和预约 ----------
+
+    async def free_slots(
+        self,
+        start_date: Optional[str] = None,
+        days: int = 7,
+        department: Optional[str] = None,
+        doctor_id: Optional[str] = None,
+        limit: int = 500,
+    ) -> List[Dict[str, Any]]:
+        """
+        查询空闲号源
+
+        Returns:
+            按日期、医生排列的 [{"doctor_id", "doctor", "department", "date", "times": [HH:MM, ...]}]，
+            不含没有空闲号源的医生和日期；号源总数最多 limit 个
+        """
+        now = datetime.now()
+        first_day = _parse_date(start_date) if start_date else now.date()
+        doctors = [self.get_doctor(doctor_id)] if doctor_id else [
+            d for d in self.doctors.values() if department is None or d.department == department
+        ]
+        results: List[Dict[str, Any]] = []
+        remaining = limit
+        # 逐天处理，凑够 limit 个号源后不再读取之后日期的位图
+        for offset in range(max(days, 0)):
+            day = first_day + timedelta(days=offset)
+            day_str = day.isoformat()
+            candidates = [(doctor, mask) for doctor in doctors if (mask := self._open_mask(doctor, day, now))]
+            if not candidates:
+                continue
+            booked = await self._load([(doctor.id, day_str) for doctor, _ in candidates])
+            for doctor, mask in candidates:
+                free = mask & ~booked[(doctor.id, day_str)]
+                if not free:
+                    continue
+                times = [doctor.times[slot] for slot in _iter_bits(free)][:remaining]
+                results.append({
+                    "doctor_id": doctor.id, "doctor": doctor.name, "department": doctor.department,
+                    "date": day_str, "times": times,
+                })
+                remaining -= len(times)
+                if remaining <= 0:
+                    return results
+        return results
+
+    async def book(self, user_id: str, doctor_id: str, day: str, time_of_day: str) -> Dict[str, Any]:
+        """
+        预约一个号源
+
+        Raises:
+            ValueError: 医生、日期或时间无效，或不在可预约的范围内
+            SlotUnavailableError: 号源已被预约
+        """
+        started = time.perf_counter()
+        doctor = self.get_doctor(doctor_id)
+        slot = doctor.slot_index(time_of_day)
+        day = _parse_date(day).isoformat()
+        if not self._open_mask(doctor, date.fromisoformat(day), datetime.now()) >> slot & 1:
+            raise ValueError(f"{day} {time_of_day} 不可预约（不出诊、已过时间或超出 {self.booking_days} 天的预约范围）")
+
+        key = (doctor.id, day)
+        bit = 1 << slot
+        async with self._lock(doctor.id, day):
+            bitmap = (await self._load([key]))[key]
+            if bitmap & bit:
+                self._conflict()
+                raise SlotUnavailableError(f"{doctor.name} {day} {time_of_day} 的号源已被预约")
+
+            appointment = {
+                "id": uuid.uuid4().hex,
+                "user_id": user_id,
+                "doctor": doctor.name,
+                "department": doctor.department,
+                "date": day,
+                "time": doctor.slot_time(slot),
+                "status": STATUS_BOOKED,
+                "created_at": _now(),
+            }
+
+            def insert(conn: sqlite3.Connection) -> None:
+                conn.execute(
+                    "INSERT INTO appointment_slots (doctor_id, date, slot, appointment_id) VALUES (?, ?, ?, ?)",
+                    (doctor.id, day, slot, appointment["id"]),
+                )
+                conn.execute(
+                    "INSERT INTO appointments (id, user_id, doctor, department, date, time, status, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        appointment["id"], user_id, doctor.name, doctor.department, day, appointment["time"],
+                        STATUS_BOOKED, appointment["created_at"],
+                    ),
+                )
+                bump_version(conn, user_id, "appointments")
+
+            try:
+                await self.db.run_in_transaction(insert)
+            except sqlite3.IntegrityError:
+                # 其他进程已经约走了这个号源，内存中的位图过期了
+                await self._load([key], force=True)
+                self._conflict()
+                raise SlotUnavailableError(f"{doctor.name} {day} {time_of_day} 的号源已被预约")
+            self._set(key, self._booked[key][0] | bit)
+
+        self._booked_count += 1
+        APPOINTMENT_BOOKINGS.inc(outcome="booked")
+        APPOINTMENT_BOOKING_SECONDS.observe(time.perf_counter() - started)
+        appointment["doctor_id"] = doctor.id
+        return appointment
+
+    def _conflict(self) -> None:
+        self._conflicts += 1
+        APPOINTMENT_BOOKINGS.inc(outcome="conflict")
+
+    async def cancel(self, appointment_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """取消预约并释放号源；预约不存在（或不属于该用户）时返回 None，已取消的原样返回"""
+
+        def update(conn: sqlite3.Connection) -> Optional[Tuple[Dict[str, Any], Optional[sqlite3.Row]]]:
+            row = conn.execute("SELECT * FROM appointments WHERE id = ?", (appointment_id,)).fetchone()
+            if row is None or (user_id is not None and row["user_id"] != user_id):
+                return None
+            appointment = dict(row)
+            if appointment["status"] == STATUS_CANCELLED:
+                return appointment, None
+            slot = conn.execute(
+                "SELECT doctor_id, date, slot FROM appointment_slots WHERE appointment_id = ?", (appointment_id,)
+            ).fetchone()
+            conn.execute("DELETE FROM appointment_slots WHERE appointment_id = ?", (appointment_id,))
+            conn.execute("UPDATE appointments SET status = ? WHERE id = ?", (STATUS_CANCELLED, appointment_id))
+            bump_version(conn, appointment["user_id"], "appointments")
+            appointment["status"] = STATUS_CANCELLED
+            return appointment, slot
+
+        result = await self.db.run_in_transaction(update)
+        if result is None:
+            return None
+        appointment, slot = result
+        if slot is not None:
+            key = (slot["doctor_id"], slot["date"])
+            async with self._lock(*key):
+                cached = self._booked.get(key)
+                if cached is not None:
+                    self._set(key, cached[0] & ~(1 << slot["slot"]))
+            self._cancelled += 1
+            APPOINTMENT_BOOKINGS.inc(outcome="cancelled")
+        return appointment
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "doctors": len(self.doctors),
+            "booking_days": self.booking_days,
+            "cached_days": len(self._booked),
+            "booked": self._booked_count,
+            "conflicts": self._conflicts,
+            "cancelled": self._cancelled,
+        }
+
+
+_booking: Optional[AppointmentBooking] = None
+_booking_lock = threading.Lock()
+
+
+def get_appointment_booking() -> AppointmentBooking:
+    """获取全局预约号源分配器（首次调用时加载排班文件）"""
+    global _booking
+    if _booking is None:
+        with _booking_lock:
+            if _booking is None:
+                _booking = AppointmentBooking()
+    return _booking
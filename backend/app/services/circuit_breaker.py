@@ -0,0 +1,115 @@
+"""熔断器"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，不再调用上游服务"""
+
+
+class CircuitBreaker:
+    """
+    连续失败计数熔断器
+
+    closed：正常调用，连续失败 failure_threshold 次后打开；
+    open：直接拒绝调用（抛出 CircuitOpenError），经过 recovery_timeout 秒后进入半开；
+    half_open：只放行一个探测调用，成功则关闭，失败则重新打开；探测调用超过
+    recovery_timeout 仍没有结果时（例如被取消）再放行下一个。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    # 导出为指标时使用的数值
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        name: str = "llm",
+        failure_threshold: Optional[int] = None,
+        recovery_timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", 5))
+        self.recovery_timeout = (
+            recovery_timeout if recovery_timeout is not None else float(os.getenv("LLM_BREAKER_RECOVERY_SECONDS", 30))
+        )
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+        self._opened_total = 0
+        self._short_circuited = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def before_call(self) -> None:
+        """调用上游之前检查，不允许调用时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN:
+                now = time.monotonic()
+                if not self._probing or now - self._probe_started >= self.recovery_timeout:
+                    self._probing = True
+                    self._probe_started = now
+                    return
+            self._short_circuited += 1
+        raise CircuitOpenError(f"{self.name} 服务暂时不可用（熔断中）")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if error is not None:
+                self._last_error = f"{type(error).__name__}: {error}"
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened_total += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release_probe(self) -> None:
+        """探测调用未得出结果（如被取消）时交还探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            retry_in = 0.0
+            if state == self.OPEN:
+                retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "retry_in_seconds": round(retry_in, 1),
+                "opened_total": self._opened_total,
+                "short_circuited": self._short_circuited,
+                "last_error": self._last_error,
+            }
@@ -0,0 +1,111 @@
+"""嵌入式 SQLite 数据库（连接池 + 异步访问）"""
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 默认数据库位置：backend/data/health.db
+DEFAULT_DB_PATH = str(Path(__file__).resolve().parents[2] / "data" / "health.db")
+
+
+class Database:
+    """
+    SQLite 连接池
+
+    开启 WAL 模式，读写可以并发进行，多个进程也可以共享同一个数据库文件。
+    同步代码通过 connection() 借用连接；异步代码通过 run() 在专用线程池中执行，
+    不阻塞事件循环。
+    """
+
+    def __init__(self, path: Optional[str] = None, pool_size: Optional[int] = None):
+        self.path = path or os.getenv("HEALTH_DB_PATH", DEFAULT_DB_PATH)
+        self.pool_size = pool_size or int(os.getenv("DB_POOL_SIZE", 4))
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._connections: List[sqlite3.Connection] = []
+        for _ in range(self.pool_size):
+            conn = self._connect()
+            self._connections.append(conn)
+            self._pool.put(conn)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借用一个连接，用完归还连接池"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """在一个写事务中执行，异常时回滚"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """在数据库线程池中执行 fn(conn, *args)"""
+        def call() -> T:
+            with self.connection() as conn:
+                return fn(conn, *args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call)
+
+    async def run_in_transaction(self, fn: Callable[..., T], *args: Any) -> T:
+        """在数据库线程池中以写事务执行 fn(conn, *args)"""
+        def call() -> T:
+            with self.transaction() as conn:
+                return fn(conn, *args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call)
+
+    def executescript(self, script: str) -> None:
+        """执行建表等初始化脚本"""
+        with self.connection() as conn:
+            conn.executescript(script)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        for conn in self._connections:
+            conn.close()
+
+
+_database: Optional[Database] = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> Database:
+    """获取全局数据库实例（首次调用时创建）"""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = Database()
+    return _database
@@ -0,0 +1,232 @@
+"""健康数据导出（JSON / NDJSON / CSV 流式输出）"""
+import csv
+import io
+import json
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.health_store import HealthStore, get_health_store
+from app.services.vitals_store import VitalsStore, get_vitals_store
+
+# 格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+EXPORT_SECTIONS = ("records", "appointments", "vitals")
+
+RECORD_COLUMNS = ["id", "date", "type", "doctor", "summary", "details", "created_at"]
+APPOINTMENT_COLUMNS = ["id", "date", "time", "doctor", "department", "status", "created_at"]
+VITALS_COLUMNS = ["metric", "timestamp", "time", "value"]
+
+# 输出缓冲区达到该大小时交给响应（减少小块写入的开销）
+FLUSH_BYTES = 64 * 1024
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+async def _batched(pieces: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """把小段文本攒成约 FLUSH_BYTES 的块再输出"""
+    buffer: List[str] = []
+    size = 0
+    async for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """边读边压缩成 gzip 格式"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class HealthExporter:
+    """
+    导出一个用户的健康记录、预约和生命体征原始读数
+
+    数据按页（记录、预约）或按数据块（生命体征）从数据库读取，边读边写出，
+    任何时候内存中只有一页数据和一个输出缓冲区，导出多年的读数也只占用固定内存。
+    """
+
+    def __init__(self, health_store: Optional[HealthStore] = None, vitals_store: Optional[VitalsStore] = None):
+        self.health_store = health_store or get_health_store()
+        self.vitals_store = vitals_store or get_vitals_store()
+        self._tz = timezone(timedelta(seconds=self.vitals_store.utc_offset))
+
+    def export(
+        self,
+        user_id: str,
+        fmt: str = "json",
+        sections: Optional[Sequence[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        metric: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        参数校验后返回导出内容的字节流
+
+        Args:
+            fmt: json / ndjson / csv；csv 每次只能导出一类数据
+            sections: records / appointments / vitals 的子集，默认全部
+            start_date, end_date: 日期范围（YYYY-MM-DD，含首尾）
+            metric: 只导出某个生命体征指标
+
+        Raises:
+            ValueError: 参数无效
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式：{fmt}")
+        sections = list(sections or EXPORT_SECTIONS)
+        unknown = [s for s in sections if s not in EXPORT_SECTIONS]
+        if unknown:
+            raise ValueError(f"未知的导出内容：{', '.join(unknown)}")
+        if fmt == "csv" and len(sections) != 1:
+            raise ValueError("CSV 每次只能导出一类数据，请用 include 指定 records、appointments 或 vitals")
+        start_ts = self._parse_date(start_date) if start_date else None
+        end_ts = self._parse_date(end_date) + 86400 - 1e-6 if end_date else None
+
+        filters = {"start_date": start_date, "end_date": end_date}
+        vitals_filters = {"metric": metric, "start": start_ts, "end": end_ts}
+        if fmt == "csv":
+            pieces = self._csv(user_id, sections[0], filters, vitals_filters)
+        elif fmt == "ndjson":
+            pieces = self._ndjson(user_id, sections, filters, vitals_filters)
+        else:
+            pieces = self._json(user_id, sections, filters, vitals_filters)
+        return _batched(pieces)
+
+    def _parse_date(self, value: str) -> float:
+        try:
+            day = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=self._tz)
+        except ValueError:
+            raise ValueError(f"无效的日期：{value}，应为 YYYY-MM-DD")
+        return day.timestamp()
+
+    def _header(self, user_id: str, sections: Sequence[str]) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "exported_at": datetime.now(self._tz).isoformat(timespec="seconds"),
+            "sections": list(sections),
+        }
+
+    async def _items(
+        self, user_id: str, section: str, filters: Dict[str, Any], vitals_filters: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """逐条产出某一类数据；生命体征每个数据块一条（列式的时间戳和数值）"""
+        if section == "records":
+            async for record in self.health_store.iter_records(user_id, **filters):
+                yield record
+        elif section == "appointments":
+            async for appointment in self.health_store.iter_appointments(user_id, **filters):
+                yield appointment
+        else:
+            async for metric, ts, vals in self.vitals_store.iter_raw(user_id, **vitals_filters):
+                yield {"metric": metric, "t": ts.tolist(), "values": vals.tolist()}
+
+    async def _json(
+        self, user_id: str, sections: Sequence[str], filters: Dict[str, Any], vitals_filters: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        # 逐段拼出一个 JSON 对象：{"user_id": ..., "records": [...], "appointments": [...], "vitals": [...]}
+        yield _dumps(self._header(user_id, sections))[:-1]
+        for section in sections:
+            yield f',"{section}":['
+            first = True
+            async for item in self._items(user_id, section, filters, vitals_filters):
+                yield _dumps(item) if first else "," + _dumps(item)
+                first = False
+            yield "]"
+        yield "}\n"
+
+    async def _ndjson(
+        self, user_id: str, sections: Sequence[str], filters: Dict[str, Any], vitals_filters: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        # 第一行为导出信息，之后每行一条数据，type 为 record / appointment / vitals
+        yield _dumps({"type": "export", **self._header(user_id, sections)}) + "\n"
+        item_types = {"records": "record", "appointments": "appointment", "vitals": "vitals"}
+        for section in sections:
+            item_type = item_types[section]
+            async for item in self._items(user_id, section, filters, vitals_filters):
+                yield _dumps({"type": item_type, **item}) + "\n"
+
+    async def _csv(
+        self, user_id: str, section: str, filters: Dict[str, Any], vitals_filters: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def take(rows: Iterable[Sequence[Any]]) -> str:
+            writer.writerows(rows)
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return text
+
+        # 带 BOM，Excel 打开时中文不乱码
+        if section == "records":
+            yield "\ufeff" + take([RECORD_COLUMNS])
+            async for record in self.health_store.iter_records(user_id, **filters):
+                details = _dumps(record["details"]) if record.get("details") is not None else ""
+                yield take([[record.get(c) if c != "details" else details for c in RECORD_COLUMNS]])
+        elif section == "appointments":
+            yield "\ufeff" + take([APPOINTMENT_COLUMNS])
+            async for appointment in self.health_store.iter_appointments(user_id, **filters):
+                yield take([[appointment.get(c) for c in APPOINTMENT_COLUMNS]])
+        else:
+            yield "\ufeff" + take([VITALS_COLUMNS])
+            # 指标名只含小写字母、数字和下划线，数值都是浮点数，不需要 CSV 转义，直接拼接更快
+            format_time = self._time_formatter()
+            async for metric, ts, vals in self.vitals_store.iter_raw(user_id, **vitals_filters):
+                yield "".join([f"{metric},{t!r},{format_time(t)},{v!r}\r\n" for t, v in zip(ts, vals)])
+
+    def _time_formatter(self) -> Callable[[float], str]:
+        """
+        时间戳 -> 本地时间 ISO 字符串（精确到秒）
+
+        日期部分按天缓存，时分秒直接计算，比逐点调用 datetime.isoformat 快数倍。
+        """
+        offset = self.vitals_store.utc_offset
+        suffix = datetime.now(self._tz).strftime("%z")
+        suffix = f"{suffix[:3]}:{suffix[3:]}"
+        cache: Dict[int, str] = {}
+
+        def format_time(ts: float) -> str:
+            local = int(ts // 1) + offset
+            day, second = divmod(local, 86400)
+            prefix = cache.get(day)
+            if prefix is None:
+                if len(cache) > 1024:
+                    cache.clear()
+                prefix = cache[day] = datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y-%m-%dT")
+            hour, rest = divmod(second, 3600)
+            return f"{prefix}{hour:02d}:{rest // 60:02d}:{rest % 60:02d}{suffix}"
+
+        return format_time
+
+
+_exporter: Optional[HealthExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> HealthExporter:
+    """获取全局导出器"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = HealthExporter()
+    return _exporter
@@ -0,0 +1,354 @@
+"""健康记录、健康数据和预约的持久化存储"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.database import Database, get_database
+
+# 未登录时使用的默认用户
+DEFAULT_USER_ID = "default"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS health_records (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    doctor TEXT,
+    summary TEXT NOT NULL,
+    details TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_user_date ON health_records (user_id, date, id);
+CREATE INDEX IF NOT EXISTS idx_records_user_type ON health_records (user_id, type, date, id);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    doctor TEXT NOT NULL,
+    department TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_user_date ON appointments (user_id, date, time, id);
+
+CREATE TABLE IF NOT EXISTS health_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    blood_pressure TEXT,
+    heart_rate INTEGER,
+    temperature REAL,
+    weight REAL,
+    height REAL,
+    last_update TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_health_data_user_time ON health_data (user_id, last_update);
+
+-- 每个用户每类数据的版本号，写入时在同一事务中递增，读接口据此生成 ETag
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (user_id, resource)
+) WITHOUT ROWID;
+"""
+
+
+def encode_cursor(*values: Any) -> str:
+    """把排序键编码成不透明的分页游标"""
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(values, list):
+        raise ValueError("无效的分页游标")
+    return values
+
+
+def bump_version(conn: sqlite3.Connection, user_id: str, resource: str) -> None:
+    """
+    在写入事务中递增数据版本号
+
+    新版本号取 max(旧版本号 + 1, 当前微秒时间戳)，数据库重建后也不会与客户端缓存的旧版本号重复。
+    """
+    conn.execute(
+        "INSERT INTO data_versions (user_id, resource, version) VALUES (?, ?, ?) "
+        "ON CONFLICT (user_id, resource) DO UPDATE SET version = MAX(version + 1, excluded.version)",
+        (user_id, resource, time.time_ns() // 1000),
+    )
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _record_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    record = dict(row)
+    record["details"] = json.loads(record["details"]) if record["details"] else None
+    return record
+
+
+class HealthStore:
+    """
+    基于 SQLite 的健康数据存储
+
+    列表查询都按 (user_id, date) 索引倒序读取，使用键集分页（keyset pagination），
+    翻到第几页耗时都一样，与用户的记录总数无关。
+    """
+
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or get_database()
+        self.db.executescript(SCHEMA)
+
+    # ---------- 健康记录 ----------
+
+    async def list_records(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        record_type: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按日期倒序分页列出健康记录
+
+        Returns:
+            (记录列表, 下一页游标)，没有更多数据时游标为 None
+        """
+        sql = ["SELECT * FROM health_records WHERE user_id = ?"]
+        params: List[Any] = [user_id]
+        if record_type:
+            sql.append("AND type = ?")
+            params.append(record_type)
+        if start_date:
+            sql.append("AND date >= ?")
+            params.append(start_date)
+        if end_date:
+            sql.append("AND date <= ?")
+            params.append(end_date)
+        if cursor:
+            last_date, last_id = decode_cursor(cursor)
+            sql.append("AND (date, id) < (?, ?)")
+            params.extend([last_date, last_id])
+        sql.append("ORDER BY date DESC, id DESC LIMIT ?")
+        # 多取一条用于判断是否还有下一页
+        params.append(limit + 1)
+
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(" ".join(sql), params).fetchall()
+
+        rows = await self.db.run(query)
+        records = [_record_from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = records[-1]
+            next_cursor = encode_cursor(last["date"], last["id"])
+        return records, next_cursor
+
+    async def iter_records(self, user_id: str, page_size: int = 500, **filters: Any) -> AsyncIterator[Dict[str, Any]]:
+        """逐页读取全部健康记录（导出用），内存中最多保留一页；过滤条件同 list_records"""
+        cursor = None
+        while True:
+            records, cursor = await self.list_records(user_id, limit=page_size, cursor=cursor, **filters)
+            for record in records:
+                yield record
+            if not cursor:
+                return
+
+    async def add_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """新增健康记录，未提供 id 时自动生成"""
+        record = dict(record)
+        record.setdefault("id", uuid.uuid4().hex)
+        record.setdefault("created_at", _now())
+        record.setdefault("doctor", None)
+        details = record.get("details")
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO health_records (id, user_id, date, type, doctor, summary, details, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record["id"], record["user_id"], record["date"], record["type"], record["doctor"],
+                    record["summary"], json.dumps(details, ensure_ascii=False) if details else None,
+                    record["created_at"],
+                ),
+            )
+            bump_version(conn, record["user_id"], "records")
+
+        await self.db.run_in_transaction(insert)
+        return record
+
+    # ---------- 预约 ----------
+
+    async def list_appointments(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按日期、时间倒序分页列出预约"""
+        sql = ["SELECT * FROM appointments WHERE user_id = ?"]
+        params: List[Any] = [user_id]
+        if start_date:
+            sql.append("AND date >= ?")
+            params.append(start_date)
+        if end_date:
+            sql.append("AND date <= ?")
+            params.append(end_date)
+        if cursor:
+            last_date, last_time, last_id = decode_cursor(cursor)
+            sql.append("AND (date, time, id) < (?, ?, ?)")
+            params.extend([last_date, last_time, last_id])
+        sql.append("ORDER BY date DESC, time DESC, id DESC LIMIT ?")
+        params.append(limit + 1)
+
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(" ".join(sql), params).fetchall()
+
+        rows = await self.db.run(query)
+        appointments = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = appointments[-1]
+            next_cursor = encode_cursor(last["date"], last["time"], last["id"])
+        return appointments, next_cursor
+
+    async def iter_appointments(self, user_id: str, page_size: int = 500, **filters: Any) -> AsyncIterator[Dict[str, Any]]:
+        """逐页读取全部预约（导出用）；过滤条件同 list_appointments"""
+        cursor = None
+        while True:
+            appointments, cursor = await self.list_appointments(user_id, limit=page_size, cursor=cursor, **filters)
+            for appointment in appointments:
+                yield appointment
+            if not cursor:
+                return
+
+    async def add_appointment(self, appointment: Dict[str, Any]) -> Dict[str, Any]:
+        """新增预约"""
+        appointment = dict(appointment)
+        appointment.setdefault("id", uuid.uuid4().hex)
+        appointment.setdefault("status", "待确认")
+        appointment.setdefault("created_at", _now())
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO appointments (id, user_id, doctor, department, date, time, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    appointment["id"], appointment["user_id"], appointment["doctor"], appointment["department"],
+                    appointment["date"], appointment["time"], appointment["status"], appointment["created_at"],
+                ),
+            )
+            bump_version(conn, appointment["user_id"], "appointments")
+
+        await self.db.run_in_transaction(insert)
+        return appointment
+
+    # ---------- 健康数据 ----------
+
+    async def get_latest_health_data(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取用户最新的一条健康数据"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                "SELECT * FROM health_data WHERE user_id = ? ORDER BY last_update DESC LIMIT 1",
+                (user_id,),
+            ).fetchone()
+
+        row = await self.db.run(query)
+        return dict(row) if row else None
+
+    async def add_health_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """记录一次健康数据"""
+        data = dict(data)
+        last_update = data.get("last_update")
+        if isinstance(last_update, datetime):
+            last_update = last_update.isoformat(timespec="seconds")
+        data["last_update"] = last_update or _now()
+
+        def insert(conn: sqlite3.Connection) -> int:
+            cur = conn.execute(
+                "INSERT INTO health_data (user_id, blood_pressure, heart_rate, temperature, weight, height, last_update) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    data["user_id"], data.get("blood_pressure"), data.get("heart_rate"), data.get("temperature"),
+                    data.get("weight"), data.get("height"), data["last_update"],
+                ),
+            )
+            bump_version(conn, data["user_id"], "health_data")
+            return cur.lastrowid
+
+        data["id"] = await self.db.run_in_transaction(insert)
+        return data
+
+    # ---------- 数据版本 ----------
+
+    async def get_version(self, user_id: str, resource: str) -> int:
+        """某个用户某类数据的当前版本号，从未写入过时为 0"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                "SELECT version FROM data_versions WHERE user_id = ? AND resource = ?", (user_id, resource)
+            ).fetchone()
+
+        row = await self.db.run(query)
+        return row["version"] if row else 0
+
+    # ---------- 示例数据 ----------
+
+    def seed_demo_data(self) -> None:
+        """数据库为空时写入示例数据，保持前端演示可用"""
+        with self.db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM health_records LIMIT 1").fetchone():
+                return
+            now = _now()
+            conn.executemany(
+                "INSERT INTO health_records (id, user_id, date, type, doctor, summary, details, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL, ?)",
+                [
+                    ("1", DEFAULT_USER_ID, "2024-01-15", "体检报告", "张医生", "常规体检，各项指标正常", now),
+                    ("2", DEFAULT_USER_ID, "2024-01-10", "血压测量", "系统记录", "血压：120/80 mmHg", now),
+                ],
+            )
+            conn.execute(
+                "INSERT INTO appointments (id, user_id, doctor, department, date, time, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ("1", DEFAULT_USER_ID, "张医生", "内科", "2024-01-20", "10:00", "已预约", now),
+            )
+            conn.execute(
+                "INSERT INTO health_data (user_id, blood_pressure, heart_rate, temperature, last_update) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (DEFAULT_USER_ID, "120/80", 72, 36.5, "2024-01-19"),
+            )
+
+
+_health_store: Optional[HealthStore] = None
+_health_store_lock = threading.Lock()
+
+
+def get_health_store() -> HealthStore:
+    """获取全局健康数据存储（首次调用时建表，并按需写入示例数据）"""
+    global _health_store
+    if _health_store is None:
+        with _health_store_lock:
+            if _health_store is None:
+                store = HealthStore()
+                if os.getenv("SEED_DEMO_DATA", "1") == "1":
+                    store.seed_demo_data()
+                _health_store = store
+    return _health_store
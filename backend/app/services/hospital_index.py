@@ -0,0 +1,358 @@
+"""附近医院查询（本地医疗机构数据 + 经纬度网格索引）"""
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.keyword_matcher import resolve_data_path
+from app.services.metrics import HOSPITAL_FACILITIES, HOSPITAL_QUERY_SECONDS
+
+FACILITY_TYPES = ("hospital", "clinic", "doctors")
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# 机构信息序列化（紧凑格式，复用同一个编码器）
+_RECORD_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def parse_facilities(data: Any) -> List[Dict[str, Any]]:
+    """校验并规范化医疗机构列表，格式有误时抛出 ValueError"""
+    if not isinstance(data, list):
+        raise ValueError("医疗机构数据应为列表")
+    facilities = []
+    for item in data:
+        try:
+            facility = {
+                "id": str(item["id"]),
+                "name": item["name"],
+                "type": item.get("type") or "hospital",
+                "lat": float(item["lat"]),
+                "lng": float(item["lng"]),
+                "address": item.get("address"),
+                "phone": item.get("phone"),
+                "departments": list(item.get("departments") or []),
+                "emergency": bool(item.get("emergency", False)),
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"无效的医疗机构 {item!r:.80}: {e}")
+        if facility["type"] not in FACILITY_TYPES:
+            raise ValueError(f"{facility['id']}: type 应为 {' / '.join(FACILITY_TYPES)}")
+        if not (-90 <= facility["lat"] <= 90 and -180 <= facility["lng"] <= 180):
+            raise ValueError(f"{facility['id']}: 经纬度超出范围")
+        facilities.append(facility)
+    return facilities
+
+
+class _HospitalGrid:
+    """
+    按经纬度网格排好序的医疗机构（只读），重载时整体替换
+
+    每个机构的网格键为 行号 * 列数 + 列号；全部数组按网格键排序后，同一行中相邻的网格在数组中也相邻，
+    一个矩形范围在每一行只对应一段连续的下标，用二分查找即可定位，不需要逐个网格查表。
+
+    机构信息序列化成 JSON 后拼接成一整块字节串（按偏移量取出），只在返回结果时解析；
+    在子进程中建好后传回主进程只需复制几块连续内存，不必逐个重建几十万个字典。
+    """
+
+    def __init__(self, facilities: List[Dict[str, Any]], cell_km: float):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.ncols = int(math.ceil(360 / self.cell_deg)) + 1
+
+        lat = np.array([f["lat"] for f in facilities], dtype=np.float64)
+        lng = np.array([f["lng"] for f in facilities], dtype=np.float64)
+        keys = self._row(lat) * self.ncols + self._col(lng)
+        order = np.argsort(keys, kind="stable")
+
+        self.keys = keys[order]
+        ordered = [facilities[i] for i in order]
+        records = [_RECORD_ENCODER.encode(f).encode("utf-8") for f in ordered]
+        self._offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in records], out=self._offsets[1:])
+        self._records = b"".join(records)
+        self.lat_rad = np.radians(lat[order])
+        self.lng_rad = np.radians(lng[order])
+        self.cos_lat = np.cos(self.lat_rad)
+        # 过滤条件对应的布尔数组（与排序后的下标对齐）
+        self.emergency = np.array([f["emergency"] for f in ordered], dtype=bool)
+        self.types = {
+            name: np.array([f["type"] == name for f in ordered], dtype=bool) for name in FACILITY_TYPES
+        }
+        self.departments: Dict[str, np.ndarray] = {}
+        for index, facility in enumerate(ordered):
+            for department in facility["departments"]:
+                mask = self.departments.get(department)
+                if mask is None:
+                    mask = self.departments[department] = np.zeros(len(ordered), dtype=bool)
+                mask[index] = True
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def facility(self, index: int) -> Dict[str, Any]:
+        """排序后第 index 个机构的信息"""
+        return json.loads(self._records[self._offsets[index]:self._offsets[index + 1]])
+
+    def _row(self, lat: Any) -> Any:
+        return np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(np.int64)
+
+    def _col(self, lng: Any) -> Any:
+        return np.floor((np.asarray(lng) + 180) / self.cell_deg).astype(np.int64)
+
+    def candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """以 (lat, lng) 为中心、覆盖半径 radius_km 的矩形范围内的机构下标"""
+        dlat = radius_km / KM_PER_DEGREE
+        # 按矩形中离赤道最远的纬度计算经度跨度，保证覆盖整个圆
+        cos_far = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+        dlng = min(radius_km / (KM_PER_DEGREE * cos_far), 180.0)
+        row0, row1 = int(self._row(max(lat - dlat, -90.0))), int(self._row(min(lat + dlat, 90.0)))
+        col0, col1 = int(self._col(max(lng - dlng, -180.0))), int(self._col(min(lng + dlng, 180.0)))
+        rows = np.arange(row0, row1 + 1, dtype=np.int64) * self.ncols
+        starts = np.searchsorted(self.keys, rows + col0, side="left")
+        ends = np.searchsorted(self.keys, rows + col1, side="right")
+        spans = [(s, e) for s, e in zip(starts.tolist(), ends.tolist()) if e > s]
+        if not spans:
+            return np.empty(0, dtype=np.int64)
+        if len(spans) == 1:
+            return np.arange(spans[0][0], spans[0][1], dtype=np.int64)
+        return np.concatenate([np.arange(s, e, dtype=np.int64) for s, e in spans])
+
+    def distances_km(self, index: np.ndarray, lat: float, lng: float) -> np.ndarray:
+        """(lat, lng) 到各机构的球面距离（haversine）"""
+        lat_rad, lng_rad = math.radians(lat), math.radians(lng)
+        a = (
+            np.sin((self.lat_rad[index] - lat_rad) / 2) ** 2
+            + math.cos(lat_rad) * self.cos_lat[index] * np.sin((self.lng_rad[index] - lng_rad) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def filter(
+        self, index: np.ndarray, department: Optional[str], emergency: Optional[bool], facility_type: Optional[str]
+    ) -> np.ndarray:
+        if department is not None:
+            mask = self.departments.get(department)
+            if mask is None:
+                return index[:0]
+            index = index[mask[index]]
+        if emergency is not None:
+            index = index[self.emergency[index] == emergency]
+        if facility_type is not None:
+            index = index[self.types[facility_type][index]]
+        return index
+
+    def within(self, lat: float, lng: float, radius_km: float, **filters: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """半径 radius_km 内符合条件的机构，返回 (下标, 距离)，未排序"""
+        index = self.filter(self.candidates(lat, lng, radius_km), **filters)
+        distances = self.distances_km(index, lat, lng)
+        inside = distances <= radius_km
+        return index[inside], distances[inside]
+
+
+def load_grid(path: str, cell_km: float) -> Tuple[_HospitalGrid, float, float]:
+    """
+    读取数据文件并建立网格索引，返回 (网格, 文件修改时间, 耗时秒数)
+
+    是模块顶层函数，可以交给子进程执行。
+
+    Raises:
+        OSError, ValueError: 文件无法读取或格式有误
+    """
+    mtime = os.path.getmtime(path)
+    started = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        facilities = parse_facilities(json.load(f))
+    return _HospitalGrid(facilities, cell_km), mtime, time.perf_counter() - started
+
+
+class HospitalDirectory:
+    """
+    医疗机构目录
+
+    从本地数据文件加载医疗机构，建立经纬度网格索引，提供半径查询和最近 k 个查询，
+    可按科室、是否有急诊、机构类型过滤，不依赖外部地图服务。
+
+    半径查询只计算覆盖该圆的矩形网格内的机构；最近 k 个查询从一个网格的半径开始查，
+    不够 k 个时半径加倍，直到够数或达到 max_radius_km。
+
+    读取数据文件和建立索引在子进程中进行（refresh）：JSON 解析和构建几十万个对象都要持有 GIL，
+    放在线程中仍会让事件循环停顿一两秒，子进程建好的网格只需几块连续内存传回。
+    第一次 refresh 等待加载完成；之后数据文件修改时（按修改时间判断，最多每 reload_interval 秒检查一次）
+    在后台重建，建好后整体替换，重建期间的查询继续使用原索引；新文件有误时保留原数据。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        cell_km: Optional[float] = None,
+        max_radius_km: Optional[float] = None,
+        reload_interval: Optional[float] = None,
+    ):
+        self.path = path or resolve_data_path("HOSPITALS_FILE", "hospitals.json")
+        self.cell_km = cell_km or float(os.getenv("HOSPITAL_GRID_CELL_KM", 2))
+        self.max_radius_km = max_radius_km or float(os.getenv("HOSPITAL_MAX_RADIUS_KM", 200))
+        self.reload_interval = reload_interval if reload_interval is not None else float(os.getenv("HOSPITALS_RELOAD_INTERVAL", 30))
+        self._grid = _HospitalGrid([], self.cell_km)
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._loaded_at: Optional[float] = None
+        self._build_seconds = 0.0
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def reload(self) -> int:
+        """
+        重新读取数据文件并建立索引，返回机构数（在当前线程中同步执行，异步代码中使用 refresh）
+
+        Raises:
+            OSError, ValueError: 文件无法读取或格式有误（此时保留原数据）
+        """
+        if not self.path or not os.path.exists(self.path):
+            return len(self._grid)
+        self._last_check = time.monotonic()
+        try:
+            self._swap(*load_grid(self.path, self.cell_km))
+        except (OSError, ValueError):
+            self._skip_current_file()
+            raise
+        return len(self._grid)
+
+    def _swap(self, grid: _HospitalGrid, mtime: float, build_seconds: float) -> None:
+        with self._lock:
+            self._grid = grid
+            self._mtime = mtime
+            self._build_seconds = build_seconds
+            self._loaded_at = time.time()
+        HOSPITAL_FACILITIES.set(len(grid))
+
+    def _skip_current_file(self) -> None:
+        """记下有误的文件的修改时间，文件再次修改前不再重试"""
+        try:
+            self._mtime = os.path.getmtime(self.path)
+        except OSError:
+            pass
+
+    async def refresh(self) -> None:
+        """
+        第一次调用时在子进程中加载数据文件并等待完成；之后数据文件修改时在后台重建索引，
+        不等待重建完成，直接返回
+        """
+        if not self._initialized:
+            # shield：请求被取消时加载继续进行
+            await asyncio.shield(self._start_refresh())
+            return
+        now = time.monotonic()
+        if not self.path or now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        try:
+            changed = os.path.getmtime(self.path) != self._mtime
+        except OSError as e:
+            print(f"医疗机构数据文件检查失败，继续使用原数据: {e}")
+            return
+        if changed:
+            self._start_refresh()
+
+    def _start_refresh(self) -> asyncio.Task:
+        """在后台重新加载；已有加载在进行时返回同一个任务"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._reload_in_process())
+        return self._refresh_task
+
+    async def _reload_in_process(self) -> None:
+        try:
+            if not self.path or not os.path.exists(self.path):
+                return
+            self._last_check = time.monotonic()
+            # 重载很少发生，每次临时启动一个子进程，用完即关闭；spawn 启动的子进程不继承父进程的线程
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                loaded = await asyncio.get_running_loop().run_in_executor(
+                    executor, load_grid, self.path, self.cell_km
+                )
+            finally:
+                executor.shutdown(wait=False)
+            self._swap(*loaded)
+        except Exception as e:
+            self._skip_current_file()
+            print(f"医疗机构数据加载失败，继续使用原数据: {e}")
+        finally:
+            self._initialized = True
+
+    def nearby(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: Optional[float] = None,
+        limit: int = 20,
+        department: Optional[str] = None,
+        emergency: Optional[bool] = None,
+        facility_type: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        查询附近的医疗机构，按距离由近到远
+
+        给出 radius_km 时返回半径内最近的 limit 个；否则返回最近的 limit 个（最远查到 max_radius_km）。
+        每个结果在机构信息之外带 distance_m（米）。
+        """
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError("经纬度超出范围")
+        if facility_type is not None and facility_type not in FACILITY_TYPES:
+            raise ValueError(f"type 应为 {' / '.join(FACILITY_TYPES)}")
+        started = time.perf_counter()
+        grid = self._grid
+        filters = {"department": department, "emergency": emergency, "facility_type": facility_type}
+
+        if radius_km is not None:
+            index, distances = grid.within(lat, lng, min(radius_km, self.max_radius_km), **filters)
+        else:
+            radius = self.cell_km
+            while True:
+                index, distances = grid.within(lat, lng, radius, **filters)
+                # 半径内的机构已全部找到，够 k 个时其中最近的 k 个就是全局最近的 k 个
+                if len(index) >= limit or radius >= self.max_radius_km:
+                    break
+                radius = min(radius * 2, self.max_radius_km)
+
+        if len(index) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            index, distances = index[top], distances[top]
+        order = np.argsort(distances, kind="stable")
+        results = [
+            {**grid.facility(i), "distance_m": round(d * 1000)}
+            for i, d in zip(index[order].tolist(), distances[order].tolist())
+        ]
+        HOSPITAL_QUERY_SECONDS.observe(time.perf_counter() - started, mode="nearest" if radius_km is None else "radius")
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        grid = self._grid
+        return {
+            "path": self.path,
+            "facilities": len(grid),
+            "departments": sorted(grid.departments),
+            "cell_km": self.cell_km,
+            "build_seconds": round(self._build_seconds, 3),
+            "loaded_at": self._loaded_at,
+        }
+
+
+_directory: Optional[HospitalDirectory] = None
+_directory_lock = threading.Lock()
+
+
+def get_hospital_directory() -> HospitalDirectory:
+    """获取全局医疗机构目录（数据在第一次 refresh 时加载）"""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = HospitalDirectory()
+    return _directory
@@ -0,0 +1,229 @@
+"""读接口的条件请求（ETag / 304）和序列化响应缓存"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+try:
+    # 可选依赖：安装 brotli 后支持 Content-Encoding: br，否则只用 gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def make_etag(*parts: Any) -> str:
+    """由请求和数据版本生成弱 ETag（各种压缩编码共用同一个 ETag）"""
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否与 etag 匹配（弱比较，支持逗号分隔的多个值和 *）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: Optional[str], supported: Tuple[str, ...] = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """
+    按 Accept-Encoding 从 supported 中选择压缩编码：优先 q 值高的，q 值相同时按 supported 的顺序；
+    都不接受（包括 q=0 明确拒绝）时返回 None
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CachedResponse:
+    """一个序列化好的响应体，以及按需生成并缓存的压缩版本"""
+
+    __slots__ = ("scope", "key", "etag", "body", "headers", "encoded")
+
+    def __init__(self, scope: str, key: str, etag: str, body: bytes, headers: Dict[str, str]):
+        self.scope = scope
+        self.key = key
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+        self.encoded: Dict[str, bytes] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+
+class HttpResponseCache:
+    """
+    读接口的响应缓存
+
+    键为请求路径和查询参数，条目记录生成时的 ETag（由数据版本计算）：数据被修改后版本变化，
+    旧条目不再命中；写接口还会调用 invalidate 立即丢弃该用户、该类数据的全部条目。
+    压缩版本在第一次被请求时生成并随条目缓存，同样的内容只压缩一次。
+    按条目数和总字节数（LRU）淘汰。
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        min_compress_bytes: Optional[int] = None,
+        gzip_level: Optional[int] = None,
+        brotli_quality: Optional[int] = None,
+    ):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("HTTP_CACHE_MAX_ENTRIES", 1024))
+        self.max_bytes = max_bytes or int(os.getenv("HTTP_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        # 小于该字节数的响应不压缩：压缩省下的流量抵不上压缩和解压的开销
+        self.min_compress_bytes = (
+            min_compress_bytes if min_compress_bytes is not None else int(os.getenv("HTTP_COMPRESS_MIN_BYTES", 1024))
+        )
+        self.gzip_level = gzip_level or int(os.getenv("HTTP_GZIP_LEVEL", 6))
+        self.brotli_quality = brotli_quality or int(os.getenv("HTTP_BROTLI_QUALITY", 5))
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._by_scope: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+        self._invalidated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str, etag: str) -> Optional[CachedResponse]:
+        """ETag 相同时返回缓存的响应，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.etag != etag:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def put(self, scope: str, key: str, etag: str, body: bytes, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        """写入序列化好的响应（缓存关闭时只返回条目，不保存）"""
+        entry = CachedResponse(scope, key, etag, body, dict(headers or {}))
+        if not self.enabled or len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._by_scope.setdefault(scope, set()).add(key)
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def encode(self, entry: CachedResponse, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """返回 (响应体, 实际使用的编码)；响应体太小或不接受压缩时不压缩"""
+        if encoding is None or len(entry.body) < self.min_compress_bytes:
+            return entry.body, None
+        data = entry.encoded.get(encoding)
+        if data is not None:
+            return data, encoding
+        if encoding == "br":
+            data = brotli.compress(entry.body, quality=self.brotli_quality)
+        else:
+            data = gzip.compress(entry.body, compresslevel=self.gzip_level, mtime=0)
+        with self._lock:
+            if encoding not in entry.encoded:
+                entry.encoded[encoding] = data
+                # 已被淘汰的条目不再计入缓存大小
+                if self._entries.get(entry.key) is entry:
+                    self._bytes += len(data)
+                    self._evict()
+        return data, encoding
+
+    def invalidate(self, scope: str) -> int:
+        """丢弃某个范围（如某个用户的健康记录）的全部条目，返回丢弃的条目数"""
+        with self._lock:
+            keys = self._by_scope.pop(scope, ())
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry.size
+            self._invalidated += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        keys = self._by_scope.get(entry.scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_scope[entry.scope]
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self._evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "encodings": list(SUPPORTED_ENCODINGS),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evicted": self._evicted,
+                "invalidated": self._invalidated,
+            }
+
+
+_http_cache: Optional[HttpResponseCache] = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpResponseCache:
+    """获取全局读接口响应缓存"""
+    global _http_cache
+    if _http_cache is None:
+        with _http_cache_lock:
+            if _http_cache is None:
+                _http_cache = HttpResponseCache()
+    return _http_cache
@@ -0,0 +1,569 @@
+"""后台任务队列（异步 worker + 进程池，任务状态保存在 SQLite 中）"""
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.database import Database, get_database
+from app.services.metrics import (
+    JOB_QUEUE_DEPTH, JOB_RUN_SECONDS, JOB_WAIT_SECONDS, JOBS_FINISHED, JOBS_REJECTED, JOBS_RUNNING,
+)
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    -- 其他进程请求取消运行中的任务时置 1，由执行任务的进程轮询到后取消
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+"""
+
+
+class JobQueueFullError(Exception):
+    """等待队列已满，拒绝新任务"""
+
+
+class Job:
+    """一个后台任务的状态、进度和结果"""
+
+    __slots__ = (
+        "id", "type", "user_id", "params", "status", "progress", "message", "result", "error",
+        "created_at", "started_at", "finished_at", "task", "subscribers",
+    )
+
+    def __init__(self, job_type: str, user_id: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.user_id = user_id
+        self.params = params
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        """从数据库行恢复任务（其他进程提交的任务，没有 task 和订阅者）"""
+        job = cls.__new__(cls)
+        job.id = row["id"]
+        job.type = row["type"]
+        job.user_id = row["user_id"]
+        job.params = json.loads(row["params"])
+        job.status = row["status"]
+        job.progress = row["progress"]
+        job.message = row["message"]
+        job.result = json.loads(row["result"]) if row["result"] is not None else None
+        job.error = row["error"]
+        job.created_at = row["created_at"]
+        job.started_at = row["started_at"]
+        job.finished_at = row["finished_at"]
+        job.task = None
+        job.subscribers = set()
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "type": self.type,
+            "user_id": self.user_id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            # 排队和运行耗时（秒），未开始 / 未结束时为 null
+            "wait_seconds": round(self.started_at - self.created_at, 3) if self.started_at else None,
+            "run_seconds": round(self.finished_at - self.started_at, 3) if self.finished_at and self.started_at else None,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+class JobContext:
+    """传给任务处理函数的上下文：汇报进度、把 CPU 密集的计算放到进程池中执行"""
+
+    def __init__(self, queue: "JobQueue", job: Job):
+        self._queue = queue
+        self.job = job
+
+    def progress(self, value: float, message: str = "") -> None:
+        """汇报进度（0~1）和当前步骤说明，推送给订阅者并在后台写回数据库"""
+        self.job.progress = min(max(value, 0.0), 1.0)
+        if message:
+            self.job.message = message
+        self._queue._publish(self.job, "progress")
+        self._queue._save_progress(self.job)
+
+    async def run_in_process(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        在进程池中执行 fn(*args)，不占用事件循环和 GIL
+
+        fn 必须是模块顶层函数，参数和返回值都要能被 pickle。
+        """
+        return await self._queue._run_in_process(fn, *args)
+
+
+JobHandler = Callable[[JobContext, Dict[str, Any]], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    后台任务队列
+
+    提交后立即返回任务 ID，任务进入固定大小的等待队列，由 workers 个异步 worker 依次执行；
+    任务中 CPU 密集的部分通过 JobContext.run_in_process 交给最多 process_workers 个子进程，
+    不阻塞事件循环，对话请求不受影响。客户端轮询任务状态，或订阅状态和进度变化事件。
+
+    任务由提交它的进程执行，状态、进度和结果写入共享的 SQLite 数据库（jobs 表），
+    多 worker 部署时任何进程都能查询、订阅和取消：
+    - 查询读取数据库；本进程正在执行的任务直接读内存，进度最新
+    - 订阅本进程的任务时实时推送，其他进程的任务每 poll_interval 秒读一次数据库
+    - 取消排队中的任务直接更新状态，执行任务的进程取出时发现已取消就跳过；
+      运行中的任务标记 cancel_requested，由执行任务的进程每 poll_interval 秒检查一次
+
+    结束的任务保留 result_ttl 秒（最多 max_retained 个），每隔 PRUNE_INTERVAL 秒清理一次。
+    worker 和进程池在第一次提交任务时才启动。
+    """
+
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        timeout: Optional[float] = None,
+        result_ttl: Optional[float] = None,
+        max_retained: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.db = db or get_database()
+        self.db.executescript(SCHEMA)
+        self.workers = workers or int(os.getenv("JOB_WORKERS", 4))
+        self.process_workers = process_workers or int(os.getenv("JOB_PROCESS_WORKERS", 2))
+        self.max_queue = max_queue or int(os.getenv("JOB_MAX_QUEUE", 100))
+        self.timeout = timeout or float(os.getenv("JOB_TIMEOUT", 600))
+        self.result_ttl = result_ttl or float(os.getenv("JOB_RESULT_TTL", 3600))
+        self.max_retained = max_retained or int(os.getenv("JOB_MAX_RETAINED", 10000))
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._validators: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        # 本进程提交、尚未结束的任务
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running = 0
+        # 正在写回进度的任务，以及写回期间又有新进度的任务
+        self._saving: Set[str] = set()
+        self._dirty: Set[str] = set()
+        self._last_prune = 0.0
+        JOB_QUEUE_DEPTH.set_function(lambda: self._queue.qsize() if self._queue else 0)
+        JOBS_RUNNING.set_function(lambda: self._running)
+
+    def register(
+        self, job_type: str, handler: JobHandler, validate: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> None:
+        """
+        注册任务类型
+
+        Args:
+            handler: handler(ctx, params) 的返回值作为任务结果（需可 JSON 序列化）
+            validate: 提交时校验参数，参数无效时抛出 ValueError
+        """
+        self._handlers[job_type] = handler
+        if validate is not None:
+            self._validators[job_type] = validate
+
+    @property
+    def job_types(self) -> List[str]:
+        return list(self._handlers)
+
+    # ---------- 提交和查询 ----------
+
+    async def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None, user_id: str = "default") -> Job:
+        """
+        提交任务，立即返回（状态为 queued）
+
+        Raises:
+            ValueError: 未知的任务类型或参数无效
+            JobQueueFullError: 等待队列已满
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"未知的任务类型：{job_type}")
+        params = dict(params or {})
+        validate = self._validators.get(job_type)
+        if validate is not None:
+            validate(params)
+        self._start()
+        if self._queue.full():
+            JOBS_REJECTED.inc()
+            raise JobQueueFullError("后台任务繁忙，请稍后再试")
+        job = Job(job_type, user_id, params)
+        await self.db.run_in_transaction(self._insert, job)
+        if self._queue.full():
+            # 写入期间队列被其他请求占满
+            await self.db.run_in_transaction(self._delete, job.id)
+            JOBS_REJECTED.inc()
+            raise JobQueueFullError("后台任务繁忙，请稍后再试")
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        await self._maybe_prune()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """获取任务：本进程正在执行的直接返回，否则从数据库读取"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await self.db.run(self._load, job_id)
+
+    async def list_jobs(self, user_id: str, limit: int = 50) -> List[Job]:
+        """某个用户最近提交的任务（新的在前）"""
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                "SELECT * FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+
+        jobs = []
+        for row in await self.db.run(query):
+            # 本进程正在执行的任务用内存中的状态，进度最新
+            jobs.append(self._jobs.get(row["id"]) or Job.from_row(row))
+        return jobs
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        取消任务：排队中的直接标记为取消，运行中的取消其协程（已在子进程中的计算会跑完但结果被丢弃）
+
+        其他进程的运行中任务只标记取消请求，由执行任务的进程在 poll_interval 秒内取消。
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return await self.db.run_in_transaction(self._cancel_remote, job_id, time.time())
+        if job.finished:
+            return job
+        if job.status == "queued":
+            await self._finish(job, "cancelled")
+        if job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def events(self, job: Job) -> AsyncIterator[Dict[str, Any]]:
+        """先产出当前状态，之后每次状态或进度变化产出一个事件，任务结束后停止"""
+        if job.id not in self._jobs:
+            async for event in self._poll_events(job):
+                yield event
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        try:
+            yield {"type": "status", "job": job.to_dict(include_result=job.finished)}
+            if job.finished:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["job"]["status"] in FINISHED_STATUSES:
+                    return
+        finally:
+            job.subscribers.discard(queue)
+
+    async def _poll_events(self, job: Job) -> AsyncIterator[Dict[str, Any]]:
+        """其他进程执行的任务：定期读取数据库，状态或进度有变化时产出事件"""
+        yield {"type": "status", "job": job.to_dict(include_result=job.finished)}
+        last = (job.status, job.progress, job.message)
+        while not job.finished:
+            await asyncio.sleep(self.poll_interval)
+            latest = await self.db.run(self._load, job.id)
+            if latest is None:
+                return
+            current = (latest.status, latest.progress, latest.message)
+            if current != last:
+                event_type = "progress" if latest.status == last[0] else "status"
+                yield {"type": event_type, "job": latest.to_dict(include_result=latest.finished)}
+                last = current
+            job = latest
+
+    def _publish(self, job: Job, event_type: str) -> None:
+        if not job.subscribers:
+            return
+        event = {"type": event_type, "job": job.to_dict(include_result=job.finished)}
+        for queue in list(job.subscribers):
+            queue.put_nowait(event)
+
+    # ---------- 数据库 ----------
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, job: Job) -> None:
+        conn.execute(
+            "INSERT INTO jobs (id, type, user_id, params, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job.id, job.type, job.user_id, json.dumps(job.params, ensure_ascii=False), job.status, job.created_at),
+        )
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, job_id: str) -> None:
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    @staticmethod
+    def _load(conn: sqlite3.Connection, job_id: str) -> Optional[Job]:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    @staticmethod
+    def _claim(conn: sqlite3.Connection, job_id: str, started_at: float) -> bool:
+        """把排队中的任务标记为运行中；已被其他进程取消时返回 False"""
+        return conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+            (started_at, job_id),
+        ).rowcount > 0
+
+    @staticmethod
+    def _store_progress(conn: sqlite3.Connection, job_id: str, progress: float, message: str) -> None:
+        # 只更新运行中的任务，晚到的进度不会覆盖结束状态
+        conn.execute(
+            "UPDATE jobs SET progress = ?, message = ? WHERE id = ? AND status = 'running'",
+            (progress, message, job_id),
+        )
+
+    @staticmethod
+    def _store_finish(conn: sqlite3.Connection, job: Job) -> None:
+        conn.execute(
+            "UPDATE jobs SET status = ?, progress = ?, message = ?, result = ?, error = ?, finished_at = ? "
+            "WHERE id = ?",
+            (
+                job.status, job.progress, job.message,
+                json.dumps(job.result, ensure_ascii=False) if job.result is not None else None,
+                job.error, job.finished_at, job.id,
+            ),
+        )
+
+    @staticmethod
+    def _cancel_remote(conn: sqlite3.Connection, job_id: str, now: float) -> Optional[Job]:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (now, job_id)
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def _save_progress(self, job: Job) -> None:
+        """在后台写回进度；上一次写回未完成时只记下，完成后再写一次最新的进度"""
+        if job.id in self._saving:
+            self._dirty.add(job.id)
+            return
+        self._saving.add(job.id)
+        asyncio.get_running_loop().create_task(self._flush_progress(job))
+
+    async def _flush_progress(self, job: Job) -> None:
+        try:
+            while True:
+                self._dirty.discard(job.id)
+                await self.db.run_in_transaction(self._store_progress, job.id, job.progress, job.message)
+                if job.id not in self._dirty:
+                    return
+        except Exception as e:
+            print(f"后台任务进度写入失败: {e}")
+        finally:
+            self._saving.discard(job.id)
+            self._dirty.discard(job.id)
+
+    async def _maybe_prune(self) -> None:
+        now = time.monotonic()
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        await self.db.run_in_transaction(self._prune, time.time() - self.result_ttl, self.max_retained)
+
+    @staticmethod
+    def _prune(conn: sqlite3.Connection, deadline: float, max_retained: int) -> None:
+        """删除超过保留时间的已结束任务，以及超出保留数量的最早的已结束任务（未结束的任务不清理）"""
+        conn.execute("DELETE FROM jobs WHERE finished_at < ?", (deadline,))
+        conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished_at IS NOT NULL "
+            "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (max_retained,),
+        )
+
+    # ---------- 执行 ----------
+
+    def _start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._worker_tasks.append(asyncio.create_task(self._watch_cancel_requests()))
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.status != "queued":
+                # 排队期间已被取消
+                continue
+            job.task = asyncio.create_task(self._execute(job))
+            try:
+                # 用 wait 而不是直接 await：任务被取消时 worker 继续运行
+                await asyncio.wait((job.task,))
+            except asyncio.CancelledError:
+                # worker 本身被取消（应用退出），一并取消任务
+                job.task.cancel()
+                raise
+
+    async def _watch_cancel_requests(self) -> None:
+        """定期检查其他进程对本进程运行中任务的取消请求"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            running = [job.id for job in self._jobs.values() if job.status == "running"]
+            if not running:
+                continue
+
+            def query(conn: sqlite3.Connection) -> List[str]:
+                placeholders = ",".join("?" * len(running))
+                return [r[0] for r in conn.execute(
+                    f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({placeholders})", running
+                ).fetchall()]
+
+            try:
+                cancelled = await self.db.run(query)
+            except Exception as e:
+                print(f"后台任务取消请求检查失败: {e}")
+                continue
+            for job_id in cancelled:
+                job = self._jobs.get(job_id)
+                if job is not None and job.task is not None:
+                    job.task.cancel()
+
+    async def _execute(self, job: Job) -> None:
+        started_at = time.time()
+        if not await self.db.run_in_transaction(self._claim, job.id, started_at):
+            # 排队期间已被其他进程取消
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            self._jobs.pop(job.id, None)
+            self._publish(job, "status")
+            return
+        job.status = "running"
+        job.started_at = started_at
+        JOB_WAIT_SECONDS.observe(job.started_at - job.created_at, type=job.type)
+        self._running += 1
+        self._publish(job, "status")
+        try:
+            result = await asyncio.wait_for(self._handlers[job.type](JobContext(self, job), job.params), self.timeout)
+        except asyncio.CancelledError:
+            await self._finish(job, "cancelled")
+        except asyncio.TimeoutError:
+            await self._finish(job, "failed", error=f"任务超时（{self.timeout:g} 秒）")
+        except Exception as e:
+            print(f"后台任务 {job.type} 失败: {e}")
+            await self._finish(job, "failed", error=str(e) or type(e).__name__)
+        else:
+            job.progress = 1.0
+            await self._finish(job, "succeeded", result=result)
+        finally:
+            self._running -= 1
+
+    async def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        JOBS_FINISHED.inc(type=job.type, status=status)
+        if job.started_at is not None:
+            JOB_RUN_SECONDS.observe(job.finished_at - job.started_at, type=job.type)
+        try:
+            await self.db.run_in_transaction(self._store_finish, job)
+        except Exception as e:
+            print(f"后台任务状态写入失败: {e}")
+        finally:
+            # 写入数据库之后再从内存中移除，之后的查询读数据库也能拿到结果
+            self._jobs.pop(job.id, None)
+            self._publish(job, "status")
+
+    async def _run_in_process(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._executor is None:
+            # spawn 启动的子进程不继承父进程的线程和数据库连接
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.process_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，下次调用时重新创建
+            self._executor = None
+            raise
+
+    async def close(self) -> None:
+        """取消 worker 和进行中的任务，把仍在排队的任务标记为取消，关闭进程池（应用退出时调用）"""
+        for task in self._worker_tasks:
+            task.cancel()
+        for task in self._worker_tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._worker_tasks = []
+        # 等待被取消的任务把结束状态写回数据库
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+        for job in list(self._jobs.values()):
+            if job.status == "queued":
+                await self._finish(job, "cancelled")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def stats(self) -> Dict[str, Any]:
+        """本进程的队列状态，以及数据库中各状态的任务数（所有进程）"""
+        def query(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+            return conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+
+        counts = {status: 0 for status in JOB_STATUSES}
+        for status, count in await self.db.run(query):
+            counts[status] = count
+        return {
+            "types": self.job_types,
+            "workers": self.workers,
+            "process_workers": self.process_workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "jobs": counts,
+        }
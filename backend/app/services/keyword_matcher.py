@@ -0,0 +1,158 @@
+"""多模式关键词匹配（Aho-Corasick 自动机）"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from collections import deque
+import bisect
+import os
+
+# 批量扫描时拼接各段文本用的分隔符，关键词中不会出现
+_BATCH_SEPARATOR = "\x00"
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 多模式匹配器
+
+    关键词集合只编译一次，之后每条文本只需单次扫描即可找出所有命中的关键词，
+    匹配开销与文本长度成正比，与关键词数量基本无关。
+
+    每个关键词可以附带一个值（例如同义词对应的标准词），匹配时返回该值。
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        # 状态 0 为根节点
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Any, ...]] = [()]
+        self._size = 0
+        self._built = False
+        for keyword in keywords:
+            self.add(keyword)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _normalize(self, text: str) -> str:
+        return text.lower() if self.ignore_case else text
+
+    def add(self, keyword: str, value: Any = None) -> None:
+        """添加关键词，value 为命中时返回的值（默认为关键词本身）"""
+        word = self._normalize(keyword.strip())
+        if not word:
+            return
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        payload = keyword if value is None else value
+        if payload not in self._out[state]:
+            self._out[state] = self._out[state] + (payload,)
+            self._size += 1
+        self._built = False
+
+    def build(self) -> "KeywordMatcher":
+        """计算失败指针，并把后缀状态的输出合并到当前状态"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque()
+        for state in goto[0].values():
+            fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + tuple(v for v in out[fail[nxt]] if v not in out[nxt])
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, Any]]:
+        """逐个产出 (结束位置, 值)，同一位置可能命中多个关键词"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for pos, ch in enumerate(self._normalize(text)):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                for value in out[state]:
+                    yield pos, value
+
+    def find_all(self, text: str) -> List[Any]:
+        """返回文本中命中的所有值（去重，按首次出现顺序）"""
+        seen: Dict[Any, None] = {}
+        for _, value in self.iter_matches(text):
+            seen.setdefault(value, None)
+        return list(seen)
+
+    def find_all_batch(self, texts: Sequence[str]) -> List[List[Any]]:
+        """
+        一次扫描多段文本，返回每段文本命中的值（各自去重，按首次出现顺序）
+
+        各段文本用分隔符拼接后只走一遍自动机，再按结束位置归属到对应的文本。
+        """
+        normalized = [self._normalize(text).replace(_BATCH_SEPARATOR, " ") for text in texts]
+        # 第 i 段文本的分隔符位置（即该段结束位置）
+        boundaries: List[int] = []
+        offset = 0
+        for text in normalized:
+            offset += len(text)
+            boundaries.append(offset)
+            offset += 1
+
+        results: List[Dict[Any, None]] = [{} for _ in texts]
+        for pos, value in self.iter_matches(_BATCH_SEPARATOR.join(normalized)):
+            results[bisect.bisect_left(boundaries, pos)].setdefault(value, None)
+        return [list(found) for found in results]
+
+
+def load_keyword_file(path: str) -> List[Tuple[str, List[str]]]:
+    """
+    读取关键词数据文件
+
+    每行一个标准词，可在冒号后列出同义词（逗号分隔），# 开头为注释：
+        呼吸困难: 喘不上气, 喘不过气, shortness of breath
+
+    Returns:
+        [(标准词, [同义词, ...]), ...]
+    """
+    entries: List[Tuple[str, List[str]]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            # 同时支持中英文冒号、逗号
+            line = line.replace("：", ":").replace("，", ",")
+            if ":" in line:
+                term, rest = line.split(":", 1)
+                synonyms = [s.strip() for s in rest.split(",") if s.strip()]
+            else:
+                term, synonyms = line, []
+            term = term.strip()
+            if term:
+                entries.append((term, synonyms))
+    return entries
+
+
+def resolve_data_path(env_name: str, default_name: str) -> Optional[str]:
+    """数据文件路径：优先使用环境变量，其次为 app/data 下的默认文件"""
+    path = os.getenv(env_name)
+    if path:
+        return path
+    default_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", default_name)
+    return default_path if os.path.exists(default_path) else None
@@ -0,0 +1,418 @@
+"""健康知识全文检索（中文 n-gram 倒排索引 + BM25）"""
+import asyncio
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.database import Database, get_database
+from app.services.keyword_matcher import resolve_data_path
+
+# 中日韩字符连续片段，或由字母数字组成的单词
+_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+# 字段权重：标题和标签命中比正文命中更重要
+FIELD_WEIGHTS: Dict[str, float] = {
+    "title": 3.0,
+    "tags": 2.5,
+    "summary": 1.5,
+    "content": 1.0,
+}
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 查询中的疑问词、语气词，检索前去掉，避免 "怎么办" 之类的词左右排序
+QUERY_STOPWORDS = ("怎么办", "怎么样", "为什么", "是不是", "要不要", "怎么", "什么", "如何", "可以", "需要", "吗", "呢", "啊")
+
+# 文档频率超过该比例的查询词几乎不影响排序，在有其他查询词时跳过以节省时间
+MAX_DF_RATIO = 0.5
+
+
+def strip_query_stopwords(query: str) -> str:
+    """去掉查询中的疑问词和语气词（全部是停用词时保留原查询）"""
+    stripped = query
+    for word in QUERY_STOPWORDS:
+        stripped = stripped.replace(word, " ")
+    return stripped if stripped.strip() else query
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：中文按字符二元组（单字片段保留单字），英文和数字按单词
+
+    例如 "高血压 BP" -> ["高血", "血压", "bp"]
+    """
+    tokens: List[str] = []
+    for piece in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(piece):
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+class _Document:
+    __slots__ = ("article", "terms", "length", "digest")
+
+    def __init__(self, article: Dict[str, Any], terms: Dict[str, float], length: float, digest: str):
+        self.article = article
+        self.terms = terms
+        self.length = length
+        self.digest = digest
+
+
+def _article_digest(article: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(article, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class KnowledgeIndex:
+    """
+    知识文章倒排索引
+
+    每个词项记录它在各文档中的加权词频（按字段权重累加），用 BM25 排序。
+    倒排表中直接保存 BM25 的词频饱和项，查询时只需乘以 idf 累加；
+    平均文档长度变化超过 NORM_TOLERANCE 时才整体重算一次。
+    新增、修改、删除文章时只更新该文章涉及的倒排表，不重建整个索引。
+    """
+
+    # 平均文档长度的相对变化超过该值时重算倒排表中的饱和项
+    NORM_TOLERANCE = 0.05
+
+    def __init__(self):
+        self._docs: Dict[str, _Document] = {}
+        # 词项 -> {文章 ID: 词频饱和项 tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._total_length = 0.0
+        # 计算饱和项时使用的平均文档长度
+        self._norm_avg_length = 0.0
+        # 每次文章变化时加一，供其他索引判断是否需要同步
+        self.version = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._docs
+
+    def get(self, article_id: str) -> Optional[Dict[str, Any]]:
+        doc = self._docs.get(article_id)
+        return doc.article if doc else None
+
+    def articles(self) -> List[Dict[str, Any]]:
+        # 数据文件在线程中重载，遍历时要加锁
+        with self._lock:
+            return [doc.article for doc in self._docs.values()]
+
+    def upsert(self, article: Dict[str, Any]) -> bool:
+        """新增或更新文章，内容未变化时返回 False"""
+        digest = _article_digest(article)
+        with self._lock:
+            existing = self._docs.get(article["id"])
+            if existing and existing.digest == digest:
+                return False
+            if existing:
+                self._remove_postings(article["id"], existing)
+
+            terms: Dict[str, float] = {}
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                value = article.get(field) or ""
+                if isinstance(value, list):
+                    value = " ".join(value)
+                for token in tokenize(value):
+                    terms[token] = terms.get(token, 0.0) + weight
+                    length += weight
+
+            self._docs[article["id"]] = _Document(article, terms, length, digest)
+            self._total_length += length
+            self.version += 1
+            if not self._refresh_norms():
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[article["id"]] = self._saturate(tf, length)
+            return True
+
+    def remove(self, article_id: str) -> bool:
+        """删除文章，不存在时返回 False"""
+        with self._lock:
+            doc = self._docs.pop(article_id, None)
+            if doc is None:
+                return False
+            self._remove_postings(article_id, doc)
+            self._refresh_norms()
+            self.version += 1
+            return True
+
+    def _saturate(self, tf: float, length: float) -> float:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._norm_avg_length)
+        return tf * (BM25_K1 + 1) / (tf + norm)
+
+    def _refresh_norms(self) -> bool:
+        """平均文档长度变化较大时重建全部饱和项，返回是否重建"""
+        if not self._docs:
+            return False
+        avg_length = self._total_length / len(self._docs)
+        if self._norm_avg_length and abs(avg_length - self._norm_avg_length) <= self._norm_avg_length * self.NORM_TOLERANCE:
+            return False
+        self._norm_avg_length = avg_length
+        postings: Dict[str, Dict[str, float]] = {}
+        for article_id, doc in self._docs.items():
+            for term, tf in doc.terms.items():
+                postings.setdefault(term, {})[article_id] = self._saturate(tf, doc.length)
+        self._postings = postings
+        return True
+
+    def _remove_postings(self, article_id: str, doc: _Document) -> None:
+        for term in doc.terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(article_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_length -= doc.length
+
+    def search(self, query: str, limit: int = 10, category: Optional[str] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """按 BM25 得分返回 [(得分, 文章), ...]"""
+        with self._lock:
+            total_docs = len(self._docs)
+            if not total_docs:
+                return []
+
+            # 查询词去重，按文档频率升序（稀有词优先）
+            terms = sorted(
+                {t for t in tokenize(strip_query_stopwords(query)) if t in self._postings},
+                key=lambda t: len(self._postings[t]),
+            )
+            if len(terms) > 1:
+                selective = [t for t in terms if len(self._postings[t]) <= total_docs * MAX_DF_RATIO]
+                terms = selective or terms[:1]
+
+            docs = self._docs
+            scores: Dict[str, float] = {}
+            for term in terms:
+                posting = self._postings[term]
+                df = len(posting)
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                if not scores:
+                    scores = {article_id: idf * weight for article_id, weight in posting.items()}
+                    continue
+                get = scores.get
+                for article_id, weight in posting.items():
+                    scores[article_id] = get(article_id, 0.0) + idf * weight
+
+            if category:
+                scores = {k: v for k, v in scores.items() if docs[k].article.get("category") == category}
+
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(round(score, 4), docs[article_id].article) for article_id, score in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"articles": len(self._docs), "terms": len(self._postings)}
+
+
+# 通过接口新增、修改和删除的文章（article 为 NULL 表示已删除），优先于数据文件中的同名文章。
+# 每次修改分配全局递增的 rev，各进程按 rev 读取自己还没应用的修改。
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS knowledge_overrides (
+    article_id TEXT PRIMARY KEY,
+    article TEXT,
+    rev INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_knowledge_overrides_rev ON knowledge_overrides (rev);
+"""
+
+_OverrideRow = Tuple[str, Optional[str], int]
+
+
+def _override_changes(conn: sqlite3.Connection, since: int) -> List[_OverrideRow]:
+    return [
+        tuple(row) for row in conn.execute(
+            "SELECT article_id, article, rev FROM knowledge_overrides WHERE rev > ? ORDER BY rev", (since,)
+        )
+    ]
+
+
+def _save_override(conn: sqlite3.Connection, article_id: str, article: Optional[str], since: int) -> List[_OverrideRow]:
+    """在写事务中保存一条修改，返回 since 之后的全部修改（包括其他进程的）"""
+    rev = conn.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM knowledge_overrides").fetchone()[0]
+    conn.execute(
+        "INSERT INTO knowledge_overrides (article_id, article, rev) VALUES (?, ?, ?) "
+        "ON CONFLICT (article_id) DO UPDATE SET article = excluded.article, rev = excluded.rev",
+        (article_id, article, rev),
+    )
+    return _override_changes(conn, since)
+
+
+class KnowledgeBase:
+    """
+    知识库：从数据文件加载文章并维护检索索引
+
+    数据文件修改后（按修改时间判断）只对新增、变化和删除的文章做增量更新。
+    通过接口新增、修改或删除的文章保存在数据库中（传入 db 时），各进程在 refresh() 中应用其他进程的修改；
+    refresh() 最多每 reload_interval 秒检查一次文件和数据库，重载数据文件在线程中进行；
+    文件内容无效时继续使用原数据，文件再次修改后才重试。
+    版本号由数据文件内容的哈希和已应用的最新修改 rev 组成，各进程状态相同时版本号也相同。
+    """
+
+    def __init__(self, path: Optional[str] = None, reload_interval: Optional[float] = None, db: Optional[Database] = None):
+        self.path = path or resolve_data_path("KNOWLEDGE_ARTICLES_FILE", "knowledge_articles.json")
+        self.reload_interval = reload_interval if reload_interval is not None else float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", 5))
+        self.index = KnowledgeIndex()
+        # 为 None 时通过接口做的修改只保存在本进程内存中
+        self.db = db
+
+        # 来自数据文件的文章 ID，文件中删除的文章才从索引移除
+        self._file_ids: set = set()
+        self._file_digest = "0"
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        # 已应用的接口修改：文章 ID -> 文章（None 表示已删除），以及其中最大的 rev
+        self._overrides: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._override_rev = 0
+        self._lock = threading.Lock()
+        # 事件循环中的重载和接口修改依次进行，避免在事件循环中等待 _lock
+        self._update_lock = asyncio.Lock()
+
+        if self.db is not None:
+            self.db.executescript(SCHEMA)
+            with self.db.connection() as conn:
+                self._apply_overrides(_override_changes(conn, 0))
+        try:
+            self.reload()
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"知识库数据文件加载失败: {e}")
+
+    def reload(self) -> Dict[str, int]:
+        """按数据文件增量更新索引（被接口修改过的文章除外），返回变化统计"""
+        changes = {"upserted": 0, "removed": 0}
+        if not self.path or not os.path.exists(self.path):
+            return changes
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "rb") as f:
+                data = f.read()
+            try:
+                articles = json.loads(data)
+                ids = {article["id"] for article in articles}
+            except (KeyError, TypeError, ValueError):
+                # 文件修改前不再重试
+                self._mtime = mtime
+                raise
+
+            for article in articles:
+                if article["id"] not in self._overrides and self.index.upsert(article):
+                    changes["upserted"] += 1
+            for article_id in self._file_ids - ids:
+                if article_id not in self._overrides and self.index.remove(article_id):
+                    changes["removed"] += 1
+
+            self._file_ids = ids
+            self._file_digest = hashlib.sha1(data).hexdigest()[:12]
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+        return changes
+
+    async def refresh(self) -> None:
+        """数据文件修改时增量重载，并应用其他进程通过接口做的修改"""
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        if self.path:
+            try:
+                changed = os.path.getmtime(self.path) != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                async with self._update_lock:
+                    try:
+                        await asyncio.to_thread(self.reload)
+                    except (OSError, KeyError, TypeError, ValueError) as e:
+                        print(f"知识库数据文件加载失败，继续使用原数据: {e}")
+        await self._poll_overrides()
+
+    async def _poll_overrides(self) -> None:
+        if self.db is not None:
+            rows = await self.db.run(_override_changes, self._override_rev)
+            async with self._update_lock:
+                self._apply_overrides(rows)
+
+    def _apply_overrides(self, rows: List[_OverrideRow]) -> None:
+        """按 rev 顺序应用接口修改，已应用过的跳过"""
+        with self._lock:
+            for article_id, data, rev in rows:
+                if rev <= self._override_rev:
+                    continue
+                article = json.loads(data) if data is not None else None
+                self._overrides[article_id] = article
+                if article is None:
+                    self.index.remove(article_id)
+                else:
+                    self.index.upsert(article)
+                self._override_rev = rev
+
+    async def _save_override(self, article_id: str, article: Optional[Dict[str, Any]]) -> None:
+        data = json.dumps(article, ensure_ascii=False) if article is not None else None
+        if self.db is None:
+            rows = [(article_id, data, self._override_rev + 1)]
+        else:
+            rows = await self.db.run_in_transaction(_save_override, article_id, data, self._override_rev)
+        async with self._update_lock:
+            self._apply_overrides(rows)
+
+    def search(self, query: str, limit: int = 10, category: Optional[str] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        return self.index.search(query, limit=limit, category=category)
+
+    def get(self, article_id: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(article_id)
+
+    async def upsert(self, article: Dict[str, Any]) -> bool:
+        """新增或更新文章，内容未变化时返回 False"""
+        await self._poll_overrides()
+        current = self.index.get(article["id"])
+        if current is not None and _article_digest(current) == _article_digest(article):
+            return False
+        await self._save_override(article["id"], article)
+        return True
+
+    async def remove(self, article_id: str) -> bool:
+        """删除文章，不存在时返回 False"""
+        await self._poll_overrides()
+        if article_id not in self.index:
+            return False
+        await self._save_override(article_id, None)
+        return True
+
+    def articles(self) -> Iterable[Dict[str, Any]]:
+        return self.index.articles()
+
+    @property
+    def version(self) -> str:
+        """知识库的当前版本，读接口据此生成 ETag（读取前先调用 refresh()）"""
+        return f"{self._file_digest}.{self._override_rev}"
+
+
+_knowledge_base: Optional[KnowledgeBase] = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """获取全局知识库（首次调用时加载数据文件和接口修改）"""
+    global _knowledge_base
+    if _knowledge_base is None:
+        with _knowledge_base_lock:
+            if _knowledge_base is None:
+                _knowledge_base = KnowledgeBase(db=get_database())
+    return _knowledge_base
@@ -0,0 +1,119 @@
+"""LLM 客户端：共享连接池、显式超时和重试策略"""
+import asyncio
+import os
+import random
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+
+class LLMClientConfig:
+    """LLM 客户端配置，从环境变量读取"""
+
+    def __init__(self):
+        self.api_key = os.getenv("OPENAI_API_KEY", "")
+        self.api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+        self.connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+        # 流式调用时为两段数据之间的最长间隔，非流式时为等待完整回复的时间
+        self.read_timeout = float(os.getenv("LLM_READ_TIMEOUT", 60))
+        self.pool_timeout = float(os.getenv("LLM_POOL_TIMEOUT", 5))
+        self.max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", 32))
+        self.max_keepalive = int(os.getenv("LLM_MAX_KEEPALIVE", 16))
+        # 自行重试（带抖动），SDK 内部重试关闭
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 2))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", 4))
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.connect_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "api_base": self.api_base,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            "pool_timeout": self.pool_timeout,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "max_retries": self.max_retries,
+            "retry_base_delay": self.retry_base_delay,
+            "retry_max_delay": self.retry_max_delay,
+        }
+
+
+# 进程内共享的 HTTP 客户端（对话和摘要共用同一个连接池）
+_http_clients: Optional[Dict[str, Any]] = None
+_http_clients_lock = threading.Lock()
+
+
+def get_http_clients(config: LLMClientConfig) -> Dict[str, Any]:
+    """共享的同步 / 异步 httpx 客户端"""
+    global _http_clients
+    if _http_clients is None:
+        with _http_clients_lock:
+            if _http_clients is None:
+                _http_clients = {
+                    "sync": httpx.Client(timeout=config.timeout(), limits=config.limits()),
+                    "async": httpx.AsyncClient(timeout=config.timeout(), limits=config.limits()),
+                }
+    return _http_clients
+
+
+async def close_http_clients() -> None:
+    """关闭共享连接池（应用退出时调用）"""
+    global _http_clients
+    with _http_clients_lock:
+        clients, _http_clients = _http_clients, None
+    if clients:
+        clients["sync"].close()
+        await clients["async"].aclose()
+
+
+def create_chat_model(config: LLMClientConfig, **kwargs: Any) -> ChatOpenAI:
+    """
+    创建使用共享连接池的 ChatOpenAI
+
+    langchain-openai 只接受一个 http_client 并同时用于同步和异步客户端，
+    这里直接构造 OpenAI SDK 客户端传入，使异步调用走 httpx.AsyncClient 连接池。
+    """
+    clients = get_http_clients(config)
+    params = {
+        "api_key": config.api_key or "missing",
+        "base_url": config.api_base,
+        "timeout": config.timeout(),
+        "max_retries": 0,
+    }
+    return ChatOpenAI(
+        openai_api_key=config.api_key,
+        base_url=config.api_base,
+        request_timeout=config.timeout(),
+        max_retries=0,
+        client=openai.OpenAI(http_client=clients["sync"], **params).chat.completions,
+        async_client=openai.AsyncOpenAI(http_client=clients["async"], **params).chat.completions,
+        **kwargs,
+    )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """超时、连接失败、限流和服务端错误可以重试，也计入熔断；请求本身有误的错误不重试"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def retry_delay(attempt: int, config: LLMClientConfig) -> float:
+    """第 attempt 次重试前的等待时间：指数退避 + 完全抖动"""
+    return random.uniform(0, min(config.retry_max_delay, config.retry_base_delay * (2 ** attempt)))
@@ -0,0 +1,72 @@
+"""LLM 调用并发限制器"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.services.metrics import LLM_REJECTED
+
+
+class LLMQueueFullError(Exception):
+    """等待队列已满，拒绝新的 LLM 调用"""
+
+
+class LLMConcurrencyLimiter:
+    """
+    限制同时进行的 LLM 调用数量
+
+    最多 max_concurrency 个调用同时进行，额外的请求在固定大小的等待队列中排队；
+    队列满时立即抛出 LLMQueueFullError，而不是让请求无限堆积。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("LLM_MAX_QUEUE", 64))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """获取一个调用槽位，用法：async with limiter.slot(): ..."""
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                self._rejected += 1
+                LLM_REJECTED.inc()
+                raise LLMQueueFullError("AI 服务繁忙，请稍后再试")
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._rejected += 1
+                LLM_REJECTED.inc()
+                raise LLMQueueFullError("AI 服务繁忙，排队超时，请稍后再试")
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """当前并发状态"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+        }
@@ -0,0 +1,394 @@
+"""运行指标（Prometheus 文本格式）"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶（秒），覆盖从关键词扫描（亚毫秒）到 LLM 调用（数十秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # 无标签的计数从 0 开始导出，便于直接计算速率
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """当前值；可以直接 set，也可以在导出时通过回调读取"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        """导出时调用 fn() 取值"""
+        self._functions[self._key(labels)] = fn
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, fn in list(self._functions.items()):
+            try:
+                items.append((key, float(fn())))
+            except Exception:
+                continue
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, str]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class Histogram(_Metric):
+    """
+    分桶直方图
+
+    每次观测只做一次二分查找和两次加法；各桶保存非累计计数，
+    导出时才累加成 Prometheus 要求的累计形式。
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., +Inf 桶计数], 总和
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def time(self, **labels: str) -> _Timer:
+        """计时上下文：with histogram.time(stage="llm"): ..."""
+        return _Timer(self, labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序导出"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Optional[Iterable[float]] = None
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表，/metrics 导出其中的全部指标
+REGISTRY = MetricsRegistry()
+
+# Prometheus 文本格式的 Content-Type（charset 由响应对象追加）
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# ---------- 对话 ----------
+
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "health_llm_in_flight",
+    "正在进行的 LLM 调用数",
+)
+LLM_WAITING = REGISTRY.gauge(
+    "health_llm_waiting",
+    "排队等待 LLM 调用槽位的请求数",
+)
+LLM_REJECTED = REGISTRY.counter(
+    "health_llm_rejected_total",
+    "等待队列已满或排队超时被拒绝的请求数",
+)
+LLM_RETRIES = REGISTRY.counter(
+    "health_llm_retries_total",
+    "LLM 调用因超时、连接失败或服务端错误而重试的次数",
+)
+LLM_COALESCED = REGISTRY.counter(
+    "health_llm_coalesced_total",
+    "与进行中的相同提示词调用合并、未单独请求 LLM 的请求数",
+)
+LLM_SHORT_CIRCUITED = REGISTRY.counter(
+    "health_llm_short_circuited_total",
+    "熔断器打开期间直接使用备用回复、未调用 LLM 的请求数",
+)
+LLM_CIRCUIT_STATE = REGISTRY.gauge(
+    "health_llm_circuit_state",
+    "LLM 熔断器状态：0 关闭，1 半开，2 打开",
+)
+CHAT_STAGE_SECONDS = REGISTRY.histogram(
+    "health_chat_stage_seconds",
+    "对话请求各阶段耗时（秒）",
+    ["stage"],
+)
+CHAT_REQUEST_SECONDS = REGISTRY.histogram(
+    "health_chat_request_seconds",
+    "对话请求总耗时（秒），按接口和结果区分",
+    ["endpoint", "outcome"],
+)
+LLM_ERRORS = REGISTRY.counter(
+    "health_llm_errors_total",
+    "LLM 调用异常次数，按异常类型区分",
+    ["error"],
+)
+FALLBACK_REPLIES = REGISTRY.counter(
+    "health_fallback_replies_total",
+    "LLM 调用失败后使用症状分析备用回复的次数",
+)
+EMERGENCY_HITS = REGISTRY.counter(
+    "health_emergency_hits_total",
+    "命中紧急情况检测的消息数",
+)
+CACHE_HITS = REGISTRY.counter(
+    "health_response_cache_hits_total",
+    "命中回复缓存的次数",
+)
+PROMPT_TOKENS = REGISTRY.counter(
+    "health_prompt_tokens_total",
+    "发送给 LLM 的提示词 token 数（估算）",
+)
+COMPLETION_TOKENS = REGISTRY.counter(
+    "health_completion_tokens_total",
+    "LLM 生成的回复 token 数（估算）",
+)
+
+# ---------- 提醒 ----------
+
+REMINDERS_FIRED = REGISTRY.counter(
+    "health_reminders_fired_total",
+    "已触发的提醒数，按提醒类型区分",
+    ["kind"],
+)
+REMINDER_FIRE_LAG_SECONDS = REGISTRY.histogram(
+    "health_reminder_fire_lag_seconds",
+    "提醒实际触发时间与原定时间的差（秒）",
+)
+REMINDERS_PENDING = REGISTRY.gauge(
+    "health_reminders_pending",
+    "调度器内存中等待触发的提醒数（未来一个时间窗口内到期的条目）",
+)
+
+# ---------- 后台任务 ----------
+
+# 后台任务耗时从毫秒到数分钟不等
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+JOB_QUEUE_DEPTH = REGISTRY.gauge(
+    "health_job_queue_depth",
+    "等待执行的后台任务数",
+)
+JOBS_RUNNING = REGISTRY.gauge(
+    "health_jobs_running",
+    "正在执行的后台任务数",
+)
+JOBS_REJECTED = REGISTRY.counter(
+    "health_jobs_rejected_total",
+    "等待队列已满被拒绝的后台任务数",
+)
+JOBS_FINISHED = REGISTRY.counter(
+    "health_jobs_finished_total",
+    "已结束的后台任务数，按任务类型和结果（succeeded / failed / cancelled）区分",
+    ["type", "status"],
+)
+JOB_WAIT_SECONDS = REGISTRY.histogram(
+    "health_job_wait_seconds",
+    "后台任务从提交到开始执行的排队耗时（秒）",
+    ["type"],
+    JOB_BUCKETS,
+)
+JOB_RUN_SECONDS = REGISTRY.histogram(
+    "health_job_run_seconds",
+    "后台任务的执行耗时（秒）",
+    ["type"],
+    JOB_BUCKETS,
+)
+
+# ---------- 读接口缓存 ----------
+
+HTTP_CACHE_RESPONSES = REGISTRY.counter(
+    "health_http_cache_responses_total",
+    "带 ETag 的读接口响应数，按接口和结果（not_modified 返回 304 / hit 命中响应缓存 / miss 重新查询和序列化）区分",
+    ["endpoint", "outcome"],
+)
+HTTP_RESPONSE_BYTES = REGISTRY.counter(
+    "health_http_response_bytes_total",
+    "带 ETag 的读接口发送的响应体字节数，按内容编码（br / gzip / identity）区分",
+    ["encoding"],
+)
+
+# ---------- 预约 ----------
+
+APPOINTMENT_BOOKINGS = REGISTRY.counter(
+    "health_appointment_bookings_total",
+    "预约号源操作数，按结果（booked 预约成功 / conflict 号源已被预约 / cancelled 取消）区分",
+    ["outcome"],
+)
+APPOINTMENT_BOOKING_SECONDS = REGISTRY.histogram(
+    "health_appointment_booking_seconds",
+    "预约成功的耗时（秒），包括等待号源锁和写入数据库",
+)
+
+# ---------- 附近医院 ----------
+
+HOSPITAL_QUERY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+
+HOSPITAL_QUERY_SECONDS = REGISTRY.histogram(
+    "health_hospital_query_seconds",
+    "附近医院查询耗时（秒），按查询方式（radius 半径内 / nearest 最近 k 个）区分",
+    ["mode"],
+    HOSPITAL_QUERY_BUCKETS,
+)
+HOSPITAL_FACILITIES = REGISTRY.gauge(
+    "health_hospital_facilities",
+    "医疗机构目录中已建立索引的机构数",
+)
+
+# ---------- 通知 ----------
+
+NOTIFICATIONS_CREATED = REGISTRY.counter(
+    "health_notifications_created_total",
+    "新增的站内通知数，按通知类型区分",
+    ["type"],
+)
+NOTIFICATION_SUBSCRIBERS = REGISTRY.gauge(
+    "health_notification_subscribers",
+    "当前订阅通知推送（SSE）的连接数",
+)
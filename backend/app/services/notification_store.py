@@ -0,0 +1,303 @@
+"""站内通知：按用户追加的通知流、未读计数和增量推送"""
+import asyncio
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.services.database import Database, get_database
+from app.services.health_store import _now, decode_cursor, encode_cursor
+from app.services.metrics import NOTIFICATION_SUBSCRIBERS, NOTIFICATIONS_CREATED
+
+NOTIFICATION_TYPES = ("message", "lab", "medication", "system")
+
+# 提醒类型 -> 通知类型
+REMINDER_NOTIFICATION_TYPES = {"medication": "medication", "checkup": "lab", "custom": "system"}
+
+# 每个订阅队列最多积压的变更数，客户端读得太慢时丢弃最早的（推送时发现版本号不连续会从数据库补齐）
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# 每次修改分配该用户的下一个版本号 rev，被修改的通知记下这个版本号；
+# 删除只做标记，按 rev 读取变更时删除也能作为变更返回。
+# 未读数和最新版本号存在 notification_counters 中，与通知在同一个事务里更新，读取时不需要统计。
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT,
+    read INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    rev INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_feed ON notifications (user_id, seq) WHERE deleted = 0;
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (user_id, seq) WHERE deleted = 0 AND read = 0;
+CREATE INDEX IF NOT EXISTS idx_notifications_rev ON notifications (user_id, rev);
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id TEXT PRIMARY KEY,
+    unread INTEGER NOT NULL DEFAULT 0,
+    rev INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+
+def _notification_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    notification = dict(row)
+    notification["read"] = bool(notification["read"])
+    notification["deleted"] = bool(notification["deleted"])
+    return notification
+
+
+def _next_rev(conn: sqlite3.Connection, user_id: str, unread_delta: int) -> Tuple[int, int]:
+    """在写入事务中分配下一个版本号并调整未读数，返回 (rev, unread)"""
+    row = conn.execute(
+        "INSERT INTO notification_counters (user_id, unread, rev) VALUES (?, ?, 1) "
+        "ON CONFLICT (user_id) DO UPDATE SET unread = unread + excluded.unread, rev = rev + 1 "
+        "RETURNING rev, unread",
+        (user_id, unread_delta),
+    ).fetchone()
+    return row[0], row[1]
+
+
+class NotificationStore:
+    """
+    通知存储
+
+    每个用户的通知按写入顺序追加（seq 递增），列表按 seq 倒序做键集分页；
+    已读和删除不改变顺序，只更新该条通知的状态和版本号 rev。
+
+    每次写入（新增、标为已读、删除）在一个事务内完成，并产生一条变更：
+    {"rev", "unread", "notifications": [被修改的通知，删除的带 deleted=true]}，
+    推送给该用户的订阅者（subscribe）。客户端只需记住最后的 rev，断线后用 changes(since=rev) 补齐，
+    不需要重新读取整个列表。
+    """
+
+    def __init__(self, db: Optional[Database] = None, changes_limit: Optional[int] = None):
+        self.db = db or get_database()
+        self.db.executescript(SCHEMA)
+        # 一次最多返回的变更数，落后太多的客户端改为重新读取列表
+        self.changes_limit = changes_limit or int(os.getenv("NOTIFICATION_CHANGES_LIMIT", 500))
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        NOTIFICATION_SUBSCRIBERS.set_function(lambda: sum(len(queues) for queues in self._subscribers.values()))
+
+    # ---------- 写入 ----------
+
+    async def create(
+        self, user_id: str, type: str, title: str, body: Optional[str] = None, read: bool = False
+    ) -> Dict[str, Any]:
+        """
+        追加一条通知
+
+        Raises:
+            ValueError: 通知类型无效
+        """
+        if type not in NOTIFICATION_TYPES:
+            raise ValueError(f"无效的通知类型：{type}")
+        notification = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "type": type,
+            "title": title,
+            "body": body,
+            "read": bool(read),
+            "deleted": False,
+            "created_at": _now(),
+        }
+
+        def write(conn: sqlite3.Connection) -> Dict[str, Any]:
+            rev, unread = _next_rev(conn, user_id, 0 if read else 1)
+            notification["rev"] = rev
+            notification["seq"] = conn.execute(
+                "INSERT INTO notifications (id, user_id, type, title, body, read, deleted, rev, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (notification["id"], user_id, type, title, body, int(read), rev, notification["created_at"]),
+            ).lastrowid
+            return {"rev": rev, "unread": unread, "notifications": [notification]}
+
+        change = await self.db.run_in_transaction(write)
+        NOTIFICATIONS_CREATED.inc(type=type)
+        self._publish(user_id, change)
+        return notification
+
+    async def mark_read(self, user_id: str, ids: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """把指定的（ids 为 None 时为全部）未读通知标为已读，返回这次的变更；没有需要修改的通知时返回 None"""
+        return await self._update(user_id, "read", ids=ids)
+
+    async def delete(
+        self, user_id: str, ids: Optional[List[str]] = None, created_on: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        删除指定的通知，或某一天（created_on，YYYY-MM-DD）的全部通知，返回这次的变更
+
+        Raises:
+            ValueError: 日期格式无效
+        """
+        return await self._update(user_id, "deleted", ids=ids, created_on=created_on)
+
+    async def _update(
+        self,
+        user_id: str,
+        field: str,
+        ids: Optional[List[str]] = None,
+        created_on: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """把符合条件、尚未删除的通知的 field（read / deleted）置为 1，分配一个新版本号"""
+        where = ["user_id = ? AND deleted = 0"]
+        params: List[Any] = [user_id]
+        if field == "read":
+            where.append("AND read = 0")
+        if ids is not None:
+            if not ids:
+                return None
+            where.append(f"AND id IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        if created_on is not None:
+            try:
+                day = date.fromisoformat(created_on)
+            except ValueError:
+                raise ValueError(f"无效的日期：{created_on}，应为 YYYY-MM-DD")
+            where.append("AND created_at >= ? AND created_at < ?")
+            params.extend([day.isoformat(), (day + timedelta(days=1)).isoformat()])
+        condition = " ".join(where)
+
+        def write(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            rows = conn.execute(f"SELECT * FROM notifications WHERE {condition}", params).fetchall()
+            if not rows:
+                return None
+            changed = [_notification_from_row(row) for row in rows]
+            unread_delta = -sum(1 for n in changed if not n["read"])
+            rev, unread = _next_rev(conn, user_id, unread_delta)
+            # 同一事务内，条件相同的 UPDATE 修改的正是上面读出的这些行
+            conn.execute(f"UPDATE notifications SET {field} = 1, rev = ? WHERE {condition}", [rev, *params])
+            for notification in changed:
+                notification[field] = True
+                notification["rev"] = rev
+            return {"rev": rev, "unread": unread, "notifications": changed}
+
+        change = await self.db.run_in_transaction(write)
+        if change is not None:
+            self._publish(user_id, change)
+        return change
+
+    # ---------- 读取 ----------
+
+    async def list_notifications(
+        self,
+        user_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        type: Optional[str] = None,
+        unread_only: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按写入顺序倒序分页列出未删除的通知（游标用法同 HealthStore.list_records）"""
+        sql = ["SELECT * FROM notifications WHERE user_id = ? AND deleted = 0"]
+        params: List[Any] = [user_id]
+        if unread_only:
+            sql.append("AND read = 0")
+        if type:
+            sql.append("AND type = ?")
+            params.append(type)
+        if cursor:
+            (last_seq,) = decode_cursor(cursor)
+            sql.append("AND seq < ?")
+            params.append(last_seq)
+        sql.append("ORDER BY seq DESC LIMIT ?")
+        params.append(limit + 1)
+
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(" ".join(sql), params).fetchall()
+
+        rows = await self.db.run(query)
+        notifications = [_notification_from_row(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(notifications[-1]["seq"]) if len(rows) > limit else None
+        return notifications, next_cursor
+
+    async def counters(self, user_id: str) -> Dict[str, int]:
+        """当前未读数和最新版本号 {"unread", "rev"}"""
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute(
+                "SELECT unread, rev FROM notification_counters WHERE user_id = ?", (user_id,)
+            ).fetchone()
+
+        row = await self.db.run(query)
+        return {"unread": row["unread"], "rev": row["rev"]} if row else {"unread": 0, "rev": 0}
+
+    async def changes(self, user_id: str, since: int) -> Dict[str, Any]:
+        """
+        版本号 since 之后的全部变更，合并为一条 {"rev", "unread", "notifications"}（每条通知只出现一次，为最新状态）
+
+        变更超过 changes_limit 条，或 since 比当前版本号还大（数据库已重建）时，返回 {"rev", "unread", "reset": true}，
+        客户端应重新读取列表。
+        """
+        def query(conn: sqlite3.Connection) -> Dict[str, Any]:
+            counters = conn.execute(
+                "SELECT unread, rev FROM notification_counters WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            rev, unread = (counters["rev"], counters["unread"]) if counters else (0, 0)
+            if since > rev:
+                return {"rev": rev, "unread": unread, "reset": True}
+            rows = conn.execute(
+                "SELECT * FROM notifications WHERE user_id = ? AND rev > ? ORDER BY rev, seq LIMIT ?",
+                (user_id, since, self.changes_limit + 1),
+            ).fetchall()
+            if len(rows) > self.changes_limit:
+                return {"rev": rev, "unread": unread, "reset": True}
+            return {"rev": rev, "unread": unread, "notifications": [_notification_from_row(row) for row in rows]}
+
+        return await self.db.run(query)
+
+    # ---------- 推送 ----------
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """订阅某个用户的通知变更，用完调用 unsubscribe"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def _publish(self, user_id: str, change: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers.get(user_id, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(change)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "subscribed_users": len(self._subscribers),
+        }
+
+
+_notification_store: Optional[NotificationStore] = None
+_notification_store_lock = threading.Lock()
+
+
+def get_notification_store() -> NotificationStore:
+    """获取全局通知存储（首次调用时建表）"""
+    global _notification_store
+    if _notification_store is None:
+        with _notification_store_lock:
+            if _notification_store is None:
+                _notification_store = NotificationStore()
+    return _notification_store
+
+
+async def notify_reminder(event: Dict[str, Any]) -> None:
+    """提醒调度器的监听器：每条触发的提醒写入一条通知"""
+    await get_notification_store().create(
+        event["user_id"],
+        REMINDER_NOTIFICATION_TYPES.get(event["kind"], "system"),
+        event["title"],
+        event["body"] or ("错过的提醒" if event.get("late") else None),
+    )
@@ -0,0 +1,40 @@
+"""令牌桶限速器"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+
+class RateLimiter:
+    """
+    令牌桶限速
+
+    每秒补充 rate 个令牌，最多积攒 burst 个；每次 acquire 消耗一个令牌，
+    没有令牌时按需要的时间等待，等待者按到达顺序依次获得令牌。
+    rate 小于等于 0 时不限速。
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._waited = 0.0
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                self._waited += delay
+                await asyncio.sleep(delay)
+                self._tokens = 1.0
+                self._updated = time.monotonic()
+            self._tokens -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rate": self.rate, "burst": self.burst, "waited_seconds": round(self._waited, 3)}
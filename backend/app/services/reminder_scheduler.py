@@ -0,0 +1,230 @@
+"""提醒调度器（最小堆定时器 + 数据库时间窗口）"""
+import asyncio
+import heapq
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from app.services.metrics import REMINDER_FIRE_LAG_SECONDS, REMINDERS_FIRED, REMINDERS_PENDING
+from app.services.reminder_store import ReminderStore, get_reminder_store
+
+ReminderListener = Callable[[Dict[str, Any]], Union[None, Awaitable[None]]]
+
+# 每个订阅队列最多积压的提醒数，客户端读得太慢时丢弃最早的
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class ReminderScheduler:
+    """
+    提醒调度器
+
+    所有提醒保存在数据库中，内存里只保留未来 horizon 秒内到期的条目，按提醒时间放在最小堆中：
+    - 每 refill_interval 秒按 next_fire_at 索引读取一次时间窗口内的条目（包括停机期间错过的），
+      读取量只与窗口内的提醒数有关，与提醒总数无关
+    - 每次醒来只弹出已到期的堆顶条目，触发后只重新计算这些条目的下次提醒时间
+    - 条目被修改或删除时不从堆中查找删除，而是记录当前有效的提醒时间，弹出时丢弃过期的条目
+
+    触发的提醒交给监听器（add_listener）并推送给该用户的订阅者（subscribe）。
+    """
+
+    def __init__(
+        self,
+        store: Optional[ReminderStore] = None,
+        horizon: Optional[float] = None,
+        refill_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.store = store or get_reminder_store()
+        self.horizon = horizon if horizon is not None else float(os.getenv("REMINDER_HORIZON_SECONDS", 300))
+        # 刷新间隔必须小于时间窗口，否则窗口之间会有空隙
+        refill = refill_interval if refill_interval is not None else float(os.getenv("REMINDER_REFILL_SECONDS", 60))
+        self.refill_interval = min(refill, self.horizon / 2)
+        self.batch_size = batch_size or int(os.getenv("REMINDER_FIRE_BATCH", 500))
+
+        self._heap: List[Tuple[float, str]] = []
+        # 提醒 ID -> 当前有效的提醒时间；与堆中条目不一致的视为已失效
+        self._scheduled: Dict[str, float] = {}
+        self._loaded_until = 0.0
+        self._next_refill = 0.0
+        self._listeners: List[ReminderListener] = []
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fired = 0
+        self._skipped = 0
+        REMINDERS_PENDING.set_function(lambda: len(self._scheduled))
+
+    # ---------- 维护时间窗口 ----------
+
+    def schedule(self, reminder_id: str, fire_at: Optional[float]) -> None:
+        """新增、修改或删除提醒后调用；fire_at 为 None 表示不再提醒"""
+        if fire_at is None or fire_at > self._loaded_until:
+            # 窗口外的条目由之后的刷新读入
+            self._scheduled.pop(reminder_id, None)
+            return
+        self._push(reminder_id, fire_at)
+        if self._wakeup is not None and self._heap[0][1] == reminder_id:
+            self._wakeup.set()
+
+    def _push(self, reminder_id: str, fire_at: float) -> None:
+        if self._scheduled.get(reminder_id) == fire_at:
+            return
+        self._scheduled[reminder_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, reminder_id))
+
+    async def refill(self, now: float) -> int:
+        """读取 now + horizon 之前到期的条目放进堆中，返回新加入的条目数"""
+        until = now + self.horizon
+        added = 0
+        for fire_at, reminder_id in await self.store.due_before(until):
+            if self._scheduled.get(reminder_id) != fire_at:
+                self._push(reminder_id, fire_at)
+                added += 1
+        self._loaded_until = until
+        self._next_refill = now + self.refill_interval
+        # 失效条目过多时重建堆，避免频繁修改的提醒让堆无限增长
+        if len(self._heap) > 2 * len(self._scheduled) + 1024:
+            self._heap = [(at, rid) for rid, at in self._scheduled.items()]
+            heapq.heapify(self._heap)
+        return added
+
+    def _pop_due(self, now: float) -> List[Tuple[float, str]]:
+        """弹出已到期的有效条目（最多 batch_size 个）"""
+        due = []
+        heap, scheduled = self._heap, self._scheduled
+        while heap and heap[0][0] <= now and len(due) < self.batch_size:
+            fire_at, reminder_id = heapq.heappop(heap)
+            if scheduled.get(reminder_id) == fire_at:
+                del scheduled[reminder_id]
+                due.append((fire_at, reminder_id))
+        return due
+
+    # ---------- 触发 ----------
+
+    async def tick(self, now: Optional[float] = None) -> int:
+        """处理一轮：需要时刷新时间窗口，然后触发全部到期的提醒，返回触发数"""
+        now = now if now is not None else time.time()
+        if now >= self._next_refill:
+            await self.refill(now)
+        fired = 0
+        while True:
+            due = self._pop_due(now)
+            if not due:
+                return fired
+            reminders = await self.store.advance(due, now)
+            self._skipped += len(due) - len(reminders)
+            for reminder in reminders:
+                if reminder["next_fire_at"] is not None and reminder["next_fire_at"] <= self._loaded_until:
+                    self._push(reminder["id"], reminder["next_fire_at"])
+                await self._deliver(reminder, now)
+            fired += len(reminders)
+
+    async def _deliver(self, reminder: Dict[str, Any], now: float) -> None:
+        lag = max(0.0, now - reminder["scheduled_at"])
+        REMINDERS_FIRED.inc(kind=reminder["kind"])
+        REMINDER_FIRE_LAG_SECONDS.observe(lag)
+        self._fired += 1
+        event = {
+            "type": "reminder",
+            "reminder_id": reminder["id"],
+            "user_id": reminder["user_id"],
+            "kind": reminder["kind"],
+            "title": reminder["title"],
+            "body": reminder["body"],
+            "scheduled_at": reminder["scheduled_at"],
+            "fired_at": now,
+            # 停机期间错过、启动后补发的提醒
+            "late": lag > self.refill_interval,
+            "next_fire_at": reminder["next_fire_at"],
+        }
+        for listener in list(self._listeners):
+            try:
+                result = listener(event)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"提醒监听器错误: {e}")
+        for queue in list(self._subscribers.get(event["user_id"], ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def run(self) -> None:
+        """调度循环：睡到堆顶到期或下次刷新，新加入更早的条目时提前醒来"""
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                # 数据库暂时不可用等错误不终止调度，稍后重试
+                print(f"提醒调度错误: {e}")
+            wake_at = self._next_refill
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, wake_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---------- 推送 ----------
+
+    def add_listener(self, listener: ReminderListener) -> None:
+        """注册监听器，每次触发提醒时以提醒事件调用（可以是协程函数）"""
+        self._listeners.append(listener)
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """订阅某个用户的提醒事件，用完调用 unsubscribe"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "pending": len(self._scheduled),
+            "heap_size": len(self._heap),
+            "next_fire_at": self._heap[0][0] if self._heap else None,
+            "loaded_until": self._loaded_until or None,
+            "horizon_seconds": self.horizon,
+            "refill_seconds": self.refill_interval,
+            "fired": self._fired,
+            "skipped": self._skipped,
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+        }
+
+
+_scheduler: Optional[ReminderScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_reminder_scheduler() -> ReminderScheduler:
+    """获取全局提醒调度器"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ReminderScheduler()
+    return _scheduler
@@ -0,0 +1,305 @@
+"""用药、复查提醒的持久化存储和下次提醒时间计算"""
+import calendar
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.database import Database, get_database
+from app.services.health_store import _now, decode_cursor, encode_cursor
+
+REMINDER_KINDS = ("medication", "checkup", "custom")
+
+# once：只在 start_date 提醒一次；daily / weekly：每天 / 每周；days / months：每 every 天 / 每 every 个月
+REMINDER_FREQUENCIES = ("once", "daily", "weekly", "days", "months")
+
+TIME_OF_DAY_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+# 可以修改的字段；修改时间规则相关的字段后重新计算下次提醒时间
+UPDATABLE_FIELDS = ("kind", "title", "body", "frequency", "every", "start_date", "time_of_day", "enabled")
+SCHEDULE_FIELDS = ("frequency", "every", "start_date", "time_of_day", "enabled")
+
+# 停用或不再提醒的条目 next_fire_at 为 NULL，不进入部分索引，调度器只扫描即将到期的条目
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT,
+    frequency TEXT NOT NULL,
+    every INTEGER NOT NULL DEFAULT 1,
+    start_date TEXT NOT NULL,
+    time_of_day TEXT NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    next_fire_at REAL,
+    last_fired_at REAL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_reminders_next_fire ON reminders (next_fire_at) WHERE next_fire_at IS NOT NULL;
+"""
+
+
+def _add_months(day: datetime, months: int) -> datetime:
+    """加若干个月，日期超出当月天数时取月末（如 1 月 31 日加一个月为 2 月 28/29 日）"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _reminder_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    reminder = dict(row)
+    reminder["enabled"] = bool(reminder["enabled"])
+    return reminder
+
+
+class ReminderStore:
+    """
+    提醒存储
+
+    每条提醒保存时间规则和预先算好的下次提醒时间 next_fire_at（Unix 秒），
+    调度器按 next_fire_at 索引只读取即将到期的条目；提醒触发后只重新计算这一条。
+    日期和每天的提醒时刻按本地时区（REMINDER_UTC_OFFSET_HOURS，默认东八区）解释。
+    """
+
+    def __init__(self, db: Optional[Database] = None, utc_offset_hours: Optional[float] = None):
+        self.db = db or get_database()
+        self.db.executescript(SCHEMA)
+        offset = utc_offset_hours if utc_offset_hours is not None else float(os.getenv("REMINDER_UTC_OFFSET_HOURS", 8))
+        self.utc_offset = int(offset * 3600)
+
+    # ---------- 时间规则 ----------
+
+    def validate(self, reminder: Dict[str, Any]) -> None:
+        """
+        校验提醒的类型和时间规则
+
+        Raises:
+            ValueError: 字段无效
+        """
+        if reminder["kind"] not in REMINDER_KINDS:
+            raise ValueError(f"无效的提醒类型：{reminder['kind']}")
+        if reminder["frequency"] not in REMINDER_FREQUENCIES:
+            raise ValueError(f"无效的提醒频率：{reminder['frequency']}")
+        if not isinstance(reminder["every"], int) or not 1 <= reminder["every"] <= 3650:
+            raise ValueError("every 应为 1 到 3650 之间的整数")
+        if not TIME_OF_DAY_RE.match(reminder["time_of_day"]):
+            raise ValueError(f"无效的提醒时刻：{reminder['time_of_day']}，应为 HH:MM")
+        try:
+            datetime.strptime(reminder["start_date"], "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"无效的日期：{reminder['start_date']}，应为 YYYY-MM-DD")
+
+    def next_fire_at(self, reminder: Dict[str, Any], after: float) -> Optional[float]:
+        """
+        严格晚于 after 的下一次提醒时间（Unix 秒），不再提醒时返回 None
+
+        第一次提醒在 start_date 的 time_of_day，之后按频率重复；
+        错过的多次提醒不补发，直接跳到 after 之后的一次。
+        """
+        if not reminder["enabled"]:
+            return None
+        hour, minute = map(int, reminder["time_of_day"].split(":"))
+        first_local = datetime.strptime(reminder["start_date"], "%Y-%m-%d") + timedelta(hours=hour, minutes=minute)
+        first = self._timestamp(first_local)
+        if first > after:
+            return first
+
+        frequency = reminder["frequency"]
+        if frequency == "once":
+            return None
+        if frequency == "months":
+            every = reminder["every"]
+            # 先按平均月长估算已经过去的周期数（取偏小的值），再向后逐个推进
+            k = max(1, int((after - first) / (30.437 * 86400) / every) - 1)
+            while True:
+                candidate = self._timestamp(_add_months(first_local, k * every))
+                if candidate > after:
+                    return candidate
+                k += 1
+
+        days = {"daily": 1, "weekly": 7}.get(frequency, reminder["every"])
+        period = days * 86400
+        return first + ((after - first) // period + 1) * period
+
+    def _timestamp(self, local: datetime) -> float:
+        """本地时间（不带时区）-> Unix 秒"""
+        return (local - datetime(1970, 1, 1)).total_seconds() - self.utc_offset
+
+    # ---------- 增删改查 ----------
+
+    async def create(self, reminder: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        新增提醒并计算下次提醒时间
+
+        Raises:
+            ValueError: 字段无效
+        """
+        reminder = dict(reminder)
+        reminder.setdefault("id", uuid.uuid4().hex)
+        reminder.setdefault("body", None)
+        reminder.setdefault("every", 1)
+        reminder.setdefault("enabled", True)
+        self.validate(reminder)
+        reminder["enabled"] = bool(reminder["enabled"])
+        reminder["next_fire_at"] = self.next_fire_at(reminder, now if now is not None else time.time())
+        reminder["last_fired_at"] = None
+        reminder["created_at"] = reminder["updated_at"] = _now()
+
+        def insert(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO reminders (id, user_id, kind, title, body, frequency, every, start_date, time_of_day, "
+                "enabled, next_fire_at, last_fired_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    reminder["id"], reminder["user_id"], reminder["kind"], reminder["title"], reminder["body"],
+                    reminder["frequency"], reminder["every"], reminder["start_date"], reminder["time_of_day"],
+                    int(reminder["enabled"]), reminder["next_fire_at"], None,
+                    reminder["created_at"], reminder["updated_at"],
+                ),
+            )
+
+        await self.db.run_in_transaction(insert)
+        return reminder
+
+    async def get(self, reminder_id: str) -> Optional[Dict[str, Any]]:
+        def query(conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+            return conn.execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+
+        row = await self.db.run(query)
+        return _reminder_from_row(row) if row else None
+
+    async def update(
+        self, reminder_id: str, changes: Dict[str, Any], now: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        修改提醒，时间规则或启用状态变化时重新计算下次提醒时间；提醒不存在时返回 None
+
+        Raises:
+            ValueError: 字段无效
+        """
+        changes = {k: v for k, v in changes.items() if k in UPDATABLE_FIELDS}
+        now = now if now is not None else time.time()
+
+        def write(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+            if row is None:
+                return None
+            reminder = _reminder_from_row(row)
+            reminder.update(changes)
+            self.validate(reminder)
+            reminder["enabled"] = bool(reminder["enabled"])
+            if any(field in changes for field in SCHEDULE_FIELDS):
+                reminder["next_fire_at"] = self.next_fire_at(reminder, now)
+            reminder["updated_at"] = _now()
+            conn.execute(
+                "UPDATE reminders SET kind = ?, title = ?, body = ?, frequency = ?, every = ?, start_date = ?, "
+                "time_of_day = ?, enabled = ?, next_fire_at = ?, updated_at = ? WHERE id = ?",
+                (
+                    reminder["kind"], reminder["title"], reminder["body"], reminder["frequency"], reminder["every"],
+                    reminder["start_date"], reminder["time_of_day"], int(reminder["enabled"]),
+                    reminder["next_fire_at"], reminder["updated_at"], reminder_id,
+                ),
+            )
+            return reminder
+
+        return await self.db.run_in_transaction(write)
+
+    async def delete(self, reminder_id: str) -> bool:
+        def write(conn: sqlite3.Connection) -> bool:
+            return conn.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,)).rowcount > 0
+
+        return await self.db.run_in_transaction(write)
+
+    async def list_reminders(
+        self, user_id: str, limit: int = 50, cursor: Optional[str] = None, kind: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按创建时间倒序分页列出提醒（游标用法同 HealthStore.list_records）"""
+        sql = ["SELECT * FROM reminders WHERE user_id = ?"]
+        params: List[Any] = [user_id]
+        if kind:
+            sql.append("AND kind = ?")
+            params.append(kind)
+        if cursor:
+            last_created, last_id = decode_cursor(cursor)
+            sql.append("AND (created_at, id) < (?, ?)")
+            params.extend([last_created, last_id])
+        sql.append("ORDER BY created_at DESC, id DESC LIMIT ?")
+        params.append(limit + 1)
+
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(" ".join(sql), params).fetchall()
+
+        rows = await self.db.run(query)
+        reminders = [_reminder_from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = reminders[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return reminders, next_cursor
+
+    # ---------- 调度器使用 ----------
+
+    async def due_before(self, until: float) -> List[Tuple[float, str]]:
+        """下次提醒时间不晚于 until 的全部条目 [(next_fire_at, id), ...]（包括已经过期未触发的）"""
+        def query(conn: sqlite3.Connection) -> List[Tuple[float, str]]:
+            return [
+                (row[0], row[1])
+                for row in conn.execute(
+                    "SELECT next_fire_at, id FROM reminders WHERE next_fire_at IS NOT NULL AND next_fire_at <= ?",
+                    (until,),
+                )
+            ]
+
+        return await self.db.run(query)
+
+    async def advance(self, due: Sequence[Tuple[float, str]], now: float) -> List[Dict[str, Any]]:
+        """
+        把到期的提醒标记为已触发，并计算各自的下一次提醒时间
+
+        只更新 next_fire_at 仍等于调度时取到的值的条目：期间被修改、删除，或已被其他进程触发的条目跳过，
+        多个进程同时运行调度器也不会重复提醒。
+
+        Returns:
+            实际触发的提醒（scheduled_at 为原定提醒时间，next_fire_at 为新的下次提醒时间）
+        """
+        def write(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+            fired = []
+            for scheduled_at, reminder_id in due:
+                row = conn.execute(
+                    "SELECT * FROM reminders WHERE id = ? AND next_fire_at = ?", (reminder_id, scheduled_at)
+                ).fetchone()
+                if row is None:
+                    continue
+                reminder = _reminder_from_row(row)
+                reminder["next_fire_at"] = self.next_fire_at(reminder, max(now, scheduled_at))
+                reminder["last_fired_at"] = now
+                reminder["scheduled_at"] = scheduled_at
+                conn.execute(
+                    "UPDATE reminders SET next_fire_at = ?, last_fired_at = ? WHERE id = ?",
+                    (reminder["next_fire_at"], now, reminder_id),
+                )
+                fired.append(reminder)
+            return fired
+
+        return await self.db.run_in_transaction(write)
+
+
+_reminder_store: Optional[ReminderStore] = None
+_reminder_store_lock = threading.Lock()
+
+
+def get_reminder_store() -> ReminderStore:
+    """获取全局提醒存储（首次调用时建表）"""
+    global _reminder_store
+    if _reminder_store is None:
+        with _reminder_store_lock:
+            if _reminder_store is None:
+                _reminder_store = ReminderStore()
+    return _reminder_store
@@ -0,0 +1,133 @@
+"""
+健康记录汇总和检查报告解析（纯计算，在后台任务的子进程中执行）
+
+本模块只依赖标准库和症状规则引擎，子进程导入开销小；函数的参数和返回值都是普通的字典和列表。
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# 数值后面跟参考范围，如 "血红蛋白 105 g/L (130-175)"、"ALT: 86 U/L 参考值 9~50"。
+# 数值和范围都必须是完整的数字，且数值和范围之间要有空白、单位、括号或 "参考" 字样，
+# 避免把 "报告编号 20240115-0032"、日期、电话号码拆成数值和范围
+_VALUE_WITH_RANGE_RE = re.compile(
+    r"(?P<item>[A-Za-z\u4e00-\u9fff][A-Za-z0-9\u4e00-\u9fff\-·()（）]{0,30}?)\s*[:：]?\s*"
+    r"(?<![\d.])(?P<value>-?\d+(?:\.\d+)?)(?![\d.])(?=[\sA-Za-zμ%/\^\u4e00-\u9fff（(\[])"
+    r"\s*(?P<unit>[A-Za-zμ%/\^0-9\u4e00-\u9fff]{0,12}?)\s*"
+    r"[（(\[]?\s*(?:参考(?:值|范围|区间)?\s*[:：]?\s*)?"
+    r"(?<![\d.])(?P<low>\d+(?:\.\d+)?)(?![\d.])\s*[-~～—]\s*(?P<high>\d+(?:\.\d+)?)(?![\d.])"
+)
+# 报告中已经标注的异常
+_FLAG_MARKERS = (
+    ("↑", "high"), ("偏高", "high"), ("升高", "high"), ("增高", "high"),
+    ("↓", "low"), ("偏低", "low"), ("降低", "low"), ("减低", "low"),
+    ("阳性", "abnormal"), ("(+)", "abnormal"), ("（+）", "abnormal"), ("异常", "abnormal"),
+)
+# 单独成行、以冒号结尾或用【】括起来的小标题
+_SECTION_RE = re.compile(r"^\s*(?:【[^】]{1,30}】|[一二三四五六七八九十\d]+[、.．]\s*\S{1,30}|\S{1,20}[:：])\s*$")
+
+MAX_FINDINGS = 200
+
+
+def digest_records(records: List[Dict[str, Any]], max_chars: int = 6000) -> Dict[str, Any]:
+    """
+    汇总一个用户的全部健康记录
+
+    Returns:
+        统计信息（总数、时间范围、各类型和各年份的条数）和按时间倒序的记录摘录 timeline，
+        timeline 总长度不超过 max_chars，供 LLM 生成总结
+    """
+    if not records:
+        return {"total": 0, "first_date": None, "last_date": None, "by_type": {}, "by_year": {}, "timeline": "", "included": 0}
+
+    ordered = sorted(records, key=lambda r: (r.get("date") or "", r.get("id") or ""), reverse=True)
+    by_type = Counter(r.get("type") or "其他" for r in ordered)
+    by_year = Counter((r.get("date") or "")[:4] or "未知" for r in ordered)
+
+    lines: List[str] = []
+    size = 0
+    for record in ordered:
+        doctor = f"（{record['doctor']}）" if record.get("doctor") else ""
+        line = f"{record.get('date')} {record.get('type')}{doctor}：{record.get('summary')}"
+        if size + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        size += len(line) + 1
+
+    return {
+        "total": len(ordered),
+        "first_date": ordered[-1].get("date"),
+        "last_date": ordered[0].get("date"),
+        "by_type": dict(by_type.most_common()),
+        "by_year": dict(sorted(by_year.items())),
+        "timeline": "\n".join(lines),
+        "included": len(lines),
+    }
+
+
+def _flag_value(value: float, low: float, high: float) -> Optional[str]:
+    if value > high:
+        return "high"
+    if value < low:
+        return "low"
+    return None
+
+
+def analyze_report(text: str, symptom_limit: int = 5) -> Dict[str, Any]:
+    """
+    逐行解析检查报告，找出异常项
+
+    - 带参考范围的数值超出范围时标记为 high / low
+    - 报告中已标注 ↑ ↓ 偏高 偏低 阳性 异常 等的行标记为对应的异常
+    - 全文按症状规则匹配，列出提到的症状和相关的常见原因
+    """
+    from app.services.symptom_rules import get_symptom_rule_engine
+
+    findings: List[Dict[str, Any]] = []
+    sections = 0
+    lines = text.splitlines()
+    for number, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line:
+            continue
+        if _SECTION_RE.match(line):
+            sections += 1
+            continue
+
+        found_in_line = False
+        for match in _VALUE_WITH_RANGE_RE.finditer(line):
+            value, low, high = float(match["value"]), float(match["low"]), float(match["high"])
+            if low > high:
+                continue
+            flag = _flag_value(value, low, high)
+            if flag:
+                found_in_line = True
+                findings.append({
+                    "line": number,
+                    "item": match["item"].strip(),
+                    "value": value,
+                    "unit": match["unit"] or None,
+                    "range": [low, high],
+                    "flag": flag,
+                    "text": line[:200],
+                })
+        if not found_in_line:
+            for marker, flag in _FLAG_MARKERS:
+                if marker in line:
+                    findings.append({"line": number, "item": None, "value": None, "unit": None, "range": None,
+                                     "flag": flag, "text": line[:200]})
+                    break
+        if len(findings) >= MAX_FINDINGS:
+            break
+
+    symptoms, rules = get_symptom_rule_engine().match(text, limit=symptom_limit)
+    return {
+        "lines": len(lines),
+        "sections": sections,
+        "findings": findings[:MAX_FINDINGS],
+        "abnormal_count": len(findings),
+        "symptoms": symptoms,
+        "related_conditions": [
+            {"rule": rule.id, "symptoms": list(rule.symptoms), "conditions": list(rule.conditions)} for rule in rules
+        ],
+    }
@@ -0,0 +1,117 @@
+"""常见问题回复缓存"""
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+
+# 句末可以去掉的标点（NFKC 归一化后的半角形式）
+TRAILING_PUNCTUATION = ".?!~,;、。…"
+
+
+def normalize_question(text: str) -> str:
+    """
+    归一化问题文本：全角转半角、统一小写、去掉空白和句末标点
+
+    例如 "头痛怎么办？" 与 "头痛 怎么办" 归一化后相同。句中的标点全部保留，
+    "1.5片" 与 "15片"、"140/90" 与 "14090" 不会被当成同一个问题；两个数字之间的空白保留为一个空格。
+    """
+    parts = unicodedata.normalize("NFKC", text).lower().split()
+    normalized = ""
+    for part in parts:
+        if normalized and normalized[-1].isdigit() and part[0].isdigit():
+            normalized += " "
+        normalized += part
+    return normalized.rstrip(TRAILING_PUNCTUATION)
+
+
+class ResponseCache:
+    """
+    LLM 回复缓存
+
+    键由归一化后的问题和历史对话指纹组成，同样的问题在同样的上下文中才会命中。
+    按条目数（LRU）和 TTL 淘汰。紧急情况消息在进入缓存之前就已被拦截，
+    调用方只应缓存 LLM 正常生成的回复。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+        self._expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(message: str, history: Sequence[BaseMessage]) -> str:
+        """由归一化问题和历史对话指纹生成缓存键"""
+        digest = hashlib.sha1()
+        for past in history:
+            digest.update(past.type.encode("utf-8"))
+            digest.update(b"\x1e")
+            digest.update(normalize_question(str(past.content)).encode("utf-8"))
+            digest.update(b"\x1f")
+        digest.update(b"\x1d")
+        digest.update(normalize_question(message).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """命中返回缓存的回复，否则返回 None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, reply = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return reply
+
+    def put(self, key: str, reply: str) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率与淘汰计数"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evicted": self._evicted,
+                "expired": self._expired,
+            }
@@ -0,0 +1,340 @@
+"""对话检索：从用户健康记录和健康知识中找出与问题相关的片段"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.health_store import HealthStore, get_health_store
+from app.services.knowledge_index import KnowledgeBase, get_knowledge_base, strip_query_stopwords
+from app.services.vector_index import HashingEmbedder, VectorIndex
+
+# 文章正文按段落切分，相邻短段落合并到不超过该长度
+CHUNK_CHARS = 150
+
+# 加载用户记录时每页读取的条数
+RECORD_PAGE_SIZE = 500
+
+SnippetKey = Tuple[str, ...]
+
+
+class _UserRecords:
+    """一个用户已加载的健康记录：数据版本、向量索引（没有记录时为 None）和片段内容"""
+
+    __slots__ = ("version", "index", "snippets", "last_access")
+
+    def __init__(self, version: int, index: Optional[VectorIndex], snippets: Dict[SnippetKey, Dict[str, Any]]):
+        self.version = version
+        self.index = index
+        self.snippets = snippets
+        self.last_access = time.monotonic()
+
+
+def _record_text(record: Dict[str, Any]) -> str:
+    parts = [record.get("date") or "", record.get("type") or ""]
+    if record.get("doctor"):
+        parts.append(record["doctor"])
+    parts.append(record.get("summary") or "")
+    details = record.get("details")
+    if isinstance(details, dict):
+        parts.extend(f"{k}：{v}" for k, v in details.items())
+    return " ".join(p for p in parts if p)
+
+
+def _article_chunks(article: Dict[str, Any]) -> List[str]:
+    """文章切片：标题 + 摘要为一片，正文按段落合并切片，每片都带上标题"""
+    title = article.get("title") or ""
+    chunks = [f"{title} {article.get('summary') or ''}".strip()]
+    current = ""
+    for paragraph in re.split(r"\n+", article.get("content") or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > CHUNK_CHARS:
+            chunks.append(f"{title} {current}")
+            current = ""
+        current = f"{current} {paragraph}".strip()
+    if current:
+        chunks.append(f"{title} {current}")
+    return chunks
+
+
+class RetrievalEngine:
+    """
+    检索引擎
+
+    每个用户的健康记录单独一个向量索引，知识文章片段共用一个向量索引，
+    检索时只扫描当前用户的记录和知识片段两个矩阵。
+    同一时刻到达的多个检索请求会合并成一次矩阵乘法查询知识索引。
+
+    用户的记录在检索时从数据库分页加载，并记下 data_versions 中 records 的版本号；
+    之后每次检索先读版本号（一次主键查询），记录被任何进程修改过时重新加载。
+    已加载的用户最多保留 max_users 个（LRU），空闲超过 user_ttl 秒的会被淘汰；
+    没有记录的用户只记下版本号，不分配索引。
+    知识库变化（数据文件重载或接口修改）时只重建有变化的文章的片段。
+    """
+
+    def __init__(
+        self,
+        health_store: Optional[HealthStore] = None,
+        knowledge_base: Optional[KnowledgeBase] = None,
+        dim: Optional[int] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        max_users: Optional[int] = None,
+        user_ttl: Optional[float] = None,
+    ):
+        self._health_store = health_store
+        self._knowledge_base = knowledge_base
+        # 维度越高哈希冲突带来的噪声越小（约 1/sqrt(dim)），检索耗时和内存随维度线性增长
+        self.embedder = HashingEmbedder(dim or int(os.getenv("RETRIEVAL_DIM", 512)))
+        self.top_k = top_k if top_k is not None else int(os.getenv("RETRIEVAL_TOP_K", 4))
+        # 相似度低于该值的片段视为不相关，不放进提示词
+        self.min_score = min_score if min_score is not None else float(os.getenv("RETRIEVAL_MIN_SCORE", 0.2))
+
+        self.max_users = max_users or int(os.getenv("RETRIEVAL_MAX_USERS", 1000))
+        self.user_ttl = user_ttl or float(os.getenv("RETRIEVAL_USER_TTL", 1800))
+
+        self.knowledge_index = VectorIndex(self.embedder.dim)
+        # 按最近访问时间排序，最久未访问的在最前面
+        self._users: "OrderedDict[str, _UserRecords]" = OrderedDict()
+        # 知识片段键 -> 片段内容（来源、标题、正文）
+        self._snippets: Dict[SnippetKey, Dict[str, Any]] = {}
+        # 文章 ID -> (文章对象, 片段键列表)
+        self._articles: Dict[str, Tuple[Dict[str, Any], List[SnippetKey]]] = {}
+        self._knowledge_version = -1
+        self._user_locks: Dict[str, asyncio.Lock] = {}
+        # 同一时间只做一次知识同步
+        self._knowledge_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+
+        # 等待合并查询知识索引的请求：(查询向量, 条数, future)
+        self._pending: List[Tuple[np.ndarray, int, asyncio.Future]] = []
+        self._batches = 0
+        self._batched_queries = 0
+        self._user_reloads = 0
+        self._evicted_users = 0
+
+    @property
+    def health_store(self) -> HealthStore:
+        if self._health_store is None:
+            self._health_store = get_health_store()
+        return self._health_store
+
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        if self._knowledge_base is None:
+            self._knowledge_base = get_knowledge_base()
+        return self._knowledge_base
+
+    # ---------- 健康记录 ----------
+
+    def _build_user(self, version: int, records: List[Dict[str, Any]]) -> _UserRecords:
+        """为一个用户的全部记录建立索引（索引容量按记录数分配）"""
+        if not records:
+            return _UserRecords(version, None, {})
+        texts = [_record_text(r) for r in records]
+        keys = [("record", r["id"]) for r in records]
+        index = VectorIndex(self.embedder.dim, initial_capacity=len(records))
+        index.add(keys, self.embedder.embed_many(texts))
+        snippets = {
+            key: {
+                "source": "record",
+                "id": record["id"],
+                "title": f"{record.get('date', '')} {record.get('type', '')}".strip(),
+                "text": record.get("summary") or text,
+            }
+            for key, record, text in zip(keys, records, texts)
+        }
+        return _UserRecords(version, index, snippets)
+
+    async def ensure_user(self, user_id: str) -> _UserRecords:
+        """返回用户已加载的记录；尚未加载或记录版本已变化时，分页重新加载全部健康记录"""
+        version = await self.health_store.get_version(user_id, "records")
+        entry = self._touch(user_id, version)
+        if entry is not None:
+            return entry
+        lock = self._user_locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            entry = self._touch(user_id, version)
+            if entry is not None:
+                return entry
+            records: List[Dict[str, Any]] = []
+            cursor = None
+            while True:
+                page, cursor = await self.health_store.list_records(user_id, limit=RECORD_PAGE_SIZE, cursor=cursor)
+                records.extend(page)
+                if not cursor:
+                    break
+            # 向量化是纯计算，放到线程中执行，避免长时间占用事件循环；建好后整体替换旧索引
+            entry = await asyncio.to_thread(self._build_user, version, records)
+            with self._lock:
+                self._users[user_id] = entry
+                self._users.move_to_end(user_id)
+                self._user_reloads += 1
+                self._evict_users()
+        self._user_locks.pop(user_id, None)
+        return entry
+
+    def _touch(self, user_id: str, version: int) -> Optional[_UserRecords]:
+        """版本一致时更新访问时间并移到 LRU 队尾，否则返回 None"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry.version != version:
+                return None
+            entry.last_access = time.monotonic()
+            self._users.move_to_end(user_id)
+            self._evict_users()
+            return entry
+
+    def _evict_users(self) -> None:
+        """淘汰空闲超时和超出数量上限的用户（队首即最久未访问）"""
+        deadline = time.monotonic() - self.user_ttl
+        while self._users:
+            entry = next(iter(self._users.values()))
+            if len(self._users) <= self.max_users and entry.last_access >= deadline:
+                break
+            self._users.popitem(last=False)
+            self._evicted_users += 1
+
+    # ---------- 健康知识 ----------
+
+    def _embed_articles(self, articles: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], List[str], np.ndarray]]:
+        """为文章切片并向量化，返回 [(文章, 片段列表, 片段向量), ...]"""
+        embedded = []
+        for article in articles:
+            chunks = _article_chunks(article)
+            embedded.append((article, chunks, self.embedder.embed_many(chunks)))
+        return embedded
+
+    async def sync_knowledge(self) -> None:
+        """知识库有变化时，只重建新增、修改和删除的文章的片段"""
+        kb = self.knowledge_base
+        await kb.refresh()
+        if kb.index.version == self._knowledge_version:
+            return
+        async with self._knowledge_lock:
+            version = kb.index.version
+            if version == self._knowledge_version:
+                return
+            current = {a["id"]: a for a in kb.index.articles()}
+            changed = [
+                article for article_id, article in current.items()
+                if article_id not in self._articles or self._articles[article_id][0] is not article
+            ]
+            # 切片和向量化是纯计算（首次同步要处理整个知识库），放到线程中执行，完成后在锁内替换
+            embedded = await asyncio.to_thread(self._embed_articles, changed)
+            with self._lock:
+                for article_id in list(self._articles):
+                    if article_id not in current:
+                        self._drop_article(article_id)
+                for article, chunks, vectors in embedded:
+                    article_id = article["id"]
+                    self._drop_article(article_id)
+                    keys = [("knowledge", article_id, str(i)) for i in range(len(chunks))]
+                    self.knowledge_index.add(keys, vectors)
+                    for key, chunk in zip(keys, chunks):
+                        self._snippets[key] = {
+                            "source": "knowledge",
+                            "id": article_id,
+                            "title": article.get("title", ""),
+                            "text": chunk,
+                        }
+                    self._articles[article_id] = (article, keys)
+                self._knowledge_version = version
+
+    def _drop_article(self, article_id: str) -> None:
+        known = self._articles.pop(article_id, None)
+        if known is None:
+            return
+        for key in known[1]:
+            self.knowledge_index.remove(key)
+            self._snippets.pop(key, None)
+
+    async def _search_knowledge(self, vector: np.ndarray, k: int) -> List[Tuple[float, SnippetKey]]:
+        """把同一轮事件循环中到达的查询合并成一次矩阵乘法"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((vector, k, future))
+        if len(self._pending) == 1:
+            loop.call_soon(self._flush_knowledge_queries)
+        return await future
+
+    def _flush_knowledge_queries(self) -> None:
+        pending, self._pending = self._pending, []
+        try:
+            queries = np.stack([p[0] for p in pending])
+            results = self.knowledge_index.search_many(queries, max(p[1] for p in pending))
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._batches += 1
+        self._batched_queries += len(pending)
+        for (_, k, future), hits in zip(pending, results):
+            if not future.done():
+                future.set_result(hits[:k])
+
+    # ---------- 检索 ----------
+
+    async def retrieve(self, query: str, user_id: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """在用户记录和知识片段中检索，返回按相似度排序的片段"""
+        k = k or self.top_k
+        user = await self.ensure_user(user_id)
+        await self.sync_knowledge()
+
+        vector = self.embedder.embed(strip_query_stopwords(query))
+        if not vector.any():
+            return []
+        # 多取一些，同一篇文章只保留得分最高的片段
+        hits = await self._search_knowledge(vector, k * 3)
+        if user.index is not None:
+            hits = sorted(hits + user.index.search(vector, k), key=lambda h: h[0], reverse=True)
+
+        results: List[Dict[str, Any]] = []
+        seen = set()
+        for score, key in hits:
+            if score < self.min_score:
+                break
+            snippet = user.snippets.get(key) if key[0] == "record" else self._snippets.get(key)
+            if snippet is None or (snippet["source"], snippet["id"]) in seen:
+                continue
+            seen.add((snippet["source"], snippet["id"]))
+            results.append({**snippet, "score": round(score, 4)})
+            if len(results) >= k:
+                break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users = list(self._users.values())
+        return {
+            "knowledge_chunks": len(self.knowledge_index),
+            "record_chunks": sum(len(user.index) for user in users if user.index is not None),
+            "users_loaded": len(users),
+            "max_users": self.max_users,
+            "user_reloads": self._user_reloads,
+            "evicted_users": self._evicted_users,
+            "dim": self.embedder.dim,
+            "batches": self._batches,
+            "avg_batch_size": round(self._batched_queries / self._batches, 2) if self._batches else 0,
+        }
+
+
+_retrieval_engine: Optional[RetrievalEngine] = None
+_retrieval_engine_lock = threading.Lock()
+
+
+def get_retrieval_engine() -> RetrievalEngine:
+    """获取全局检索引擎（数据在首次检索时加载）"""
+    global _retrieval_engine
+    if _retrieval_engine is None:
+        with _retrieval_engine_lock:
+            if _retrieval_engine is None:
+                _retrieval_engine = RetrievalEngine()
+    return _retrieval_engine
@@ -0,0 +1,493 @@
+"""会话记忆存储"""
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from app.services.database import Database, get_database
+from app.services.token_counter import estimate_message_tokens
+
+
+def _text_size(text: str) -> int:
+    """文本占用的内存字节数（空文本按 0 计）"""
+    return sys.getsizeof(text) if text else 0
+
+
+class SessionSnapshot(NamedTuple):
+    """
+    会话快照：摘要、尚未折叠进摘要的消息、第一条消息的序号，以及摘要版本
+
+    摘要版本在每次折叠、会话重建或清空时变化，fold_summary 据此判断快照是否过时。
+    """
+    summary: str
+    messages: List[BaseMessage]
+    first_seq: int
+    version: int = 0
+
+
+class _Session:
+    """单个会话的消息及其 token / 内存占用"""
+
+    __slots__ = (
+        "messages", "tokens", "sizes", "total_tokens", "total_bytes", "last_access",
+        "summary", "first_seq", "version",
+    )
+
+    def __init__(self, version: int):
+        self.messages: List[BaseMessage] = []
+        # 较早的对话折叠成的摘要
+        self.summary = ""
+        # messages[0] 的序号，消息序号在会话内单调递增
+        self.first_seq = 0
+        # 摘要版本，由存储分配，同一存储内不重复
+        self.version = version
+        self.tokens: List[int] = []
+        self.sizes: List[int] = []
+        self.total_tokens = 0
+        self.total_bytes = 0
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    进程内会话存储
+
+    - 最多保留 max_sessions 个会话，超出时淘汰最久未访问的会话（LRU）
+    - 会话空闲超过 ttl_seconds 后过期
+    - 每个会话的历史按 token 预算裁剪，从最早的一轮对话开始丢弃
+
+    接口与 SQLiteSessionStore 相同（异步方法），操作都在内存中完成，不会让出事件循环。
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_history_tokens: Optional[int] = None,
+    ):
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", 10000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", 7200))
+        self.max_history_tokens = max_history_tokens or int(os.getenv("SESSION_MAX_HISTORY_TOKENS", 3000))
+
+        # 按最近访问时间排序，最久未访问的在最前面
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = itertools.count(1)
+
+        self._total_bytes = 0
+        self._evicted_lru = 0
+        self._evicted_ttl = 0
+        self._trimmed_messages = 0
+        self._folded_summaries = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    async def get_history(self, session_id: str) -> List[BaseMessage]:
+        """获取会话历史（副本），不存在时返回空列表"""
+        with self._lock:
+            self._expire()
+            session = self._touch(session_id)
+            return list(session.messages) if session else []
+
+    async def snapshot(self, session_id: str) -> SessionSnapshot:
+        """获取会话摘要和未折叠的消息（副本）"""
+        with self._lock:
+            self._expire()
+            session = self._touch(session_id)
+            if session is None:
+                return SessionSnapshot("", [], 0)
+            return SessionSnapshot(session.summary, list(session.messages), session.first_seq, session.version)
+
+    async def fold_summary(self, session_id: str, base: SessionSnapshot, summary: str, through_seq: int) -> bool:
+        """
+        用新摘要替换序号不超过 through_seq 的消息
+
+        base 是生成摘要时读取的快照。摘要版本已经变化（其他任务先折叠了摘要，
+        或会话被清空、过期后重建）时不做修改，返回 False。
+        摘要生成期间新追加的消息不受影响；已被裁剪掉的消息会被跳过。
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.version != base.version:
+                return False
+            while session.messages and session.first_seq <= through_seq:
+                self._drop_oldest(session, trimmed=False)
+            delta = _text_size(summary) - _text_size(session.summary)
+            session.summary = summary
+            session.version = next(self._versions)
+            session.total_bytes += delta
+            self._total_bytes += delta
+            self._folded_summaries += 1
+            return True
+
+    async def append(self, session_id: str, *messages: BaseMessage) -> None:
+        """向会话追加消息，并按 token 预算裁剪"""
+        with self._lock:
+            self._expire()
+            session = self._touch(session_id)
+            if session is None:
+                session = _Session(next(self._versions))
+                self._sessions[session_id] = session
+                self._evict_lru()
+
+            for message in messages:
+                tokens = estimate_message_tokens(message)
+                size = _text_size(message.content)
+                session.messages.append(message)
+                session.tokens.append(tokens)
+                session.sizes.append(size)
+                session.total_tokens += tokens
+                session.total_bytes += size
+                self._total_bytes += size
+
+            self._trim(session)
+
+    async def clear(self, session_id: str) -> None:
+        """删除会话"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session:
+                self._total_bytes -= session.total_bytes
+
+    async def stats(self) -> Dict[str, Any]:
+        """会话数量、内存占用估算和淘汰计数"""
+        with self._lock:
+            self._expire()
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "messages": sum(len(s.messages) for s in self._sessions.values()),
+                "approx_bytes": self._total_bytes,
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "max_history_tokens": self.max_history_tokens,
+                "evicted_lru": self._evicted_lru,
+                "evicted_ttl": self._evicted_ttl,
+                "trimmed_messages": self._trimmed_messages,
+                "folded_summaries": self._folded_summaries,
+            }
+
+    def _touch(self, session_id: str) -> Optional[_Session]:
+        """更新访问时间并移到 LRU 队尾"""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _expire(self) -> None:
+        """淘汰空闲超时的会话（队首即最久未访问）"""
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access >= deadline:
+                break
+            self._sessions.popitem(last=False)
+            self._total_bytes -= session.total_bytes
+            self._evicted_ttl += 1
+
+    def _evict_lru(self) -> None:
+        """会话数超出上限时淘汰最久未访问的会话"""
+        while len(self._sessions) > self.max_sessions:
+            _, session = self._sessions.popitem(last=False)
+            self._total_bytes -= session.total_bytes
+            self._evicted_lru += 1
+
+    def _trim(self, session: _Session) -> None:
+        """从最早的消息开始丢弃，直到历史不超过 token 预算（至少保留最近一轮）"""
+        while session.total_tokens > self.max_history_tokens and len(session.messages) > 2:
+            self._drop_oldest(session)
+        # 历史不以助手回复开头，保证轮次完整
+        while session.messages and isinstance(session.messages[0], AIMessage) and len(session.messages) > 1:
+            self._drop_oldest(session)
+
+    def _drop_oldest(self, session: _Session, trimmed: bool = True) -> None:
+        session.messages.pop(0)
+        session.first_seq += 1
+        session.total_tokens -= session.tokens.pop(0)
+        size = session.sizes.pop(0)
+        session.total_bytes -= size
+        self._total_bytes -= size
+        if trimmed:
+            self._trimmed_messages += 1
+
+
+SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    summary_version INTEGER NOT NULL DEFAULT 0,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_access ON chat_sessions (last_access);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage}
+
+
+class SQLiteSessionStore:
+    """
+    多进程共享的会话存储（SQLite WAL）
+
+    接口与 SessionStore 相同，多个 worker 进程读写同一个数据库文件，
+    同一会话的下一轮对话无论落到哪个进程都能拿到完整的历史和摘要。
+    消息按会话内序号保存，裁剪和摘要折叠只删除序号范围内的行；
+    读写都通过 db.run / db.run_in_transaction 在数据库线程池中执行，不阻塞事件循环。
+
+    摘要折叠按 summary_version 做比较更新：会话重建、清空或其他进程先折叠过摘要时，
+    版本已经变化，过时的摘要直接丢弃。清空的会话保留一行（版本加一、标记为过期），
+    由定期清理删除。
+
+    过期和超出数量上限的会话由各进程每隔 CLEANUP_INTERVAL 秒清理一次；
+    访问时间每隔 TOUCH_INTERVAL 秒才写回一次，只读的请求不产生写事务。
+    """
+
+    CLEANUP_INTERVAL = 60.0
+    TOUCH_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        db: Optional[Database] = None,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_history_tokens: Optional[int] = None,
+    ):
+        self.db = db or get_database()
+        self.db.executescript(SESSION_SCHEMA)
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", 10000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", 7200))
+        self.max_history_tokens = max_history_tokens or int(os.getenv("SESSION_MAX_HISTORY_TOKENS", 3000))
+
+        self._last_cleanup = 0.0
+        # 以下计数只统计本进程
+        self._evicted_lru = 0
+        self._evicted_ttl = 0
+        self._trimmed_messages = 0
+        self._folded_summaries = 0
+
+    def _load_session(self, conn: sqlite3.Connection, session_id: str) -> Optional[sqlite3.Row]:
+        """读取会话行，已过期的视为不存在"""
+        row = conn.execute(
+            "SELECT summary, summary_version, next_seq, total_tokens, last_access "
+            "FROM chat_sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None or row["last_access"] < time.time() - self.ttl_seconds:
+            return None
+        return row
+
+    def _touch(self, conn: sqlite3.Connection, session_id: str, row: sqlite3.Row) -> None:
+        now = time.time()
+        if now - row["last_access"] >= self.TOUCH_INTERVAL:
+            conn.execute("UPDATE chat_sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+
+    def _read(self, conn: sqlite3.Connection, session_id: str) -> SessionSnapshot:
+        row = self._load_session(conn, session_id)
+        if row is None:
+            return SessionSnapshot("", [], 0)
+        rows = conn.execute(
+            "SELECT seq, role, content FROM chat_messages WHERE session_id = ? ORDER BY seq",
+            (session_id,),
+        ).fetchall()
+        self._touch(conn, session_id, row)
+        messages = [_MESSAGE_TYPES.get(r["role"], HumanMessage)(content=r["content"]) for r in rows]
+        first_seq = rows[0]["seq"] if rows else row["next_seq"]
+        return SessionSnapshot(row["summary"], messages, first_seq, row["summary_version"])
+
+    async def get_history(self, session_id: str) -> List[BaseMessage]:
+        """获取会话历史，不存在时返回空列表"""
+        return (await self.db.run(self._read, session_id)).messages
+
+    async def snapshot(self, session_id: str) -> SessionSnapshot:
+        """获取会话摘要和未折叠的消息"""
+        return await self.db.run(self._read, session_id)
+
+    async def fold_summary(self, session_id: str, base: SessionSnapshot, summary: str, through_seq: int) -> bool:
+        """用新摘要替换序号不超过 through_seq 的消息；base 之后摘要版本已变化时不做修改，返回 False"""
+        folded = await self.db.run_in_transaction(self._fold, session_id, base.version, summary, through_seq)
+        if folded:
+            self._folded_summaries += 1
+        return folded
+
+    @staticmethod
+    def _fold(conn: sqlite3.Connection, session_id: str, version: int, summary: str, through_seq: int) -> bool:
+        updated = conn.execute(
+            "UPDATE chat_sessions SET summary = ?, summary_version = summary_version + 1 "
+            "WHERE session_id = ? AND summary_version = ?",
+            (summary, session_id, version),
+        ).rowcount
+        if not updated:
+            return False
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ? AND seq <= ?", (session_id, through_seq))
+        conn.execute(
+            "UPDATE chat_sessions SET total_tokens = "
+            "(SELECT COALESCE(SUM(tokens), 0) FROM chat_messages WHERE session_id = ?) WHERE session_id = ?",
+            (session_id, session_id),
+        )
+        return True
+
+    async def append(self, session_id: str, *messages: BaseMessage) -> None:
+        """向会话追加消息，并按 token 预算裁剪"""
+        self._trimmed_messages += await self.db.run_in_transaction(self._append, session_id, messages)
+        await self._maybe_cleanup()
+
+    def _append(self, conn: sqlite3.Connection, session_id: str, messages: Sequence[BaseMessage]) -> int:
+        """写入消息，返回裁剪掉的消息数"""
+        now = time.time()
+        row = self._load_session(conn, session_id)
+        if row is None:
+            # 不存在或已过期：从新会话开始，摘要版本加一，进行中的摘要不会写回
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO chat_sessions (session_id, summary, summary_version, next_seq, total_tokens, last_access) "
+                "VALUES (?, '', 0, 0, 0, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                "summary = '', summary_version = summary_version + 1, next_seq = 0, total_tokens = 0, "
+                "last_access = excluded.last_access",
+                (session_id, now),
+            )
+            next_seq, total_tokens = 0, 0
+        else:
+            next_seq, total_tokens = row["next_seq"], row["total_tokens"]
+
+        rows = []
+        for message in messages:
+            tokens = estimate_message_tokens(message)
+            rows.append((session_id, next_seq, message.type, message.content, tokens))
+            next_seq += 1
+            total_tokens += tokens
+        conn.executemany(
+            "INSERT INTO chat_messages (session_id, seq, role, content, tokens) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        trimmed = 0
+        if total_tokens > self.max_history_tokens:
+            total_tokens, trimmed = self._trim(conn, session_id)
+        conn.execute(
+            "UPDATE chat_sessions SET next_seq = ?, total_tokens = ?, last_access = ? WHERE session_id = ?",
+            (next_seq, total_tokens, now, session_id),
+        )
+        return trimmed
+
+    def _trim(self, conn: sqlite3.Connection, session_id: str) -> Tuple[int, int]:
+        """与 SessionStore 相同的裁剪规则，返回裁剪后的 token 数和裁剪掉的消息数"""
+        rows = conn.execute(
+            "SELECT seq, role, tokens FROM chat_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        total = sum(r["tokens"] for r in rows)
+        start = 0
+        while total > self.max_history_tokens and len(rows) - start > 2:
+            total -= rows[start]["tokens"]
+            start += 1
+        while len(rows) - start > 1 and rows[start]["role"] == "ai":
+            total -= rows[start]["tokens"]
+            start += 1
+        if start:
+            conn.execute(
+                "DELETE FROM chat_messages WHERE session_id = ? AND seq < ?", (session_id, rows[start]["seq"])
+            )
+        return total, start
+
+    async def clear(self, session_id: str) -> None:
+        """删除会话"""
+        await self.db.run_in_transaction(self._clear, session_id)
+
+    @staticmethod
+    def _clear(conn: sqlite3.Connection, session_id: str) -> None:
+        conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+        # 保留会话行并让摘要版本加一，进行中的摘要不会写回；last_access 置 0 视为已过期
+        conn.execute(
+            "UPDATE chat_sessions SET summary = '', summary_version = summary_version + 1, next_seq = 0, "
+            "total_tokens = 0, last_access = 0 WHERE session_id = ?",
+            (session_id,),
+        )
+
+    async def _maybe_cleanup(self) -> None:
+        now = time.monotonic()
+        if now - self._last_cleanup < self.CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        await self.cleanup()
+
+    async def cleanup(self) -> None:
+        """删除过期会话，并按最近访问时间淘汰超出上限的会话"""
+        expired, evicted = await self.db.run_in_transaction(self._cleanup, time.time() - self.ttl_seconds)
+        self._evicted_ttl += expired
+        self._evicted_lru += evicted
+
+    def _cleanup(self, conn: sqlite3.Connection, deadline: float) -> Tuple[int, int]:
+        expired = [r[0] for r in conn.execute(
+            "SELECT session_id FROM chat_sessions WHERE last_access < ?", (deadline,)
+        ).fetchall()]
+        overflow = conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0] - len(expired) - self.max_sessions
+        evicted = []
+        if overflow > 0:
+            evicted = [r[0] for r in conn.execute(
+                "SELECT session_id FROM chat_sessions WHERE last_access >= ? ORDER BY last_access LIMIT ?",
+                (deadline, overflow),
+            ).fetchall()]
+        for session_id in expired + evicted:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+        return len(expired), len(evicted)
+
+    async def stats(self) -> Dict[str, Any]:
+        """会话数量、占用估算和淘汰计数（计数只统计本进程）"""
+        sessions, messages, approx_bytes = await self.db.run(self._count, time.time() - self.ttl_seconds)
+        return {
+            "backend": "sqlite",
+            "sessions": sessions,
+            "messages": messages,
+            "approx_bytes": approx_bytes,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "max_history_tokens": self.max_history_tokens,
+            "evicted_lru": self._evicted_lru,
+            "evicted_ttl": self._evicted_ttl,
+            "trimmed_messages": self._trimmed_messages,
+            "folded_summaries": self._folded_summaries,
+        }
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, deadline: float) -> Tuple[int, int, int]:
+        sessions = conn.execute(
+            "SELECT COUNT(*) FROM chat_sessions WHERE last_access >= ?", (deadline,)
+        ).fetchone()[0]
+        messages, approx_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM chat_messages"
+        ).fetchone()
+        return sessions, messages, approx_bytes
+
+
+def create_session_store() -> Union[SessionStore, SQLiteSessionStore]:
+    """
+    按 SESSION_BACKEND 创建会话存储
+
+    memory（默认）：进程内存储，只适合单进程运行
+    sqlite：保存在 SQLite 数据库中，多个 worker 进程共享
+    """
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend != "memory":
+        raise ValueError(f"不支持的会话存储：{backend}")
+    return SessionStore()
@@ -0,0 +1,181 @@
+"""相同的并发调用合并（single flight）"""
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class FlightCancelledError(Exception):
+    """所有订阅者都已离开，上游流式调用被取消；此时仍读取该调用的订阅者收到此异常，而不是正常结束"""
+
+
+class _Call:
+    """一次进行中的普通调用"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Flight:
+    """一次进行中的流式调用：已产出的片段按顺序缓存，后加入的订阅者从头读取"""
+
+    __slots__ = ("items", "done", "error", "changed", "subscribers", "task")
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        # 唤醒当前所有等待者，之后的等待者重新等待下一次变化
+        self.changed.set()
+        self.changed.clear()
+
+
+class StreamSubscription:
+    """
+    订阅一次流式调用，逐个返回片段
+
+    shared 为 True 表示加入的是其他请求已经发起的调用。用完（或提前放弃）后调用 close()；
+    所有订阅者都离开时上游调用被取消。
+    """
+
+    def __init__(self, flight: _Flight, shared: bool, abandon: Callable[[], None]):
+        self._flight = flight
+        self._abandon = abandon
+        self._index = 0
+        self._closed = False
+        self.shared = shared
+        flight.subscribers += 1
+
+    def __aiter__(self) -> "StreamSubscription":
+        return self
+
+    async def __anext__(self) -> Any:
+        flight = self._flight
+        while True:
+            if self._index < len(flight.items):
+                item = flight.items[self._index]
+                self._index += 1
+                return item
+            if flight.error is not None:
+                self.close()
+                raise flight.error
+            if flight.done:
+                self.close()
+                raise StopAsyncIteration
+            await flight.changed.wait()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        flight = self._flight
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and flight.task is not None and not flight.task.done():
+            self._abandon()
+
+
+class SingleFlight:
+    """
+    按键合并并发的相同调用
+
+    同一个键的调用进行期间，后到的请求不再发起新的调用，而是等待并共享进行中调用的结果；
+    调用结束后立即移除，之后的请求重新发起（结果缓存由 ResponseCache 负责）。
+    上游调用在独立的任务中进行，发起它的请求被取消不影响其他等待者；
+    所有等待者都离开时才取消上游调用。
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("LLM_SINGLE_FLIGHT", "1") != "0"
+        self._calls: Dict[str, _Call] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._started = 0
+        self._shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """执行 fn()，返回 (结果, 是否共享了其他请求的调用)"""
+        if not self.enabled:
+            return await fn(), False
+
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.create_task(fn()))
+            call.task.add_done_callback(lambda task: self._finish_call(key, call))
+            self._started += 1
+        else:
+            self._shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 先移除再取消，取消生效之前到达的请求发起新的调用，而不是加入即将被取消的调用
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _finish_call(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 取出异常，避免没有等待者时出现 "exception was never retrieved"
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> StreamSubscription:
+        """订阅 factory() 产出的流；相同的键已有进行中的流时加入它"""
+        flight = self._flights.get(key) if self.enabled else None
+        if flight is not None:
+            self._shared += 1
+            return StreamSubscription(flight, shared=True, abandon=lambda: self._abandon(key, flight))
+
+        flight = _Flight()
+        if self.enabled:
+            self._flights[key] = flight
+        self._started += 1
+        subscription = StreamSubscription(flight, shared=False, abandon=lambda: self._abandon(key, flight))
+        flight.task = asyncio.create_task(self._produce(key, flight, factory))
+        return subscription
+
+    def _abandon(self, key: str, flight: _Flight) -> None:
+        """最后一个订阅者离开：先移除再取消，取消生效之前到达的请求发起新的调用"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.task.cancel()
+
+    async def _produce(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for item in factory():
+                flight.items.append(item)
+                flight.notify()
+        except asyncio.CancelledError:
+            # 已产出的片段不是完整的结果，仍在读取的订阅者应按失败处理
+            flight.error = FlightCancelledError("上游调用已取消")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self._started + self._shared
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls) + len(self._flights),
+            "upstream_calls": self._started,
+            "shared": self._shared,
+            "shared_rate": round(self._shared / requests, 4) if requests else 0.0,
+        }
@@ -0,0 +1,145 @@
+"""会话滚动摘要"""
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Set, Union
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from app.services.llm_limiter import LLMConcurrencyLimiter, LLMQueueFullError
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_client import is_retryable
+from app.services.session_store import SessionStore, SQLiteSessionStore
+from app.services.token_counter import estimate_messages_tokens
+
+SUMMARY_SYSTEM_PROMPT = """你负责为健康咨询对话维护一份简洁的摘要，供后续对话参考。
+请把已有摘要和新增对话合并成一份新的摘要，要求：
+1. 保留用户提到的症状、持续时间、严重程度、既往病史、用药和过敏情况
+2. 保留助手给出的关键建议和就医提醒
+3. 删除寒暄和重复内容，不超过 300 字
+4. 只输出摘要正文，不使用任何特殊符号或 Markdown 格式"""
+
+# 摘要注入提示词时使用的前缀
+SUMMARY_CONTEXT_PREFIX = "以下是与用户之前对话的摘要，回答时可以参考：\n"
+
+
+class ConversationSummarizer:
+    """
+    把会话中较早的对话折叠成摘要
+
+    未折叠历史的 token 数超过 trigger_tokens 时，在后台任务中调用 LLM 生成摘要，
+    只保留最近 keep_recent 条原始消息，请求路径上不等待摘要完成。
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        sessions: Union[SessionStore, SQLiteSessionStore],
+        limiter: Optional[LLMConcurrencyLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        keep_recent: Optional[int] = None,
+        trigger_tokens: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.sessions = sessions
+        self.limiter = limiter
+        self.breaker = breaker
+        self.keep_recent = keep_recent or int(os.getenv("SUMMARY_KEEP_RECENT_MESSAGES", 4))
+        self.trigger_tokens = trigger_tokens or int(os.getenv("SUMMARY_TRIGGER_TOKENS", 1200))
+
+        # 正在生成摘要的会话，避免同一会话重复调度
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._completed = 0
+        self._failed = 0
+        self._stale = 0
+
+    def context_messages(self, summary: str) -> List[BaseMessage]:
+        """把摘要包装成注入提示词的消息"""
+        if not summary:
+            return []
+        return [SystemMessage(content=SUMMARY_CONTEXT_PREFIX + summary)]
+
+    async def maybe_schedule(self, session_id: str) -> None:
+        """未折叠历史超过阈值时，在后台生成摘要"""
+        if session_id in self._pending:
+            return
+        snapshot = await self.sessions.snapshot(session_id)
+        if session_id in self._pending:
+            return
+        if len(snapshot.messages) <= self.keep_recent:
+            return
+        if estimate_messages_tokens(snapshot.messages) < self.trigger_tokens:
+            return
+
+        self._pending.add(session_id)
+        task = asyncio.create_task(self._summarize(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session_id: str) -> None:
+        try:
+            snapshot = await self.sessions.snapshot(session_id)
+            older = snapshot.messages[:-self.keep_recent]
+            # 折叠到完整的一轮对话为止（以助手回复结尾）
+            while older and not isinstance(older[-1], AIMessage):
+                older.pop()
+            if not older:
+                return
+
+            summary = await self._generate(snapshot.summary, older)
+            if not summary:
+                return
+            # 生成期间摘要已被其他进程折叠或会话已重建时，丢弃这份过时的摘要
+            if await self.sessions.fold_summary(session_id, snapshot, summary, snapshot.first_seq + len(older) - 1):
+                self._completed += 1
+            else:
+                self._stale += 1
+        except (LLMQueueFullError, CircuitOpenError):
+            # LLM 繁忙或熔断中时跳过，下一轮对话再尝试
+            pass
+        except Exception as e:
+            self._failed += 1
+            print(f"会话摘要生成失败: {e}")
+        finally:
+            self._pending.discard(session_id)
+
+    async def _generate(self, summary: str, older: List[BaseMessage]) -> str:
+        """调用 LLM 合并已有摘要和新增对话"""
+        lines = []
+        for message in older:
+            role = "用户" if isinstance(message, HumanMessage) else "助手"
+            lines.append(f"{role}：{message.content}")
+        prompt = f"已有摘要：\n{summary or '无'}\n\n新增对话：\n" + "\n".join(lines)
+
+        messages = [SystemMessage(content=SUMMARY_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+        # 摘要不重试，熔断中直接跳过；摘要调用的失败也计入熔断
+        if self.breaker is not None:
+            self.breaker.before_call()
+            try:
+                response = await self._call(messages)
+            except Exception as e:
+                if is_retryable(e):
+                    self.breaker.record_failure(e)
+                else:
+                    self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+        else:
+            response = await self._call(messages)
+        return response.content.strip()
+
+    async def _call(self, messages: List[BaseMessage]) -> Any:
+        if self.limiter is not None:
+            async with self.limiter.slot():
+                return await self.llm.ainvoke(messages)
+        return await self.llm.ainvoke(messages)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keep_recent": self.keep_recent,
+            "trigger_tokens": self.trigger_tokens,
+            "pending": len(self._pending),
+            "completed": self._completed,
+            "failed": self._failed,
+            "stale": self._stale,
+        }
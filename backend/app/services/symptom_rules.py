@@ -0,0 +1,178 @@
+"""症状规则引擎（数据文件驱动，关键词索引单次扫描匹配）"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.keyword_matcher import KeywordMatcher, resolve_data_path
+
+
+class SymptomRule(NamedTuple):
+    """一条规则：同时出现 symptoms 中的全部症状时命中"""
+    id: str
+    symptoms: Tuple[str, ...]
+    conditions: Tuple[str, ...]
+    advice: str
+    priority: int
+
+
+class _RuleSet:
+    """编译后的规则集（只读），重载时整体替换"""
+
+    __slots__ = ("rules", "matcher", "postings", "keywords")
+
+    def __init__(self, rules: List[SymptomRule], synonyms: Dict[str, List[str]]):
+        self.rules = rules
+        self.matcher = KeywordMatcher()
+        # 标准症状 -> 需要它的规则下标
+        self.postings: Dict[str, List[int]] = {}
+        for index, rule in enumerate(rules):
+            for symptom in rule.symptoms:
+                self.postings.setdefault(symptom, []).append(index)
+
+        # 只编译规则中用到的症状；同义词命中时返回标准症状
+        for symptom in self.postings:
+            for keyword in [symptom, *synonyms.get(symptom, [])]:
+                self.matcher.add(keyword, symptom)
+        self.matcher.build()
+        self.keywords = len(self.matcher)
+
+
+def parse_rules(data: Dict[str, Any]) -> Tuple[List[SymptomRule], Dict[str, List[str]]]:
+    """
+    解析规则文件内容
+
+    格式：{"symptoms": {标准症状: [同义词, ...]}, "rules": [{"id", "symptoms", "conditions", "advice", "priority"}]}
+
+    Raises:
+        ValueError: 规则缺少必填字段或 ID 重复
+    """
+    synonyms = {
+        term: [s for s in (words or []) if s and s.strip()]
+        for term, words in (data.get("symptoms") or {}).items()
+    }
+    rules: List[SymptomRule] = []
+    seen = set()
+    for raw in data.get("rules") or []:
+        rule_id = raw.get("id")
+        symptoms = tuple(dict.fromkeys(s.strip() for s in raw.get("symptoms") or [] if s and s.strip()))
+        if not rule_id or not symptoms:
+            raise ValueError(f"症状规则缺少 id 或 symptoms：{raw}")
+        if rule_id in seen:
+            raise ValueError(f"症状规则 ID 重复：{rule_id}")
+        seen.add(rule_id)
+        rules.append(SymptomRule(
+            id=rule_id,
+            symptoms=symptoms,
+            conditions=tuple(raw.get("conditions") or ()),
+            advice=raw.get("advice", ""),
+            priority=int(raw.get("priority", 0)),
+        ))
+    return rules, synonyms
+
+
+class SymptomRuleEngine:
+    """
+    症状规则引擎
+
+    规则文件中的标准症状及其同义词编译成一个 Aho-Corasick 自动机，每条消息只扫描一次，
+    再按倒排表统计每条规则命中的症状数，所需症状全部出现的规则即为命中，
+    开销与消息长度和命中的症状数有关，与规则总数基本无关。
+
+    命中的规则按具体程度排序：需要的症状越多越靠前，其次按 priority、文件中的顺序。
+    数据文件修改后（按修改时间判断，最多每 reload_interval 秒检查一次）自动重新编译并整体替换；
+    新文件有误时保留原规则。
+    """
+
+    def __init__(self, path: Optional[str] = None, reload_interval: Optional[float] = None):
+        self.path = path or resolve_data_path("SYMPTOM_RULES_FILE", "symptom_rules.json")
+        self.reload_interval = reload_interval if reload_interval is not None else float(os.getenv("SYMPTOM_RULES_RELOAD_INTERVAL", 5))
+        self._rules = _RuleSet([], {})
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._loaded_at: Optional[float] = None
+        self._reloads = 0
+        self._lock = threading.Lock()
+        try:
+            self.reload()
+        except (OSError, ValueError) as e:
+            print(f"症状规则加载失败: {e}")
+
+    def reload(self) -> Dict[str, int]:
+        """
+        重新读取并编译规则文件，返回规则数和关键词数
+
+        Raises:
+            OSError, ValueError: 文件无法读取或格式有误（此时保留原规则）
+        """
+        if not self.path or not os.path.exists(self.path):
+            return {"rules": len(self._rules.rules), "keywords": self._rules.keywords}
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            # 先记录修改时间，文件有误时不会每次检查都重新解析
+            self._mtime = mtime
+            self._last_check = time.monotonic()
+            with open(self.path, "r", encoding="utf-8") as f:
+                rules, synonyms = parse_rules(json.load(f))
+            # 新规则集编译完成后再替换，匹配中的请求继续使用旧规则集
+            self._rules = _RuleSet(rules, synonyms)
+            self._loaded_at = time.time()
+            self._reloads += 1
+        return {"rules": len(rules), "keywords": self._rules.keywords}
+
+    def reload_if_changed(self) -> None:
+        """数据文件修改时间变化时重新编译"""
+        now = time.monotonic()
+        if not self.path or now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload()
+        except (OSError, ValueError) as e:
+            print(f"症状规则重新加载失败，继续使用原规则: {e}")
+
+    def match(self, text: str, limit: int = 3) -> Tuple[List[str], List[SymptomRule]]:
+        """
+        返回 (消息中出现的标准症状, 命中的规则)
+
+        规则按具体程度从高到低排列，最多 limit 条。
+        """
+        self.reload_if_changed()
+        ruleset = self._rules
+        found = ruleset.matcher.find_all(text)
+        hits: Dict[int, int] = {}
+        for symptom in found:
+            for index in ruleset.postings.get(symptom, ()):
+                hits[index] = hits.get(index, 0) + 1
+
+        rules = ruleset.rules
+        matched = [index for index, count in hits.items() if count == len(rules[index].symptoms)]
+        matched.sort(key=lambda index: (-len(rules[index].symptoms), -rules[index].priority, index))
+        return found, [rules[index] for index in matched[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        ruleset = self._rules
+        return {
+            "path": self.path,
+            "rules": len(ruleset.rules),
+            "symptoms": len(ruleset.postings),
+            "keywords": ruleset.keywords,
+            "reloads": self._reloads,
+            "loaded_at": self._loaded_at,
+        }
+
+
+_engine: Optional[SymptomRuleEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_symptom_rule_engine() -> SymptomRuleEngine:
+    """获取全局症状规则引擎（首次调用时加载规则文件）"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = SymptomRuleEngine()
+    return _engine
@@ -0,0 +1,31 @@
+"""Token 数估算（无需下载分词表，误差在可接受范围内）"""
+import re
+from typing import Iterable
+
+from langchain_core.messages import BaseMessage
+
+# 中日韩字符大致一个字一个 token，其余文本按约 4 个字符一个 token 估算
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """估算一段文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def estimate_message_tokens(message: BaseMessage) -> int:
+    """估算单条消息的 token 数（含固定开销）"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def estimate_messages_tokens(messages: Iterable[BaseMessage]) -> int:
+    """估算消息列表的 token 总数"""
+    return sum(estimate_message_tokens(m) for m in messages)
@@ -0,0 +1,180 @@
+"""离线向量检索（哈希向量化 + NumPy 连续矩阵）"""
+import math
+import threading
+import zlib
+from functools import lru_cache
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.services.knowledge_index import tokenize
+
+
+@lru_cache(maxsize=200_000)
+def _token_slot(token: str, dim: int) -> Tuple[int, float]:
+    """词项 -> (维度下标, 符号)，使用稳定哈希，不同进程结果一致"""
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+class HashingEmbedder:
+    """
+    哈希向量化
+
+    文本按知识检索同样的方式分词（中文字符二元组、英文单词），
+    每个词项哈希到固定维度并带随机符号，词频取对数后 L2 归一化。
+    不需要模型文件或网络，同一文本在任何进程中得到相同向量。
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        counts: Dict[str, int] = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        if not counts:
+            return np.zeros(self.dim, dtype=np.float32)
+        slots = np.empty(len(counts), dtype=np.int64)
+        weights = np.empty(len(counts), dtype=np.float64)
+        for i, (token, count) in enumerate(counts.items()):
+            slot, sign = _token_slot(token, self.dim)
+            slots[i] = slot
+            weights[i] = sign * (1.0 + math.log(count))
+        vector = np.bincount(slots, weights=weights, minlength=self.dim).astype(np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.embed(text)
+        return matrix
+
+
+# 取 top-k 时按块求最大值做预筛选的块大小
+TOP_K_BLOCK = 256
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    一列得分中最大的 k 个的行号（按得分降序）
+
+    先求每块的最大值，第 k 大的块最大值一定不超过整体第 k 大的得分，
+    只有不低于它的行才可能进入 top-k，再在这些候选中精确排序；
+    比直接在整列上 argpartition 快一个数量级。
+    """
+    n = len(scores)
+    if n <= TOP_K_BLOCK * 4 or k * 4 > n // TOP_K_BLOCK:
+        rows = np.argpartition(scores, n - k)[n - k:]
+    else:
+        full = n - n % TOP_K_BLOCK
+        block_max = scores[:full].reshape(-1, TOP_K_BLOCK).max(axis=1)
+        if full < n:
+            block_max = np.append(block_max, scores[full:].max())
+        threshold = np.partition(block_max, len(block_max) - k)[len(block_max) - k]
+        candidates = np.flatnonzero(scores >= threshold)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(scores[candidates], len(candidates) - k)[len(candidates) - k:]]
+        rows = candidates
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+class VectorIndex:
+    """
+    向量索引
+
+    所有向量按行存放在一个连续的 float32 矩阵中，容量不足时按倍数扩容。
+    检索用矩阵乘法一次算出全部余弦相似度，再按块预筛选取 top-k；
+    多个查询可以拼成一个矩阵一起检索，只扫描一遍索引矩阵。
+    删除只标记行失效并回收到空闲列表，新增时优先复用。
+    """
+
+    def __init__(self, dim: int, initial_capacity: int = 256):
+        self.dim = dim
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._alive = np.zeros(initial_capacity, dtype=bool)
+        self._size = 0  # 已使用过的行数（含已删除的行）
+        self._free: List[int] = []
+        self._row_of: Dict[Hashable, int] = {}
+        self._key_of: Dict[int, Hashable] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._row_of
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        used = len(self._matrix)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:used] = self._matrix
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:used] = self._alive
+        self._matrix, self._alive = matrix, alive
+
+    def add(self, keys: Sequence[Hashable], vectors: np.ndarray) -> None:
+        """批量新增（已存在的键会被覆盖）"""
+        with self._lock:
+            for key in keys:
+                self.remove(key)
+            rows = []
+            for _ in keys:
+                if self._free:
+                    rows.append(self._free.pop())
+                else:
+                    rows.append(self._size)
+                    self._size += 1
+            self._grow(self._size)
+            rows_arr = np.asarray(rows, dtype=np.int64)
+            self._matrix[rows_arr] = vectors
+            self._alive[rows_arr] = True
+            for key, row in zip(keys, rows):
+                self._row_of[key] = row
+                self._key_of[row] = key
+
+    def remove(self, key: Hashable) -> bool:
+        with self._lock:
+            row = self._row_of.pop(key, None)
+            if row is None:
+                return False
+            del self._key_of[row]
+            self._alive[row] = False
+            self._free.append(row)
+            return True
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Tuple[float, Hashable]]:
+        """返回相似度最高的 k 条 [(相似度, 键), ...]"""
+        return self.search_many(query[np.newaxis, :], k)[0]
+
+    def search_many(self, queries: np.ndarray, k: int = 5) -> List[List[Tuple[float, Hashable]]]:
+        """批量检索，queries 形状为 (查询数, dim)，每个查询返回 top-k"""
+        with self._lock:
+            n = self._size
+            if not self._row_of:
+                return [[] for _ in range(len(queries))]
+            # (q, dim) @ (dim, n) -> (q, n)，索引矩阵只读一遍，每个查询的得分连续存放
+            scores = np.ascontiguousarray(queries, dtype=np.float32) @ self._matrix[:n].T
+            if self._free:
+                scores[:, ~self._alive[:n]] = -np.inf
+
+            k = min(k, n)
+            results = []
+            for row_scores in scores:
+                results.append([
+                    (float(row_scores[row]), self._key_of[int(row)])
+                    for row in top_k_rows(row_scores, k)
+                    if np.isfinite(row_scores[row])
+                ])
+            return results
+
+    def stats(self) -> Dict[str, int]:
+        return {"rows": len(self._row_of), "capacity": len(self._matrix), "free": len(self._free)}
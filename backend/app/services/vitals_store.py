@@ -0,0 +1,276 @@
+"""生命体征时间序列存储（批量写入 + 预聚合查询）"""
+import bisect
+import math
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.services.database import Database, get_database
+
+# 聚合粒度 -> 桶长度（秒）
+RESOLUTIONS: Dict[str, int] = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+# 单个原始数据块最多保存的点数
+CHUNK_POINTS = 4096
+
+METRIC_RE = re.compile(r"^[a-z][a-z0-9_]{0,31}$")
+
+# 时间戳的有效范围（Unix 秒，到 9999-12-31），超出的时间桶无法存为 SQLite 整数
+MAX_TIMESTAMP = 253402300799
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vitals_chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    count INTEGER NOT NULL,
+    ts BLOB NOT NULL,
+    vals BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_vitals_chunks_user_metric ON vitals_chunks (user_id, metric, start_ts);
+
+CREATE TABLE IF NOT EXISTS vitals_rollups (
+    user_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (user_id, metric, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO vitals_rollups (user_id, metric, resolution, bucket, count, sum, min, max)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, metric, resolution, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    min = min(min, excluded.min),
+    max = max(max, excluded.max)
+"""
+
+
+def _aggregate(
+    buckets: Dict[int, List[float]], bucket: int, count: int, total: float, low: float, high: float
+) -> None:
+    agg = buckets.get(bucket)
+    if agg is None:
+        buckets[bucket] = [count, total, low, high]
+    else:
+        agg[0] += count
+        agg[1] += total
+        if low < agg[2]:
+            agg[2] = low
+        if high > agg[3]:
+            agg[3] = high
+
+
+class VitalsStore:
+    """
+    生命体征时间序列
+
+    原始读数按 (用户, 指标) 打包成 float64 数组块存储，每块最多 CHUNK_POINTS 个点；
+    写入时同步维护分钟、小时、天三级聚合（计数、总和、最小、最大），
+    查询只读聚合表，不扫描原始数据。
+    """
+
+    def __init__(self, db: Optional[Database] = None, utc_offset_hours: Optional[float] = None):
+        self.db = db or get_database()
+        self.db.executescript(SCHEMA)
+        # 按本地时区切分小时和天的边界（默认东八区）
+        offset = utc_offset_hours if utc_offset_hours is not None else float(os.getenv("VITALS_UTC_OFFSET_HOURS", 8))
+        self.utc_offset = int(offset * 3600)
+
+    def bucket_start(self, ts: float, resolution: str) -> int:
+        """时间戳所在聚合桶的起始时间（Unix 秒）"""
+        size = RESOLUTIONS[resolution]
+        return int(math.floor((ts + self.utc_offset) / size) * size - self.utc_offset)
+
+    async def ingest(self, user_id: str, series: Sequence[Tuple[str, Sequence[float], Sequence[float]]]) -> int:
+        """
+        批量写入读数
+
+        Args:
+            user_id: 用户 ID
+            series: [(指标名, 时间戳列表（Unix 秒）, 数值列表), ...]
+
+        Returns:
+            写入的读数个数
+        """
+        prepared = []
+        for metric, timestamps, values in series:
+            if not METRIC_RE.match(metric):
+                raise ValueError(f"无效的指标名：{metric}")
+            if len(timestamps) != len(values):
+                raise ValueError(f"指标 {metric} 的时间戳与数值个数不一致")
+            if not timestamps:
+                continue
+            if not all(map(math.isfinite, values)) or not all(0 <= t <= MAX_TIMESTAMP for t in timestamps):
+                raise ValueError(f"指标 {metric} 包含无效数值")
+            points = sorted(zip(timestamps, values))
+            prepared.append((metric, array("d", (p[0] for p in points)), array("d", (p[1] for p in points))))
+
+        def write(conn: sqlite3.Connection) -> int:
+            total = 0
+            for metric, ts, vals in prepared:
+                self._write_chunks(conn, user_id, metric, ts, vals)
+                conn.executemany(UPSERT_ROLLUP, self._rollup_rows(user_id, metric, ts, vals))
+                total += len(ts)
+            return total
+
+        return await self.db.run_in_transaction(write)
+
+    def _write_chunks(self, conn: sqlite3.Connection, user_id: str, metric: str, ts: array, vals: array) -> None:
+        rows = []
+        for start in range(0, len(ts), CHUNK_POINTS):
+            chunk_ts = ts[start:start + CHUNK_POINTS]
+            chunk_vals = vals[start:start + CHUNK_POINTS]
+            rows.append((
+                user_id, metric, chunk_ts[0], chunk_ts[-1], len(chunk_ts),
+                chunk_ts.tobytes(), chunk_vals.tobytes(),
+            ))
+        conn.executemany(
+            "INSERT INTO vitals_chunks (user_id, metric, start_ts, end_ts, count, ts, vals) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def _rollup_rows(self, user_id: str, metric: str, ts: array, vals: array) -> List[Tuple[Any, ...]]:
+        """先在内存中按分钟聚合，再由分钟汇总到小时、由小时汇总到天"""
+        minutes: Dict[int, List[float]] = {}
+        for t, v in zip(ts, vals):
+            _aggregate(minutes, self.bucket_start(t, "minute"), 1, v, v, v)
+
+        hours: Dict[int, List[float]] = {}
+        for bucket, (count, total, low, high) in minutes.items():
+            _aggregate(hours, self.bucket_start(bucket, "hour"), count, total, low, high)
+
+        days: Dict[int, List[float]] = {}
+        for bucket, (count, total, low, high) in hours.items():
+            _aggregate(days, self.bucket_start(bucket, "day"), count, total, low, high)
+
+        rows = []
+        for resolution, buckets in (("minute", minutes), ("hour", hours), ("day", days)):
+            for bucket, (count, total, low, high) in buckets.items():
+                rows.append((user_id, metric, resolution, bucket, count, total, low, high))
+        return rows
+
+    async def query_series(
+        self,
+        user_id: str,
+        metric: str,
+        resolution: str,
+        start: float,
+        end: float,
+        limit: int = 1000,
+    ) -> Dict[str, Any]:
+        """
+        查询预聚合序列
+
+        范围内的时间桶超过 limit 个时返回最新的 limit 个，truncated 为 True（更早的时间桶可以用
+        end = t[0] - 1 再查一次）。
+
+        Returns:
+            列式结果：{"t": [...], "min": [...], "max": [...], "mean": [...], "count": [...], "truncated": bool}
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"无效的聚合粒度：{resolution}")
+        if not (0 <= start <= MAX_TIMESTAMP and 0 <= end <= MAX_TIMESTAMP):
+            raise ValueError(f"时间范围必须在 0 到 {MAX_TIMESTAMP} 之间")
+
+        def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+            return conn.execute(
+                "SELECT bucket, count, sum, min, max FROM vitals_rollups "
+                "WHERE user_id = ? AND metric = ? AND resolution = ? AND bucket >= ? AND bucket <= ? "
+                "ORDER BY bucket DESC LIMIT ?",
+                (user_id, metric, resolution, self.bucket_start(start, resolution), end, limit + 1),
+            ).fetchall()
+
+        rows = await self.db.run(query)
+        truncated = len(rows) > limit
+        rows = rows[:limit][::-1]
+        return {
+            "metric": metric,
+            "resolution": resolution,
+            "t": [row[0] for row in rows],
+            "min": [row[3] for row in rows],
+            "max": [row[4] for row in rows],
+            "mean": [round(row[2] / row[1], 3) for row in rows],
+            "count": [row[1] for row in rows],
+            "truncated": truncated,
+        }
+
+    async def iter_raw(
+        self,
+        user_id: str,
+        metric: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        page_chunks: int = 16,
+    ) -> AsyncIterator[Tuple[str, array, array]]:
+        """
+        逐块读取原始读数（导出用）
+
+        按 (指标, 块起始时间) 顺序产出 (指标名, 时间戳数组, 数值数组)，每次只从数据库取
+        page_chunks 个数据块，内存占用与数据总量无关。同一指标多次写入的块之间时间可能交错。
+        """
+        last: Optional[Tuple[str, float, int]] = None
+        while True:
+            sql = ["SELECT id, metric, start_ts, ts, vals FROM vitals_chunks WHERE user_id = ?"]
+            params: List[Any] = [user_id]
+            if metric:
+                sql.append("AND metric = ?")
+                params.append(metric)
+            if start is not None:
+                sql.append("AND end_ts >= ?")
+                params.append(start)
+            if end is not None:
+                sql.append("AND start_ts <= ?")
+                params.append(end)
+            if last is not None:
+                sql.append("AND (metric, start_ts, id) > (?, ?, ?)")
+                params.extend(last)
+            sql.append("ORDER BY metric, start_ts, id LIMIT ?")
+            params.append(page_chunks)
+
+            def query(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+                return conn.execute(" ".join(sql), params).fetchall()
+
+            rows = await self.db.run(query)
+            for row in rows:
+                ts, vals = array("d"), array("d")
+                ts.frombytes(row["ts"])
+                vals.frombytes(row["vals"])
+                # 块内时间戳有序，按范围截取
+                lo = bisect.bisect_left(ts, start) if start is not None else 0
+                hi = bisect.bisect_right(ts, end) if end is not None else len(ts)
+                if lo < hi:
+                    yield row["metric"], ts[lo:hi], vals[lo:hi]
+            if len(rows) < page_chunks:
+                return
+            last = (rows[-1]["metric"], rows[-1]["start_ts"], rows[-1]["id"])
+
+
+_vitals_store: Optional[VitalsStore] = None
+_vitals_store_lock = threading.Lock()
+
+
+def get_vitals_store() -> VitalsStore:
+    """获取全局生命体征存储（首次调用时建表）"""
+    global _vitals_store
+    if _vitals_store is None:
+        with _vitals_store_lock:
+            if _vitals_store is None:
+                _vitals_store = VitalsStore()
+    return _vitals_store
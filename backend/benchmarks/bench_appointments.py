@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+预约号源分配基准
+
+在临时数据库中按合成排班（N 位医生，每天 16 个号源）运行：
+- book：并发发起预约（多数请求争抢少量热门号源），统计每秒处理的预约请求数、成功数，
+  并检查数据库中没有被重复预约的号源
+- free_slots：查询全部医生未来若干天的全部空闲号源，cold 为位图需要从数据库读取，warm 为使用内存中的位图；
+  page 为接口默认的一页（最多 500 个号源）
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_appointments
+    python -m benchmarks.bench_appointments --doctors 10 100 1000 --attempts 2000 --json appointments.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from app.services.appointment_booking import AppointmentBooking, SlotUnavailableError
+from app.services.database import Database
+from app.services.health_store import HealthStore
+
+
+def write_schedule(path: str, doctors: int) -> None:
+    """每位医生每天出诊，上午下午各 8 个 30 分钟的号源"""
+    data = {
+        "slot_minutes": 30,
+        "doctors": [
+            {"id": f"d{i}", "name": f"医生{i}", "department": f"科室{i % 10}", "weekdays": [1, 2, 3, 4, 5, 6, 7],
+             "hours": ["08:00-12:00", "14:00-18:00"]}
+            for i in range(doctors)
+        ],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+async def bench_booking(booking: AppointmentBooking, attempts: int, days: int, seed: int = 42) -> Dict[str, Any]:
+    """attempts 个并发预约请求，一半集中在 5 位医生明天上午的号源上"""
+    rng = random.Random(seed)
+    tomorrow = date.today() + timedelta(days=1)
+    doctor_ids = list(booking.doctors)
+    times = [f"{h:02d}:{m:02d}" for h in (8, 9, 10, 11, 14, 15, 16, 17) for m in (0, 30)]
+    requests = []
+    for i in range(attempts):
+        if i % 2:
+            requests.append((rng.choice(doctor_ids[:5]), tomorrow, rng.choice(times[:8])))
+        else:
+            day = tomorrow + timedelta(days=rng.randrange(days))
+            requests.append((rng.choice(doctor_ids), day, rng.choice(times)))
+
+    async def attempt(i: int, doctor_id: str, day: date, time_of_day: str) -> bool:
+        try:
+            await booking.book(f"user{i}", doctor_id, day.isoformat(), time_of_day)
+            return True
+        except SlotUnavailableError:
+            return False
+
+    t = time.perf_counter()
+    results = await asyncio.gather(*(attempt(i, *request) for i, request in enumerate(requests)))
+    elapsed = time.perf_counter() - t
+
+    def check(conn) -> Dict[str, int]:
+        slots = conn.execute("SELECT COUNT(*) FROM appointment_slots").fetchone()[0]
+        duplicates = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT doctor, date, time FROM appointments WHERE status = '已预约' "
+            "GROUP BY doctor, date, time HAVING COUNT(*) > 1)"
+        ).fetchone()[0]
+        return {"slots": slots, "duplicates": duplicates}
+
+    stored = await booking.db.run(check)
+    return {
+        "attempts_per_s": round(attempts / elapsed),
+        "booked": sum(results),
+        "stored_slots": stored["slots"],
+        "double_booked": stored["duplicates"],
+    }
+
+
+async def bench_free_slots(booking: AppointmentBooking, days: int, repeat: int = 20) -> Dict[str, float]:
+    booking._booked.clear()
+    t = time.perf_counter()
+    results = await booking.free_slots(days=days, limit=10 ** 9)
+    cold_ms = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    for _ in range(repeat):
+        await booking.free_slots(days=days, limit=10 ** 9)
+    warm_ms = (time.perf_counter() - t) * 1000 / repeat
+    t = time.perf_counter()
+    for _ in range(repeat):
+        await booking.free_slots(days=days, limit=500)
+    page_ms = (time.perf_counter() - t) * 1000 / repeat
+    return {
+        "free_cold_ms": round(cold_ms, 2),
+        "free_warm_ms": round(warm_ms, 2),
+        "free_page_ms": round(page_ms, 2),
+        "free_slots": sum(len(item["times"]) for item in results),
+    }
+
+
+async def run_one(tmpdir: str, doctors: int, attempts: int, days: int) -> Dict[str, Any]:
+    schedule = os.path.join(tmpdir, f"doctors_{doctors}.json")
+    write_schedule(schedule, doctors)
+    db = Database(os.path.join(tmpdir, f"appointments_{doctors}.db"))
+    booking = AppointmentBooking(HealthStore(db), path=schedule, booking_days=days + 1)
+    row: Dict[str, Any] = {"doctors": doctors, "days": days, "attempts": attempts}
+    row.update(await bench_booking(booking, attempts, days))
+    row.update(await bench_free_slots(booking, days))
+    db.close()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预约号源分配基准")
+    parser.add_argument("--doctors", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--attempts", type=int, default=2000, help="并发预约请求数")
+    parser.add_argument("--days", type=int, default=30, help="查询和预约的天数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_appointments_") as tmpdir:
+        for doctors in args.doctors:
+            results.append(asyncio.run(run_one(tmpdir, doctors, args.attempts, args.days)))
+
+    columns = ["doctors", "attempts", "attempts_per_s", "booked", "stored_slots", "double_booked",
+               "free_cold_ms", "free_warm_ms", "free_page_ms", "free_slots"]
+    print(" ".join(f"{c:>14}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]!s:>14}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "appointments", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+紧急关键词检测微基准
+
+对比逐个关键词子串扫描与 Aho-Corasick 自动机在不同词表规模下的单条消息耗时。
+自动机的耗时应基本不随词表规模增长。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_emergency
+    python -m benchmarks.bench_emergency --sizes 100 1000 10000 50000 --json bench_emergency.json
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+
+from app.agents.tools import EmergencyDetector
+from app.services.keyword_matcher import KeywordMatcher
+
+MESSAGES = [
+    "我最近有点头痛，持续了三天，晚上睡不好",
+    "孩子发烧38度，咳嗽有痰，需要去医院吗",
+    "饭后胃胀，偶尔反酸，已经两周了",
+    "今天早上突然胸闷，走路有点喘",
+    "I have had a mild headache and a runny nose since yesterday",
+]
+
+# 生成合成词条用的常用汉字
+_CHARS = "痛疼痒肿胀热冷麻酸晕吐泻咳喘烧血心肺肝肾胃肠头胸腹背腰腿手脚眼耳鼻喉皮急慢性重轻突发持续反复"
+
+
+def synthetic_keywords(size: int, seed: int = 42) -> List[str]:
+    """内置关键词 + 随机合成词条，凑够 size 个"""
+    rng = random.Random(seed)
+    words = list(dict.fromkeys(EmergencyDetector.EMERGENCY_KEYWORDS))
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(_CHARS) for _ in range(rng.randint(3, 6)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:size]
+
+
+def naive_scan(keywords: List[str], message: str) -> List[str]:
+    """原实现：逐个关键词做子串查找"""
+    message_lower = message.lower()
+    return [k for k in keywords if k.lower() in message_lower]
+
+
+def time_per_message(fn, messages: List[str], rounds: int) -> float:
+    """返回单条消息平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            fn(message)
+    return (time.perf_counter() - start) / (rounds * len(messages)) * 1e6
+
+
+def run(sizes: List[int], rounds: int) -> List[Dict[str, float]]:
+    results = []
+    for size in sizes:
+        keywords = synthetic_keywords(size)
+
+        build_start = time.perf_counter()
+        matcher = KeywordMatcher(keywords).build()
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        # 两种实现结果必须一致
+        for message in MESSAGES:
+            assert sorted(matcher.find_all(message)) == sorted(set(naive_scan(keywords, message)))
+
+        naive_rounds = max(1, rounds * 100 // size)
+        results.append({
+            "keywords": size,
+            "build_ms": round(build_ms, 2),
+            "naive_us": round(time_per_message(lambda m: naive_scan(keywords, m), MESSAGES, naive_rounds), 2),
+            "automaton_us": round(time_per_message(matcher.find_all, MESSAGES, rounds), 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="紧急关键词检测微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.rounds)
+
+    print(f"{'keywords':>10} {'build_ms':>10} {'naive_us':>10} {'automaton_us':>14}")
+    for row in results:
+        print(f"{row['keywords']:>10} {row['build_ms']:>10} {row['naive_us']:>10} {row['automaton_us']:>14}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "emergency_detector", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+附近医院查询基准
+
+按合成数据（N 个医疗机构，集中分布在若干城市周围，其余散布在全国范围）运行：
+- build：读取数据文件、建立网格索引的耗时
+- radius：5 公里半径内最近的 20 个
+- nearest：最近的 20 个（不限半径）
+- filtered：5 公里半径内、某科室且有急诊的最近 20 个
+- scan：对全部机构计算距离再取最近 20 个（不使用索引），作为对比
+
+查询点从城市中心附近随机选取，耗时为单次查询的平均微秒数。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_hospitals
+    python -m benchmarks.bench_hospitals --sizes 100000 300000 1000000 --queries 2000 --json hospitals.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.services.hospital_index import HospitalDirectory
+
+CITIES = [
+    (39.90, 116.40), (31.23, 121.47), (23.13, 113.26), (22.54, 114.06), (30.57, 104.07),
+    (30.59, 114.30), (34.34, 108.94), (29.56, 106.55), (32.06, 118.80), (30.27, 120.15),
+]
+DEPARTMENTS = ["内科", "外科", "儿科", "妇产科", "眼科", "口腔科", "皮肤科", "中医科", "心内科", "耳鼻喉科"]
+TYPES = ["hospital", "clinic", "doctors"]
+
+
+def make_facilities(size: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """80% 分布在城市周围（约 30 公里内），20% 均匀散布在全国范围"""
+    rng = random.Random(seed)
+    facilities = []
+    for i in range(size):
+        if rng.random() < 0.8:
+            lat, lng = rng.choice(CITIES)
+            lat, lng = lat + rng.gauss(0, 0.15), lng + rng.gauss(0, 0.15)
+        else:
+            lat, lng = rng.uniform(20, 45), rng.uniform(100, 122)
+        facilities.append({
+            "id": f"h{i}",
+            "name": f"医疗机构{i}",
+            "type": rng.choice(TYPES),
+            "lat": round(lat, 6),
+            "lng": round(lng, 6),
+            "departments": rng.sample(DEPARTMENTS, rng.randint(1, 4)),
+            "emergency": rng.random() < 0.3,
+        })
+    return facilities
+
+
+def time_queries(fn: Callable[[float, float], Any], points: List[Tuple[float, float]]) -> float:
+    """单次查询的平均耗时（微秒）"""
+    t = time.perf_counter()
+    for lat, lng in points:
+        fn(lat, lng)
+    return (time.perf_counter() - t) * 1e6 / len(points)
+
+
+def run_one(tmpdir: str, size: int, queries: int) -> Dict[str, Any]:
+    path = os.path.join(tmpdir, f"hospitals_{size}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_facilities(size), f, ensure_ascii=False)
+
+    directory = HospitalDirectory(path=path, reload_interval=3600)
+    directory.reload()
+    grid = directory._grid
+    rng = random.Random(7)
+    points = []
+    for _ in range(queries):
+        lat, lng = rng.choice(CITIES)
+        points.append((lat + rng.uniform(-0.2, 0.2), lng + rng.uniform(-0.2, 0.2)))
+
+    def scan(lat: float, lng: float):
+        index = np.arange(len(grid))
+        distances = grid.distances_km(index, lat, lng)
+        top = np.argpartition(distances, 19)[:20]
+        return index[top[np.argsort(distances[top])]]
+
+    # 检查索引查询与全量扫描的结果一致
+    for lat, lng in points[:20]:
+        expected = [grid.facility(i)["id"] for i in scan(lat, lng)]
+        assert [r["id"] for r in directory.nearby(lat, lng, limit=20)] == expected
+
+    return {
+        "facilities": size,
+        "build_s": directory.stats()["build_seconds"],
+        "radius_us": round(time_queries(lambda lat, lng: directory.nearby(lat, lng, radius_km=5), points), 1),
+        "nearest_us": round(time_queries(lambda lat, lng: directory.nearby(lat, lng), points), 1),
+        "filtered_us": round(time_queries(
+            lambda lat, lng: directory.nearby(lat, lng, radius_km=5, department="儿科", emergency=True), points
+        ), 1),
+        "scan_us": round(time_queries(scan, points[: max(queries // 10, 1)]), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="附近医院查询基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 300_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=2000, help="每种查询的次数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_hospitals_") as tmpdir:
+        for size in args.sizes:
+            results.append(run_one(tmpdir, size, args.queries))
+
+    columns = ["facilities", "build_s", "radius_us", "nearest_us", "filtered_us", "scan_us"]
+    print(" ".join(f"{c:>12}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]!s:>12}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "hospitals", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
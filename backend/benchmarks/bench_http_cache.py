@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+读接口条件请求基准
+
+在临时数据库中写入一批健康记录，进程内（ASGI，不经过网络）请求 GET /api/records，对比三种情况的单次耗时和响应字节数：
+- cold：每次都查询数据库并序列化（清空响应缓存，相当于改动之前）
+- cached：数据没有变化，直接使用缓存的序列化和压缩结果
+- not_modified：浏览器带 If-None-Match 重新验证，返回 304
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_http_cache
+    python -m benchmarks.bench_http_cache --sizes 50 200 500 --requests 500 --json http_cache.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+
+async def measure(client: httpx.AsyncClient, url: str, requests: int, headers: Dict[str, str], before=None) -> Dict[str, float]:
+    """返回平均耗时（微秒）和最后一次响应的状态码、字节数"""
+    elapsed = 0.0
+    response = None
+    for _ in range(requests):
+        if before is not None:
+            before()
+        t = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        elapsed += time.perf_counter() - t
+    return {
+        "us": round(elapsed / requests * 1e6, 1),
+        "status": response.status_code,
+        # 304 没有响应体；其余情况按实际传输的（压缩后）字节数计
+        "bytes": int(response.headers.get("content-length", len(response.content))),
+    }
+
+
+async def run(sizes: List[int], requests: int) -> List[Dict[str, Any]]:
+    from app.main import app
+    from app.services.health_store import get_health_store
+    from app.services.http_cache import get_http_cache
+
+    store = get_health_store()
+    cache = get_http_cache()
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for size in sizes:
+            user_id = f"bench{size}"
+            for i in range(size):
+                await store.add_record({
+                    "user_id": user_id, "date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "type": "体检报告",
+                    "doctor": "张医生", "summary": f"第 {i} 次体检：血压 12{i % 10}/8{i % 10} mmHg，血脂、血糖正常，建议保持规律作息",
+                })
+            url = f"/api/records?user_id={user_id}&limit={size}"
+            accept = {"Accept-Encoding": "gzip, br"}
+            first = await client.get(url, headers=accept)
+            etag = first.headers["etag"]
+
+            row: Dict[str, Any] = {"records": size}
+            cold = await measure(client, url, requests, accept, before=cache.clear)
+            cached = await measure(client, url, requests, accept)
+            identity = await measure(client, url, 1, {"Accept-Encoding": "identity"})
+            revalidate = await measure(client, url, requests, {**accept, "If-None-Match": etag})
+            row.update(
+                cold_us=cold["us"], cached_us=cached["us"], not_modified_us=revalidate["us"],
+                raw_bytes=identity["bytes"], compressed_bytes=cached["bytes"], not_modified_bytes=revalidate["bytes"],
+                encoding=first.headers.get("content-encoding", "identity"),
+            )
+            results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="读接口条件请求基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 500], help="每页记录数")
+    parser.add_argument("--requests", type=int, default=300, help="每种情况的请求次数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_http_cache_") as tmpdir:
+        os.environ["HEALTH_DB_PATH"] = os.path.join(tmpdir, "health.db")
+        os.environ.setdefault("SEED_DEMO_DATA", "0")
+        results = asyncio.run(run(args.sizes, args.requests))
+
+    columns = ["records", "cold_us", "cached_us", "not_modified_us", "raw_bytes", "compressed_bytes", "not_modified_bytes", "encoding"]
+    print(" ".join(f"{c:>18}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]!s:>18}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "http_cache", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
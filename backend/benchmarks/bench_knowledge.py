@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+知识检索微基准
+
+把内置知识文章复制扩充到不同规模，测量建索引耗时和单次查询耗时。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_knowledge
+    python -m benchmarks.bench_knowledge --sizes 100 1000 5000 --json bench_knowledge.json
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+
+from app.services.keyword_matcher import resolve_data_path
+from app.services.knowledge_index import KnowledgeIndex
+
+QUERIES = ["高血压", "头痛怎么办", "咳嗽 发烧", "失眠", "糖尿病饮食", "儿童发热", "BMI", "胸痛"]
+
+
+def load_articles() -> List[Dict]:
+    with open(resolve_data_path("KNOWLEDGE_ARTICLES_FILE", "knowledge_articles.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def expand(articles: List[Dict], size: int, seed: int = 7) -> List[Dict]:
+    """复制文章凑够 size 篇，打乱段落顺序，避免完全相同"""
+    rng = random.Random(seed)
+    result = []
+    for i in range(size):
+        base = dict(articles[i % len(articles)])
+        paragraphs = base["content"].split("\n\n")
+        rng.shuffle(paragraphs)
+        base["id"] = f"{base['id']}-{i}"
+        base["content"] = "\n\n".join(paragraphs)
+        result.append(base)
+    return result
+
+
+def run(sizes: List[int], rounds: int) -> List[Dict[str, float]]:
+    articles = load_articles()
+    results = []
+    for size in sizes:
+        index = KnowledgeIndex()
+        corpus = expand(articles, size)
+
+        start = time.perf_counter()
+        for article in corpus:
+            index.upsert(article)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for query in QUERIES:
+                index.search(query, limit=10)
+        query_us = (time.perf_counter() - start) / (rounds * len(QUERIES)) * 1e6
+
+        # 增量更新单篇文章的耗时
+        start = time.perf_counter()
+        for article in corpus[:100]:
+            updated = dict(article, summary=article["summary"] + "（已更新）")
+            index.upsert(updated)
+        update_us = (time.perf_counter() - start) / min(100, len(corpus)) * 1e6
+
+        results.append({
+            "articles": size,
+            "terms": index.stats()["terms"],
+            "build_ms": round(build_ms, 1),
+            "query_us": round(query_us, 1),
+            "update_us": round(update_us, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识检索微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.rounds)
+
+    print(f"{'articles':>10} {'terms':>8} {'build_ms':>10} {'query_us':>10} {'update_us':>10}")
+    for row in results:
+        print(f"{row['articles']:>10} {row['terms']:>8} {row['build_ms']:>10} {row['query_us']:>10} {row['update_us']:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "knowledge_search", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+通知中心基准
+
+在临时数据库中为一个用户写入 N 条通知（约三分之一未读），另有其他用户的通知作为干扰，然后测量：
+- unread：读取未读数（计数表）；对比 count_scan：每次 COUNT(*) 统计未读通知
+- page：读取第一页 50 条；deep_page：按游标翻到列表中部的一页
+- changes：读取最近一次修改之后的增量；对比 full_list：每次重新读取全部通知（原来前端轮询并重新过滤的做法）
+- mark_read：把一条通知标为已读（一次写事务，包括更新计数和版本号）
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_notifications
+    python -m benchmarks.bench_notifications --sizes 1000 10000 100000 --json notifications.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+from app.services.database import Database
+from app.services.health_store import encode_cursor
+from app.services.notification_store import NOTIFICATION_TYPES, NotificationStore
+
+USER = "bench-user"
+
+
+def fill(db: Database, size: int, other_users: int = 10) -> None:
+    """直接批量写入通知和计数（比逐条调用 create 快得多）"""
+    rows = []
+    unread = {}
+    for user_index, user_id in enumerate([USER] + [f"other{i}" for i in range(other_users)]):
+        count = size if user_index == 0 else size // other_users
+        for i in range(count):
+            read = int(i % 3 != 0)
+            unread[user_id] = unread.get(user_id, 0) + (1 - read)
+            rows.append((
+                uuid.uuid4().hex, user_id, NOTIFICATION_TYPES[i % 4], f"通知{i}", "内容", read, i + 1,
+                f"2026-01-01T00:00:{i % 60:02d}",
+            ))
+    rows.sort(key=lambda row: row[6])
+
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO notifications (id, user_id, type, title, body, read, deleted, rev, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+            rows,
+        )
+        conn.executemany(
+            "INSERT INTO notification_counters (user_id, unread, rev) VALUES (?, ?, ?)",
+            [(user_id, count, size) for user_id, count in unread.items()],
+        )
+
+
+async def time_it(fn: Callable[[], Awaitable[Any]], repeat: int) -> float:
+    """单次调用的平均耗时（毫秒）"""
+    await fn()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - t) * 1000 / repeat
+
+
+async def run_one(tmpdir: str, size: int, repeat: int) -> Dict[str, Any]:
+    db = Database(os.path.join(tmpdir, f"notifications_{size}.db"))
+    store = NotificationStore(db)
+    fill(db, size)
+
+    def count_unread(conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND deleted = 0 AND read = 0", (USER,)
+        ).fetchone()[0]
+
+    async def full_list():
+        return await store.list_notifications(USER, limit=size)
+
+    page, _ = await store.list_notifications(USER, limit=1)
+    middle_cursor = encode_cursor(page[0]["seq"] // 2)
+    unread, _ = await store.list_notifications(USER, limit=repeat + 1, unread_only=True)
+    ids = iter([n["id"] for n in unread])
+    assert (await store.counters(USER))["unread"] == await db.run(count_unread)
+    # 最近一次修改：一条新通知
+    await store.create(USER, "system", "新通知")
+    rev = (await store.counters(USER))["rev"]
+
+    row = {
+        "notifications": size,
+        "unread_ms": round(await time_it(lambda: store.counters(USER), repeat), 3),
+        "count_scan_ms": round(await time_it(lambda: db.run(count_unread), repeat), 3),
+        "page_ms": round(await time_it(lambda: store.list_notifications(USER, limit=50), repeat), 3),
+        "deep_page_ms": round(await time_it(
+            lambda: store.list_notifications(USER, limit=50, cursor=middle_cursor), repeat
+        ), 3),
+        "changes_ms": round(await time_it(lambda: store.changes(USER, rev - 1), repeat), 3),
+        "full_list_ms": round(await time_it(full_list, max(repeat // 20, 1)), 3),
+        "mark_read_ms": round(await time_it(lambda: store.mark_read(USER, [next(ids)]), repeat), 3),
+    }
+    assert (await store.counters(USER))["unread"] == await db.run(count_unread)
+    db.close()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通知中心基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200, help="每项操作的重复次数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_notifications_") as tmpdir:
+        for size in args.sizes:
+            results.append(asyncio.run(run_one(tmpdir, size, args.repeat)))
+
+    columns = ["notifications", "unread_ms", "count_scan_ms", "page_ms", "deep_page_ms",
+               "changes_ms", "full_list_ms", "mark_read_ms"]
+    print(" ".join(f"{c:>14}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]!s:>14}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "notifications", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
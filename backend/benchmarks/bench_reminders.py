@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+提醒调度基准
+
+在临时数据库中写入 N 条每日提醒（提醒时刻随机分布在一天中），用模拟时钟驱动调度器运行一段时间：
+- refill_ms：每次按时间窗口从数据库读取即将到期条目的耗时
+- tick_us：每秒一轮触发（弹出到期条目、更新数据库、计算下次提醒时间）的平均耗时
+- fired_per_s：每秒触发的提醒数
+- rescan_ms：对比参考，逐条重新计算全部提醒下次提醒时间（前端 scheduleAll 的做法）一次的耗时
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_reminders
+    python -m benchmarks.bench_reminders --sizes 10000 100000 1000000 --seconds 600 --json reminders.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from app.services.database import Database
+from app.services.reminder_scheduler import ReminderScheduler
+from app.services.reminder_store import ReminderStore
+
+INSERT_SQL = (
+    "INSERT INTO reminders (id, user_id, kind, title, body, frequency, every, start_date, time_of_day, "
+    "enabled, next_fire_at, last_fired_at, created_at, updated_at) "
+    "VALUES (?, ?, 'medication', ?, NULL, 'daily', 1, '2024-01-01', ?, 1, ?, NULL, '2024-01-01', '2024-01-01')"
+)
+
+
+def populate(store: ReminderStore, size: int, now: float, seed: int = 42) -> List[Dict[str, Any]]:
+    """写入 size 条每日提醒，返回它们的时间规则（供全量重算对比）"""
+    rng = random.Random(seed)
+    reminders = []
+    rows = []
+    for i in range(size):
+        reminder = {
+            "frequency": "daily", "every": 1, "start_date": "2024-01-01", "enabled": True,
+            "time_of_day": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+        }
+        reminders.append(reminder)
+        rows.append((f"r{i}", f"user{i % 1000}", f"药品{i}", reminder["time_of_day"], store.next_fire_at(reminder, now)))
+    with store.db.transaction() as conn:
+        conn.executemany(INSERT_SQL, rows)
+    return reminders
+
+
+async def simulate(scheduler: ReminderScheduler, start: float, seconds: int) -> Dict[str, float]:
+    """从 start 开始每秒执行一轮，统计刷新和触发的耗时"""
+    refill_ms, tick_us = [], []
+    fired = 0
+    for second in range(seconds):
+        now = start + second
+        if now >= scheduler._next_refill:
+            t = time.perf_counter()
+            await scheduler.refill(now)
+            refill_ms.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        fired += await scheduler.tick(now)
+        tick_us.append((time.perf_counter() - t) * 1e6)
+    return {
+        "refill_ms": round(statistics.median(refill_ms), 2),
+        "tick_us": round(statistics.mean(tick_us), 1),
+        "tick_p99_us": round(sorted(tick_us)[int(len(tick_us) * 0.99)], 1),
+        "fired_per_s": round(fired / seconds, 2),
+        "pending": len(scheduler._scheduled),
+    }
+
+
+def run(sizes: List[int], seconds: int) -> List[Dict[str, Any]]:
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="bench_reminders_") as tmpdir:
+            db = Database(os.path.join(tmpdir, "reminders.db"))
+            store = ReminderStore(db)
+            start = time.time()
+
+            t = time.perf_counter()
+            reminders = populate(store, size, start)
+            insert_s = time.perf_counter() - t
+
+            t = time.perf_counter()
+            for reminder in reminders:
+                store.next_fire_at(reminder, start)
+            rescan_ms = (time.perf_counter() - t) * 1000
+
+            scheduler = ReminderScheduler(store, horizon=300, refill_interval=60)
+            row = {"reminders": size, "insert_s": round(insert_s, 2), "rescan_ms": round(rescan_ms, 1)}
+            row.update(asyncio.run(simulate(scheduler, start, seconds)))
+            results.append(row)
+            db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提醒调度基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--seconds", type=int, default=300, help="模拟运行的秒数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.seconds)
+
+    columns = ["reminders", "insert_s", "rescan_ms", "refill_ms", "tick_us", "tick_p99_us", "fired_per_s", "pending"]
+    print(" ".join(f"{c:>12}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]!s:>12}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "reminders", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
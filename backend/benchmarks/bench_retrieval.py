@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+向量检索微基准
+
+测量哈希向量化的耗时，以及不同规模、不同维度下向量索引的 top-k 查询耗时
+（单个查询、批量查询折算到每个查询）和增删耗时。
+索引扫描耗时只与矩阵形状有关，这里用随机单位向量填充索引。
+
+单线程测量时先限制 BLAS 线程数：
+    OPENBLAS_NUM_THREADS=1 python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --sizes 10000 100000 --dims 256 512 --json bench_retrieval.json
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.keyword_matcher import resolve_data_path
+from app.services.retrieval import _article_chunks
+from app.services.vector_index import HashingEmbedder, VectorIndex
+
+QUERIES = ["高血压", "头痛怎么办", "咳嗽 发烧", "失眠", "糖尿病饮食", "儿童发热", "BMI", "胸痛"]
+
+
+def load_chunks() -> List[str]:
+    with open(resolve_data_path("KNOWLEDGE_ARTICLES_FILE", "knowledge_articles.json"), "r", encoding="utf-8") as f:
+        articles = json.load(f)
+    return [chunk for article in articles for chunk in _article_chunks(article)]
+
+
+def random_unit(rows: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    matrix = rng.standard_normal((rows, dim), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def run(sizes: List[int], dims: List[int], rounds: int, batch: int, k: int) -> List[Dict[str, float]]:
+    rng = np.random.default_rng(7)
+    chunks = load_chunks()
+    results = []
+    for dim in dims:
+        embedder = HashingEmbedder(dim)
+        embedder.embed_many(chunks)  # 预热词项哈希缓存
+        start = time.perf_counter()
+        embedder.embed_many(chunks)
+        embed_us = (time.perf_counter() - start) / len(chunks) * 1e6
+        queries = embedder.embed_many(QUERIES)
+
+        for size in sizes:
+            index = VectorIndex(dim)
+            start = time.perf_counter()
+            for offset in range(0, size, 10000):
+                rows = min(10000, size - offset)
+                index.add(range(offset, offset + rows), random_unit(rows, dim, rng))
+            build_ms = (time.perf_counter() - start) * 1000
+
+            single = []
+            for i in range(rounds):
+                start = time.perf_counter()
+                index.search(queries[i % len(queries)], k)
+                single.append((time.perf_counter() - start) * 1000)
+
+            batch_queries = queries[np.arange(batch) % len(queries)]
+            start = time.perf_counter()
+            for _ in range(max(1, rounds // batch)):
+                index.search_many(batch_queries, k)
+            batch_ms = (time.perf_counter() - start) * 1000 / (max(1, rounds // batch) * batch)
+
+            # 增删：删除 100 行再写回
+            vectors = random_unit(100, dim, rng)
+            start = time.perf_counter()
+            for key in range(100):
+                index.remove(key)
+            index.add(range(100), vectors)
+            update_us = (time.perf_counter() - start) / 100 * 1e6
+
+            results.append({
+                "dim": dim,
+                "chunks": size,
+                "embed_us": round(embed_us, 1),
+                "build_ms": round(build_ms, 1),
+                "query_ms_p50": round(statistics.median(single), 3),
+                "query_ms_p95": round(sorted(single)[int(len(single) * 0.95) - 1], 3),
+                f"batch{batch}_ms_per_query": round(batch_ms, 3),
+                "update_us": round(update_us, 1),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量检索微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.dims, args.rounds, args.batch, args.k)
+
+    columns = list(results[0].keys())
+    print(" ".join(f"{c:>20}" for c in columns))
+    for row in results:
+        print(" ".join(f"{row[c]:>20}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "vector_retrieval", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准
+
+每一轮都在新的子进程中测量，不受模块缓存影响：
+- import_ms：导入 app.main 的耗时（uvicorn --reload 每次重载都要重新付出）
+- assistant_import_ms：导入 AI 对话依赖（langchain / openai / numpy）的耗时，对比参考
+- health_ms：从启动 uvicorn 进程到 /health 返回 200 的耗时（容器冷启动可以接流量的时间）
+- ready_ms：从启动到 /ready 返回 200、健康助手在后台加载完成的耗时
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --rounds 10 --top 15 --json startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.load_test import BACKEND_DIR, free_port, git_revision
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def make_env(tmpdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "stub")
+    env["HEALTH_DB_PATH"] = os.path.join(tmpdir, "health.db")
+    return env
+
+
+def measure_import(module: str, env: Dict[str, str]) -> float:
+    """在新进程中导入 module，返回耗时（毫秒）"""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def wait_status(client: httpx.Client, url: str, deadline: float) -> Optional[float]:
+    """轮询直到 url 返回 200，返回 perf_counter 时间点；超时返回 None"""
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url, timeout=1).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    return None
+
+
+def measure_server(env: Dict[str, str], timeout: float) -> Tuple[Optional[float], Optional[float]]:
+    """启动 uvicorn，返回 (到 /health 可用的毫秒数, 到 /ready 可用的毫秒数)"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client() as client:
+            deadline = start + timeout
+            health_at = wait_status(client, f"{base_url}/health", deadline)
+            ready_at = wait_status(client, f"{base_url}/ready", deadline) if health_at else None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    to_ms = lambda at: round((at - start) * 1000, 1) if at else None
+    return to_ms(health_at), to_ms(ready_at)
+
+
+def top_imports(module: str, env: Dict[str, str], limit: int) -> List[Dict[str, Any]]:
+    """python -X importtime 中 module 直接导入的模块，按累计耗时排序"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 每一层依赖多缩进两个空格；module 本身缩进 1，它直接导入的模块缩进 3
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    return sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:limit]
+
+
+def summarize(values: List[Optional[float]]) -> Dict[str, Optional[float]]:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"median": None, "min": None, "max": None}
+    return {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+
+
+def run(rounds: int, timeout: float, top: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmpdir:
+        env = make_env(tmpdir)
+        # 第一次运行会写 .pyc 缓存，不计入结果
+        measure_import("app.main", env)
+
+        import_ms, assistant_ms, health_ms, ready_ms = [], [], [], []
+        for _ in range(rounds):
+            import_ms.append(measure_import("app.main", env))
+            assistant_ms.append(measure_import("app.agents.health_assistant", env))
+            health, ready = measure_server(env, timeout)
+            health_ms.append(health)
+            ready_ms.append(ready)
+
+        return {
+            "benchmark": "startup",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rounds": rounds,
+            "results": {
+                "import_ms": summarize(import_ms),
+                "assistant_import_ms": summarize(assistant_ms),
+                "health_ms": summarize(health_ms),
+                "ready_ms": summarize(ready_ms),
+            },
+            "top_imports": top_imports("app.main", env, top) if top else [],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="等待服务可用的最长时间（秒）")
+    parser.add_argument("--top", type=int, default=10, help="列出导入 app.main 时最慢的 N 个顶层模块，0 表示不列出")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    report = run(args.rounds, args.timeout, args.top)
+
+    print(f"{'metric':>22} {'median':>10} {'min':>10} {'max':>10}")
+    for name, row in report["results"].items():
+        print(f"{name:>22} {row['median']!s:>10} {row['min']!s:>10} {row['max']!s:>10}")
+    for row in report["top_imports"]:
+        print(f"  {row['module']:<40} {row['cumulative_ms']:>8} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+症状规则匹配微基准
+
+在内置规则之外加入合成规则，对比逐条规则子串检查与规则引擎（关键词自动机 + 倒排表）
+在不同规则数量下的编译耗时和单条消息耗时。规则引擎的耗时应基本不随规则数量增长。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.bench_symptoms
+    python -m benchmarks.bench_symptoms --sizes 100 1000 10000 --json bench_symptoms.json
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+from app.services.keyword_matcher import resolve_data_path
+from app.services.symptom_rules import SymptomRuleEngine, _RuleSet, parse_rules
+from benchmarks.bench_emergency import MESSAGES, _CHARS, time_per_message
+
+
+def load_builtin() -> Dict[str, Any]:
+    with open(resolve_data_path("SYMPTOM_RULES_FILE", "symptom_rules.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def synthetic_rules(size: int, seed: int = 42) -> Dict[str, Any]:
+    """内置规则 + 合成规则（每条 1~3 个合成症状，各带两个同义词），凑够 size 条"""
+    rng = random.Random(seed)
+    data = load_builtin()
+    symptoms = dict(data["symptoms"])
+    rules = list(data["rules"])
+    word = lambda: "".join(rng.choice(_CHARS) for _ in range(rng.randint(3, 5)))
+    while len(rules) < size:
+        terms = [word() for _ in range(rng.randint(1, 3))]
+        for term in terms:
+            symptoms.setdefault(term, [word(), word()])
+        rules.append({"id": f"synthetic_{len(rules)}", "symptoms": terms, "conditions": ["合成"], "advice": ""})
+    return {"symptoms": symptoms, "rules": rules[:size]}
+
+
+def naive_match(rules, synonyms, message: str) -> List[str]:
+    """逐条规则检查每个症状（或其同义词）是否出现在消息中"""
+    text = message.lower()
+    matched = []
+    for rule in rules:
+        if all(any(k.lower() in text for k in [s, *synonyms.get(s, [])]) for s in rule.symptoms):
+            matched.append(rule.id)
+    return matched
+
+
+def run(sizes: List[int], rounds: int) -> List[Dict[str, float]]:
+    results = []
+    for size in sizes:
+        rules, synonyms = parse_rules(synthetic_rules(size))
+
+        build_start = time.perf_counter()
+        ruleset = _RuleSet(rules, synonyms)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        engine = SymptomRuleEngine(reload_interval=3600)
+        engine._rules = ruleset
+
+        # 两种实现命中的规则必须一致
+        for message in MESSAGES:
+            _, matched = engine.match(message, limit=size)
+            assert sorted(rule.id for rule in matched) == sorted(naive_match(rules, synonyms, message))
+
+        naive_rounds = max(1, rounds * 20 // size)
+        results.append({
+            "rules": size,
+            "keywords": ruleset.keywords,
+            "build_ms": round(build_ms, 2),
+            "naive_us": round(time_per_message(lambda m: naive_match(rules, synonyms, m), MESSAGES, naive_rounds), 2),
+            "engine_us": round(time_per_message(engine.match, MESSAGES, rounds), 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="症状规则匹配微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.rounds)
+
+    print(f"{'rules':>8} {'keywords':>10} {'build_ms':>10} {'naive_us':>10} {'engine_us':>10}")
+    for row in results:
+        print(f"{row['rules']:>8} {row['keywords']:>10} {row['build_ms']:>10} {row['naive_us']:>10} {row['engine_us']:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "symptom_rules", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
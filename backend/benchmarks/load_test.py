@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+对话接口压测
+
+启动 OpenAI 桩服务（benchmarks/stub_openai.py）和后端服务（各自一个子进程），
+后端通过 OPENAI_API_BASE 指向桩服务，使用临时数据库，不需要真实的 API Key。
+按给定的并发数依次压测 /api/chat（或 /api/chat/stream），输出延迟分位数、
+吞吐量和后端进程的内存增长，结果可写成 JSON，便于不同版本之间对比。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --concurrency 1 8 32 64 --requests 400 --stub-latency-ms 500 --json load.json
+    python -m benchmarks.load_test --stream --stub-tokens-per-second 40
+    python -m benchmarks.load_test --url http://127.0.0.1:8000   # 压测已经在运行的服务（不启动子进程）
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# 常见的非紧急健康问题，压测时轮流使用
+QUESTIONS = [
+    "最近总是头痛，应该注意什么",
+    "感冒咳嗽一周了还没好",
+    "晚上睡不着，有什么改善睡眠的方法",
+    "血压有点高，饮食上要注意什么",
+    "经常胃胀，吃完饭更明显",
+    "孩子有点流鼻涕，需要去医院吗",
+    "运动后膝盖有点疼",
+    "体检说血脂偏高怎么办",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """读取进程当前常驻内存（MB），非 Linux 系统返回 None"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法求分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务启动超时：{url}")
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def make_message(i: int, distinct: int) -> str:
+    """distinct 为 0 时每条消息都不同（不命中回复缓存），否则在 distinct 条消息中循环"""
+    n = i % distinct if distinct else i
+    question = QUESTIONS[n % len(QUESTIONS)]
+    return question if distinct and distinct <= len(QUESTIONS) else f"{question} {n}"
+
+
+async def one_request(client: httpx.AsyncClient, base_url: str, message: str, stream: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first_byte = None
+    try:
+        if stream:
+            async with client.stream("POST", f"{base_url}/api/chat/stream", json={"message": message}) as response:
+                async for line in response.aiter_lines():
+                    if first_byte is None and line.startswith("data:") and '"token"' in line:
+                        first_byte = time.perf_counter() - start
+                status = response.status_code
+        else:
+            response = await client.post(f"{base_url}/api/chat", json={"message": message})
+            status = response.status_code
+    except httpx.HTTPError as e:
+        return {"status": type(e).__name__, "latency": time.perf_counter() - start, "ttft": None}
+    return {"status": status, "latency": time.perf_counter() - start, "ttft": first_byte}
+
+
+async def run_level(
+    base_url: str, concurrency: int, requests: int, stream: bool, distinct: int, offset: int, timeout: float
+) -> Dict[str, Any]:
+    """以固定并发发送 requests 个请求"""
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def worker() -> None:
+            for i in counter:
+                results.append(await one_request(client, base_url, make_message(offset + i, distinct), stream))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] * 1000 for r in ok]
+    status_counts: Dict[str, int] = {}
+    for r in results:
+        status_counts[str(r["status"])] = status_counts.get(str(r["status"]), 0) + 1
+
+    level = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "status_counts": status_counts,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(sum(latencies) / len(latencies), 1) if latencies else 0,
+            "max": round(max(latencies), 1) if latencies else 0,
+        },
+    }
+    if stream:
+        ttft = [r["ttft"] * 1000 for r in ok if r["ttft"] is not None]
+        level["ttft_ms"] = {"p50": round(percentile(ttft, 50), 1), "p95": round(percentile(ttft, 95), 1)}
+    return level
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    processes: List[subprocess.Popen] = []
+    server_pid = None
+    base_url = args.url
+    tmpdir = tempfile.TemporaryDirectory(prefix="load_test_")
+    try:
+        if not base_url:
+            stub_port, app_port = free_port(), free_port()
+            env = dict(os.environ)
+            processes.append(start_process([
+                "-m", "benchmarks.stub_openai", "--port", str(stub_port),
+                "--latency-ms", str(args.stub_latency_ms),
+                "--tokens-per-second", str(args.stub_tokens_per_second),
+                "--tokens", str(args.stub_tokens),
+            ], env))
+            env.update({
+                "OPENAI_API_BASE": f"http://127.0.0.1:{stub_port}/v1",
+                "OPENAI_API_KEY": "stub",
+                "HEALTH_DB_PATH": os.path.join(tmpdir.name, "health.db"),
+            })
+            server = start_process([
+                "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                "--log-level", "warning",
+            ], env)
+            processes.append(server)
+            server_pid = server.pid
+            base_url = f"http://127.0.0.1:{app_port}"
+            await wait_ready(f"http://127.0.0.1:{stub_port}/stats")
+        await wait_ready(f"{base_url}/health")
+
+        # 预热：加载知识库、建立连接等一次性开销不计入结果
+        await run_level(base_url, 1, args.warmup, args.stream, args.distinct, 10**6, args.timeout)
+
+        levels = []
+        offset = 0
+        for concurrency in args.concurrency:
+            rss_before = read_rss_mb(server_pid) if server_pid else None
+            level = await run_level(base_url, concurrency, args.requests, args.stream, args.distinct, offset, args.timeout)
+            offset += args.requests
+            rss_after = read_rss_mb(server_pid) if server_pid else None
+            level["rss_mb_before"] = rss_before
+            level["rss_mb_after"] = rss_after
+            level["rss_growth_mb"] = round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None
+            levels.append(level)
+            print(
+                f"concurrency={concurrency:<4} rps={level['rps']:<8} "
+                f"p50={level['latency_ms']['p50']}ms p95={level['latency_ms']['p95']}ms p99={level['latency_ms']['p99']}ms "
+                f"errors={level['errors']} rss={rss_after}MB",
+                flush=True,
+            )
+
+        return {
+            "benchmark": "chat_load",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "endpoint": "/api/chat/stream" if args.stream else "/api/chat",
+                "requests_per_level": args.requests,
+                "distinct_messages": args.distinct,
+                "stub_latency_ms": args.stub_latency_ms if not args.url else None,
+                "stub_tokens_per_second": args.stub_tokens_per_second if not args.url else None,
+                "stub_tokens": args.stub_tokens if not args.url else None,
+            },
+            "results": levels,
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        tmpdir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对话接口压测")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="每个并发级别发送的请求数")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="压测 /api/chat/stream（额外统计首字延迟）")
+    parser.add_argument("--distinct", type=int, default=0, help="不同消息的数量，0 表示每条消息都不同（不命中回复缓存）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求超时（秒）")
+    parser.add_argument("--stub-latency-ms", type=float, default=300)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=0, help="桩服务生成速度，0 表示不限速")
+    parser.add_argument("--stub-tokens", type=int, default=120)
+    parser.add_argument("--url", help="压测已经在运行的服务，不启动桩服务和后端子进程")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+OpenAI 兼容的聊天接口桩服务
+
+只实现 POST /v1/chat/completions（普通和流式两种返回），按配置的首字延迟和
+生成速度模拟模型耗时，不需要 API Key、不访问网络，用于压测和本地联调。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.stub_openai --port 9100 --latency-ms 300 --tokens-per-second 50 --tokens 120
+
+后端指向桩服务：
+    OPENAI_API_BASE=http://127.0.0.1:9100/v1 OPENAI_API_KEY=stub python run.py
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# 回复内容：循环使用这段文字凑够指定的 token 数（中文每个字约 1 个 token）
+REPLY_TEXT = (
+    "根据你的描述，这种情况常见的原因包括作息不规律、压力较大或轻度感染等。"
+    "可以先注意休息、多喝水，保持规律饮食，观察症状变化。"
+    "如果症状持续超过三天、明显加重或出现高热、胸痛、呼吸困难等情况，请及时就医。"
+    "以上建议仅供参考，不能替代专业医疗诊断。"
+)
+
+
+def _reply_pieces(tokens: int):
+    """按 token 切分回复，每个中文字符算一个 token"""
+    for i in range(tokens):
+        yield REPLY_TEXT[i % len(REPLY_TEXT)]
+
+
+def create_app(latency_ms: float = 300, tokens_per_second: float = 50, tokens: int = 120) -> FastAPI:
+    """
+    创建桩服务
+
+    Args:
+        latency_ms: 首个 token 之前的延迟（毫秒）
+        tokens_per_second: 之后每秒生成的 token 数（0 表示不限速）
+        tokens: 每次回复的 token 数
+    """
+    app = FastAPI(title="OpenAI Stub")
+    token_interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+    stats = {"requests": 0, "streams": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def _begin() -> None:
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+    def _usage(body: Dict[str, Any]) -> Dict[str, int]:
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "stub")
+        _begin()
+
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(latency_ms / 1000 + token_interval * tokens)
+            finally:
+                stats["in_flight"] -= 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(_reply_pieces(tokens))},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(body),
+            }
+
+        stats["streams"] += 1
+
+        async def events() -> AsyncIterator[str]:
+            def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+                data = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+            try:
+                await asyncio.sleep(latency_ms / 1000)
+                yield chunk({"role": "assistant", "content": ""})
+                for piece in _reply_pieces(tokens):
+                    if token_interval:
+                        await asyncio.sleep(token_interval)
+                    yield chunk({"content": piece})
+                yield chunk({}, finish_reason="stop")
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的聊天接口桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=300, help="首个 token 之前的延迟（毫秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="生成速度，0 表示不限速")
+    parser.add_argument("--tokens", type=int, default=120, help="每次回复的 token 数")
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.tokens_per_second, args.tokens)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
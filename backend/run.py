@@ -1,19 +1,68 @@
-"""后端启动脚本"""
-import uvicorn
+"""
+后端启动脚本
+
+开发模式（默认）：单进程，代码修改后自动重载
+    python run.py
+
+生产模式：多个 worker 进程，不重载，使用 uvloop 事件循环和 httptools 解析器
+    python run.py --production --workers 4
+    APP_ENV=production WEB_CONCURRENCY=4 python run.py
+"""
+import argparse
+import importlib.util
 import os
+
+import uvicorn
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
-if __name__ == "__main__":
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", 8000))
-    
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI 健康助手后端")
+    parser.add_argument("--production", action="store_true", default=os.getenv("APP_ENV") == "production",
+                        help="生产模式（也可设置 APP_ENV=production）")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 0)) or None,
+                        help="worker 进程数，生产模式默认等于 CPU 核数")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    args = parser.parse_args()
+
+    if not args.production:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
+        return
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1:
+        # 多进程时会话必须放在共享存储中，否则下一轮对话可能落到没有历史的进程
+        backend = os.environ.setdefault("SESSION_BACKEND", "sqlite")
+        if backend != "sqlite":
+            print(f"警告：SESSION_BACKEND={backend} 时各 worker 的会话互不共享")
+
     uvicorn.run(
         "app.main:app",
-        host=host,
-        port=port,
-        reload=True,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        reload=False,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        proxy_headers=True,
+        access_log=False,
         log_level="info"
     )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""测试检查报告解析：带参考范围的数值超出范围时才算异常，编号、日期、电话号码不能被拆成数值和范围"""
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+from app.services.report_analysis import analyze_report
+
+# (报告中的一行, 期望的异常 [(项目, 数值, 参考范围, 标记)])
+cases = [
+    ("血红蛋白 105 g/L (130-175)", [("血红蛋白", 105.0, [130.0, 175.0], "low")]),
+    ("ALT: 86 U/L 参考值 9~50", [("ALT", 86.0, [9.0, 50.0], "high")]),
+    ("空腹血糖 7.8mmol/L 3.9-6.1", [("空腹血糖", 7.8, [3.9, 6.1], "high")]),
+    ("白细胞 6.2 (3.5-9.5)", []),
+    ("报告编号 20240115-0032", []),
+    ("检查日期 2024-01-15", []),
+    ("联系电话 138-1234-5678", []),
+]
+
+failed = 0
+for line, expected in cases:
+    found = [(f["item"], f["value"], f["range"], f["flag"]) for f in analyze_report(line)["findings"]]
+    ok = found == expected
+    failed += not ok
+    print(f"[{'OK' if ok else 'FAIL'}] {line!r}: {found}")
+
+sys.exit(1 if failed else 0)
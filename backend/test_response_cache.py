@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""测试回复缓存的问题归一化：只去掉空白和句末标点，剂量、体温、血压等数字不能被合并"""
+import sys
+import io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+from app.services.response_cache import normalize_question
+
+# (问题 A, 问题 B, 归一化后是否应相同)
+cases = [
+    ("头痛怎么办？", "头痛 怎么办", True),
+    ("头痛怎么办?", "头痛怎么办。", True),
+    ("ＡＢＣ血压", "abc血压", True),
+    ("布洛芬一次吃1.5片可以吗", "布洛芬一次吃15片可以吗", False),
+    ("体温38.5度", "体温385度", False),
+    ("血压 140/90", "血压14090", False),
+    ("每天2:30吃药", "每天230吃药", False),
+    ("一次吃1 5片", "一次吃15片", False),
+    ("体温38.5", "体温38.5。", True),
+]
+
+failed = 0
+for a, b, same in cases:
+    ok = (normalize_question(a) == normalize_question(b)) == same
+    failed += not ok
+    print(f"[{'OK' if ok else 'FAIL'}] {a!r} vs {b!r}: {normalize_question(a)!r} / {normalize_question(b)!r}")
+
+sys.exit(1 if failed else 0)
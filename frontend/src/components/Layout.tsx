@@ -2,7 +2,7 @@ import { ReactNode, useEffect, useState } from 'react'
 import { Link, useLocation } from 'react-router-dom'
 import { AppIcon } from './AppIcon'
 import { Bell, FileText, LayoutDashboard, MessagesSquare, Settings } from 'lucide-react'
-import { getUnreadCount } from '../services/notificationsStore'
+import { getUnreadCount, startNotificationSync } from '../services/notificationsStore'
 import { Moon, Sun } from 'lucide-react'
 import { start as startMedicationReminders } from '../services/medicationReminders'
 
@@ -47,6 +47,7 @@ export default function Layout({ children }: LayoutProps) {
 
   useEffect(() => {
     startMedicationReminders()
+    void startNotificationSync()
   }, [])
 
   const navItems = [
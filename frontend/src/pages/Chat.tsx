@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom'
 import ChatBubble from '../components/ChatBubble'
 import { AlertIcon, ChatIcon } from '../components/Icons'
 import { Button, Card, CardBody, CardHeader, Input, Page, PageHeader } from '../components/ui'
-import api from '../services/api'
+import { streamChat } from '../services/api'
 import { pushNotification } from '../services/notificationHelpers'
 import { EmergencyButton } from '../components/EmergencyButton'
 
@@ -67,6 +67,8 @@ export default function Chat() {
   const [messages, setMessages] = useState<Message[]>(() => initialMessages())
   const [input, setInput] = useState('')
   const [loading, setLoading] = useState(false)
+  const [streaming, setStreaming] = useState(false)
+  const sessionIdRef = useRef<string | undefined>(undefined)
   const messagesEndRef = useRef<HTMLDivElement>(null)
 
   const scrollToBottom = () => {
@@ -83,6 +85,7 @@ export default function Chat() {
 
   const handleClear = () => {
     const fresh = [defaultMessage()]
+    sessionIdRef.current = undefined
     saveMessages(fresh)
     setMessages(fresh)
     pushNotification({
@@ -109,20 +112,45 @@ export default function Chat() {
     setInput('')
     setLoading(true)
 
+    const assistantId = (Date.now() + 1).toString()
+    let replyText = ''
+
     try {
-      const response = await api.post('/chat', { message: text })
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        text: response.data.message || '我暂时没能生成建议，你可以换一种描述方式再试一次。',
-        sender: 'assistant',
-        timestamp: new Date(),
+      await streamChat({ message: text, session_id: sessionIdRef.current }, (event) => {
+        if (event.session_id) {
+          sessionIdRef.current = event.session_id
+        }
+        if (event.type === 'token' && event.content) {
+          const isFirst = replyText === ''
+          replyText += event.content
+          if (isFirst) {
+            // 收到第一段文本后再显示回复气泡
+            setStreaming(true)
+            setMessages((prev) => [
+              ...prev,
+              { id: assistantId, text: replyText, sender: 'assistant', timestamp: new Date() },
+            ])
+          } else {
+            setMessages((prev) => prev.map((m) => (m.id === assistantId ? { ...m, text: replyText } : m)))
+          }
+        }
+        if (event.type === 'error') {
+          throw new Error(event.message || 'stream error')
+        }
+      })
+
+      if (!replyText) {
+        replyText = '我暂时没能生成建议，你可以换一种描述方式再试一次。'
+        setMessages((prev) => [
+          ...prev,
+          { id: assistantId, text: replyText, sender: 'assistant', timestamp: new Date() },
+        ])
       }
-      setMessages((prev) => [...prev, assistantMessage])
 
       pushNotification({
         type: 'message',
         title: '助手已回复',
-        description: assistantMessage.text.slice(0, 40) + (assistantMessage.text.length > 40 ? '…' : ''),
+        description: replyText.slice(0, 40) + (replyText.length > 40 ? '…' : ''),
       })
     } catch (error) {
       console.error('Error sending message:', error)
@@ -141,6 +169,7 @@ export default function Chat() {
       })
     } finally {
       setLoading(false)
+      setStreaming(false)
     }
   }
 
@@ -193,7 +222,7 @@ export default function Chat() {
               {messages.map((message) => (
                 <ChatBubble key={message.id} message={message} />
               ))}
-              {loading && (
+              {loading && !streaming && (
                 <div className="flex justify-start">
                   <div className="rounded-lg border border-gray-200 bg-white px-4 py-3 shadow-sm dark:border-gray-800 dark:bg-gray-900">
                     <div className="flex items-center space-x-2">
@@ -7,6 +7,7 @@ import { EmptyState } from '../components/EmptyState'
 import { SkeletonList } from '../components/Skeleton'
 import { useToast } from '../components/ToastProvider'
 import { pushNotification } from '../services/notificationHelpers'
+import { searchNearbyHospitals } from '../services/api'
 import { haversineDistanceMeters, searchNearbyMedicalPOI, type OsmPlace } from '../services/osmOverpass'
 
 const DefaultIcon = L.icon({
@@ -224,13 +225,22 @@ export default function NearbyHospitals() {
     setActiveId(null)
 
     try {
-      const raw = await searchNearbyMedicalPOI({ lat: geo.lat, lng: geo.lng, radiusMeters: radius })
-      const withDistance = raw
-        .map((p) => ({
-          ...p,
-          distanceMeters: haversineDistanceMeters({ lat: geo.lat, lng: geo.lng }, { lat: p.lat, lng: p.lng }),
-        }))
-        .filter((p) => Number.isFinite(p.distanceMeters))
+      let withDistance: Array<OsmPlace & { distanceMeters: number }> = []
+      // 优先查询后端的医疗机构目录；后端不可用或附近没有收录的机构时再查询 Overpass
+      try {
+        withDistance = await searchNearbyHospitals({ lat: geo.lat, lng: geo.lng, radiusMeters: radius, limit: 200 })
+      } catch {
+        withDistance = []
+      }
+      if (withDistance.length === 0) {
+        const raw = await searchNearbyMedicalPOI({ lat: geo.lat, lng: geo.lng, radiusMeters: radius })
+        withDistance = raw
+          .map((p) => ({
+            ...p,
+            distanceMeters: haversineDistanceMeters({ lat: geo.lat, lng: geo.lng }, { lat: p.lat, lng: p.lng }),
+          }))
+          .filter((p) => Number.isFinite(p.distanceMeters))
+      }
 
       setPlaces(withDistance)
       toast({ tone: 'success', message: `找到 ${withDistance.length} 个结果` })
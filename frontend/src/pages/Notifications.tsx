@@ -1,7 +1,7 @@
-import { useMemo, useState } from 'react'
+import { useEffect, useMemo, useState } from 'react'
 import { useNavigate } from 'react-router-dom'
 import { Badge, Button, Card, CardBody, CardHeader, Page, PageHeader, Select, Input } from '../components/ui'
-import { markAllRead, markRead, readNotifications, deleteNotification, deleteNotificationsBySelectedDate, type NotificationType } from '../services/notificationsStore'
+import { markAllRead, markRead, readNotifications, deleteNotification, deleteNotificationsBySelectedDate, getUnreadCount, hasMoreNotifications, loadMoreNotifications, type NotificationType } from '../services/notificationsStore'
 import { useToast } from '../components/ToastProvider'
 import { ConfirmDialog } from '../components/ConfirmDialog'
 
@@ -32,6 +32,18 @@ export default function Notifications() {
     type: 'single',
   })
   const [deleteDate, setDeleteDate] = useState('')
+  const [hasMore, setHasMore] = useState(() => hasMoreNotifications())
+  const [loadingMore, setLoadingMore] = useState(false)
+
+  // 后端推送的新通知和其他页面的修改
+  useEffect(() => {
+    const update = () => {
+      setNotifications(readNotifications() as any)
+      setHasMore(hasMoreNotifications())
+    }
+    window.addEventListener('notifications:changed', update)
+    return () => window.removeEventListener('notifications:changed', update)
+  }, [])
 
   const filtered = useMemo(() => {
     return notifications.filter((n) => {
@@ -41,7 +53,7 @@ export default function Notifications() {
     })
   }, [notifications, tab, onlyUnread])
 
-  const unreadCount = notifications.filter((n) => n.unread).length
+  const unreadCount = useMemo(() => getUnreadCount(), [notifications])
 
   return (
     <Page>
@@ -170,6 +182,26 @@ export default function Notifications() {
               </div>
             ))}
           </div>
+          {hasMore ? (
+            <div className="mt-4 flex justify-center">
+              <Button
+                variant="secondary"
+                disabled={loadingMore}
+                onClick={async () => {
+                  setLoadingMore(true)
+                  try {
+                    setHasMore(await loadMoreNotifications())
+                  } catch {
+                    toast({ tone: 'error', message: '加载失败，请稍后重试' })
+                  } finally {
+                    setLoadingMore(false)
+                  }
+                }}
+              >
+                {loadingMore ? '加载中…' : '加载更多'}
+              </Button>
+            </div>
+          ) : null}
         </CardBody>
       </Card>
 
@@ -1,4 +1,5 @@
 import axios from 'axios'
+import type { OsmPlace } from './osmOverpass'
 
 const api = axios.create({
   baseURL: '/api',
@@ -38,3 +39,108 @@ api.interceptors.response.use(
 )
 
 export default api
+
+export interface ChatStreamEvent {
+  type: 'meta' | 'token' | 'done' | 'error'
+  session_id?: string
+  content?: string
+  emergency?: boolean
+  message?: string
+}
+
+// 流式对话：通过 SSE 逐段接收回复（axios 不支持读取流，这里使用 fetch）
+export async function streamChat(
+  payload: { message: string; session_id?: string },
+  onEvent: (event: ChatStreamEvent) => void
+): Promise<void> {
+  const response = await fetch('/api/chat/stream', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    },
+    body: JSON.stringify(payload),
+  })
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed: ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // 每个事件以空行结束
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary >= 0) {
+      const raw = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('data:')) {
+          onEvent(JSON.parse(line.slice(5).trim()) as ChatStreamEvent)
+        }
+      }
+      boundary = buffer.indexOf('\n\n')
+    }
+  }
+}
+
+export interface NearbyHospital extends OsmPlace {
+  departments: string[]
+  emergency: boolean
+  distanceMeters: number
+}
+
+interface NearbyHospitalsResponse {
+  took_ms: number
+  count: number
+  results: Array<{
+    id: string
+    name: string
+    type: OsmPlace['type']
+    lat: number
+    lng: number
+    address?: string | null
+    phone?: string | null
+    departments: string[]
+    emergency: boolean
+    distance_m: number
+  }>
+}
+
+// 附近医疗机构：由后端本地数据和空间索引查询，不直接请求外部地图服务
+export async function searchNearbyHospitals(input: {
+  lat: number
+  lng: number
+  radiusMeters?: number
+  limit?: number
+  department?: string
+  emergency?: boolean
+}): Promise<NearbyHospital[]> {
+  const { data } = await api.get<NearbyHospitalsResponse>('/hospitals/nearby', {
+    params: {
+      lat: input.lat,
+      lng: input.lng,
+      radius_km: input.radiusMeters !== undefined ? input.radiusMeters / 1000 : undefined,
+      limit: input.limit,
+      department: input.department,
+      emergency: input.emergency,
+    },
+  })
+  return data.results.map((item) => ({
+    id: item.id,
+    name: item.name,
+    type: item.type,
+    lat: item.lat,
+    lng: item.lng,
+    address: item.address ?? undefined,
+    phone: item.phone ?? undefined,
+    departments: item.departments,
+    emergency: item.emergency,
+    distanceMeters: item.distance_m,
+  }))
+}
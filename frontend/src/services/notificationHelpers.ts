@@ -1,4 +1,4 @@
-import { NotificationItem, NotificationType, readNotifications, writeNotifications } from './notificationsStore'
+import { NotificationItem, NotificationType, createNotification } from './notificationsStore'
 
 export function pushNotification(input: {
   type: NotificationType
@@ -6,7 +6,6 @@ export function pushNotification(input: {
   description: string
   unread?: boolean
 }) {
-  const current = readNotifications()
   const item: NotificationItem = {
     id: `n-${Date.now()}-${Math.random().toString(16).slice(2)}`,
     type: input.type,
@@ -15,5 +14,5 @@ export function pushNotification(input: {
     time: '刚刚',
     unread: input.unread ?? true,
   }
-  writeNotifications([item, ...current].slice(0, 50))
+  void createNotification(item)
 }
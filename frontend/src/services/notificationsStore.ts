@@ -1,3 +1,5 @@
+import api from './api'
+
 export type NotificationType = 'message' | 'lab' | 'medication' | 'system'
 
 export type NotificationItem = {
@@ -7,9 +9,32 @@ export type NotificationItem = {
   description: string
   time: string
   unread: boolean
+  seq?: number
+}
+
+type ServerNotification = {
+  id: string
+  seq: number
+  type: NotificationType
+  title: string
+  body?: string | null
+  read: boolean
+  deleted?: boolean
+  created_at: string
+  rev: number
+}
+
+// 后端推送的一次变更：rev 为版本号，unread 为变更后的未读数，notifications 只包含被修改的通知
+type NotificationChange = {
+  type?: 'changes' | 'reset'
+  rev: number
+  unread: number
+  notifications?: ServerNotification[]
+  reset?: boolean
 }
 
 const STORAGE_KEY = 'notifications:v1'
+const PAGE_SIZE = 50
 
 const seed: NotificationItem[] = [
   {
@@ -38,44 +63,174 @@ const seed: NotificationItem[] = [
   },
 ]
 
+// 与后端同步后：列表只在收到变更时按 ID 更新，未读数直接使用后端下发的计数，不再遍历列表
+let cache: NotificationItem[] | null = null
+let unreadCount: number | null = null
+let rev = 0
+let nextCursor: string | null = null
+let synced = false
+let source: EventSource | null = null
+
+function formatTime(createdAt: string) {
+  const created = new Date(createdAt)
+  const diff = Date.now() - created.getTime()
+  if (Number.isNaN(diff)) return createdAt
+  if (diff < 60 * 60 * 1000) return '刚刚'
+  if (diff < 24 * 60 * 60 * 1000) return `${Math.floor(diff / (60 * 60 * 1000))} 小时前`
+  if (diff < 2 * 24 * 60 * 60 * 1000) return '昨天'
+  if (diff < 7 * 24 * 60 * 60 * 1000) return `${Math.floor(diff / (24 * 60 * 60 * 1000))} 天前`
+  return createdAt.slice(0, 10)
+}
+
+function fromServer(n: ServerNotification): NotificationItem {
+  return {
+    id: n.id,
+    type: n.type,
+    title: n.title,
+    description: n.body ?? '',
+    time: formatTime(n.created_at),
+    unread: !n.read,
+    seq: n.seq,
+  }
+}
+
 export function readNotifications(): NotificationItem[] {
+  if (cache) return cache
   try {
     const raw = window.localStorage.getItem(STORAGE_KEY)
     if (!raw) return seed
     const parsed = JSON.parse(raw)
     if (!Array.isArray(parsed)) return seed
-    return parsed as NotificationItem[]
+    cache = parsed as NotificationItem[]
+    return cache
   } catch {
     return seed
   }
 }
 
 export function writeNotifications(items: NotificationItem[]) {
+  cache = items
   window.localStorage.setItem(STORAGE_KEY, JSON.stringify(items))
   window.dispatchEvent(new Event('notifications:changed'))
 }
 
 export function getUnreadCount(items?: NotificationItem[]) {
+  if (!items && unreadCount !== null) return unreadCount
   const arr = items ?? readNotifications()
   return arr.filter((n) => n.unread).length
 }
 
+export function hasMoreNotifications() {
+  return nextCursor !== null
+}
+
+// 应用后端的一次变更：只更新其中出现的通知
+function applyChange(change: NotificationChange) {
+  if (change.reset || change.type === 'reset') {
+    void loadNotifications()
+    return
+  }
+  // 晚到的旧变更（如写接口的响应晚于推送）不再覆盖
+  if (change.rev < rev) return
+  rev = change.rev
+  unreadCount = change.unread
+
+  const items = [...readNotifications()]
+  for (const n of change.notifications ?? []) {
+    const index = items.findIndex((x) => x.id === n.id)
+    if (n.deleted) {
+      if (index >= 0) items.splice(index, 1)
+    } else if (index >= 0) {
+      items[index] = fromServer(n)
+    } else {
+      // 新通知的 seq 比已有的都大，放在最前面
+      items.unshift(fromServer(n))
+    }
+  }
+  writeNotifications(items)
+}
+
+async function loadNotifications() {
+  const res = await api.get<ServerNotification[]>('/notifications', { params: { limit: PAGE_SIZE } })
+  rev = Number(res.headers['x-notification-rev'] ?? 0)
+  nextCursor = res.headers['x-next-cursor'] ?? null
+  unreadCount = null
+  writeNotifications(res.data.map(fromServer))
+}
+
+export async function loadMoreNotifications() {
+  if (!nextCursor) return false
+  const res = await api.get<ServerNotification[]>('/notifications', { params: { limit: PAGE_SIZE, cursor: nextCursor } })
+  nextCursor = res.headers['x-next-cursor'] ?? null
+  const known = new Set(readNotifications().map((n) => n.id))
+  writeNotifications([...readNotifications(), ...res.data.filter((n) => !known.has(n.id)).map(fromServer)])
+  return nextCursor !== null
+}
+
+// 读取第一页后订阅变更推送；后端不可用时继续使用本地保存的通知
+export async function startNotificationSync() {
+  if (source) return
+  try {
+    await loadNotifications()
+  } catch {
+    return
+  }
+  synced = true
+  // 断线后浏览器自动重连，并通过 Last-Event-ID 只补发错过的变更
+  source = new EventSource(`/api/notifications/stream?since=${rev}`)
+  source.onmessage = (e) => {
+    try {
+      applyChange(JSON.parse(e.data) as NotificationChange)
+    } catch {
+      // ignore
+    }
+  }
+}
+
+function syncWrite(request: Promise<{ data: NotificationChange }>) {
+  request.then((res) => applyChange(res.data)).catch(() => {})
+}
+
 export function markAllRead() {
   const items = readNotifications().map((n) => ({ ...n, unread: false }))
+  if (unreadCount !== null) unreadCount = 0
   writeNotifications(items)
+  if (synced) syncWrite(api.post('/notifications/read', {}))
 }
 
 export function markRead(id: string) {
-  const items = readNotifications().map((n) => (n.id === id ? { ...n, unread: false } : n))
+  const items = readNotifications().map((n) => {
+    if (n.id !== id) return n
+    if (n.unread && unreadCount !== null) unreadCount = Math.max(0, unreadCount - 1)
+    return { ...n, unread: false }
+  })
   writeNotifications(items)
+  if (synced) syncWrite(api.post('/notifications/read', { ids: [id] }))
 }
 
 export function deleteNotification(id: string) {
+  const removed = readNotifications().find((n) => n.id === id)
+  if (removed?.unread && unreadCount !== null) unreadCount = Math.max(0, unreadCount - 1)
   const items = readNotifications().filter((n) => n.id !== id)
   writeNotifications(items)
+  if (synced) syncWrite(api.delete(`/notifications/${id}`))
   return items
 }
 
+// 新增通知：已与后端同步时由后端保存并通过推送回到列表，否则保存在本地
+export async function createNotification(item: NotificationItem) {
+  if (synced) {
+    try {
+      await api.post('/notifications', { type: item.type, title: item.title, body: item.description, read: !item.unread })
+      return
+    } catch {
+      // 后端暂时不可用时先保存在本地
+    }
+  }
+  if (item.unread && unreadCount !== null) unreadCount += 1
+  writeNotifications([item, ...readNotifications()].slice(0, PAGE_SIZE))
+}
+
 export function deleteNotificationsByDate(date: string) {
   // 解析日期字符串，支持多种格式：'刚刚', 'X 小时前', 'X 天前', '昨天', 'YYYY-MM-DD' 等
   const items = readNotifications().filter((n) => {
@@ -90,17 +245,17 @@ export function deleteNotificationsByDate(date: string) {
 // 解析时间字符串为日期（用于按日期删除）
 function parseTimeToDate(timeStr: string): Date | null {
   const now = new Date()
-  
+
   if (timeStr === '刚刚') {
     return now
   }
-  
+
   if (timeStr === '昨天') {
     const yesterday = new Date(now)
     yesterday.setDate(yesterday.getDate() - 1)
     return yesterday
   }
-  
+
   // 匹配 "X 小时前"
   const hoursMatch = timeStr.match(/(\d+)\s*小时前/)
   if (hoursMatch) {
@@ -109,7 +264,7 @@ function parseTimeToDate(timeStr: string): Date | null {
     date.setHours(date.getHours() - hours)
     return date
   }
-  
+
   // 匹配 "X 天前"
   const daysMatch = timeStr.match(/(\d+)\s*天前/)
   if (daysMatch) {
@@ -118,13 +273,13 @@ function parseTimeToDate(timeStr: string): Date | null {
     date.setDate(date.getDate() - days)
     return date
   }
-  
+
   // 匹配日期格式 YYYY-MM-DD
   const dateMatch = timeStr.match(/(\d{4})-(\d{2})-(\d{2})/)
   if (dateMatch) {
     return new Date(parseInt(dateMatch[1], 10), parseInt(dateMatch[2], 10) - 1, parseInt(dateMatch[3], 10))
   }
-  
+
   return null
 }
 
@@ -139,6 +294,10 @@ function isSameDay(date1: Date, date2: Date): boolean {
 
 // 按指定日期删除通知
 export function deleteNotificationsBySelectedDate(selectedDate: string) {
+  if (synced && /^\d{4}-\d{2}-\d{2}$/.test(selectedDate)) {
+    syncWrite(api.delete('/notifications', { params: { date: selectedDate } }))
+  }
+
   const targetDate = parseTimeToDate(selectedDate)
   if (!targetDate) {
     // 如果无法解析，使用字符串匹配
@@ -146,13 +305,13 @@ export function deleteNotificationsBySelectedDate(selectedDate: string) {
     writeNotifications(items)
     return items
   }
-  
+
   const items = readNotifications().filter((n) => {
     const notificationDate = parseTimeToDate(n.time)
     if (!notificationDate) return true // 无法解析的保留
     return !isSameDay(notificationDate, targetDate)
   })
-  
+
   writeNotifications(items)
   return items
 }